@@ -1,11 +1,66 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, stream_with_context, send_file
 import sqlite3
 import os
+import csv
+import click
 from werkzeug.utils import secure_filename
 from functools import wraps
+import db
+import migrations
+import counters
+import dashboard_metrics
+import search
+import order_intake
+import pricing
+import importer
+import exports
+import company_settings
+import reports
+import ledger
+import instrumentation
+import jobs
+import archive
+import backup
+import caching
+import events
+import work_queue
+import datetime
+import logging
+import time
+import config
+from db import get_db, get_pool
+from pagination import paginate_request
 
 app = Flask(__name__)
-app.secret_key = 'your_secret_key'
+# Defaults and PPM_* environment overrides, see config.py
+app.config.update(config.from_env())
+db.init_app(app)
+instrumentation.init_app(app)
+
+log = logging.getLogger('printing_press')
+dashboard_cache = dashboard_metrics.DashboardMetrics(ttl=app.config['DASHBOARD_CACHE_TTL'])
+company_info = company_settings.CompanySettings(app.config['COMPANY_SETTINGS'])
+price_book = pricing.Pricing()
+# Rendered list and receipt pages, keyed on table versions (and the company details printed on them)
+page_cache = caching.PageCache(get_db, key_extra=lambda: company_info.get(),
+                               max_entries=app.config['PAGE_CACHE_ENTRIES'])
+page_cache.enabled = app.config['PAGE_CACHE']
+# Imports change order and expense totals
+jobs.init_app(app, on_finish=lambda kind, status: dashboard_cache.invalidate() if kind == 'import' else None)
+events.init_app(app)
+backup.init_app(app)
+
+
+# Scheduled snapshots start in each worker on its first request (threads do not survive a preload fork)
+@app.before_request
+def start_backup_scheduler():
+    backup.get_scheduler()
+
+
+# Company details for every template (receipts, settings, headers)
+@app.context_processor
+def inject_company():
+    return {'company': company_info.get()}
 
 # -------------------------
 # Login required decorator
@@ -26,40 +81,119 @@ def show_routes():
         output.append(f"{rule}")
     return '<br>'.join(output)
 
+# Prometheus text metrics: per-endpoint latency, SQL per request, pool stats.
+# For a logged-in user, or a scraper sending "Authorization: Bearer <METRICS_TOKEN>"
+@app.route('/metrics')
+def metrics():
+    if 'user_id' not in session and not instrumentation.token_matches(app.config['METRICS_TOKEN']):
+        return 'Unauthorized\n', 401, {'Content-Type': 'text/plain', 'WWW-Authenticate': 'Bearer'}
+    body = instrumentation.metrics.render(get_pool().stats(), page_cache.stats(), events.get_broadcaster().stats(),
+                                          backup.last(get_db()))
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+# Turn instrumentation on/off at runtime: POST enabled=0|1 (reset=1 clears the counters)
+@app.route('/metrics/toggle', methods=['POST'])
+@login_required
+def metrics_toggle():
+    enabled = request.form.get('enabled', request.args.get('enabled'))
+    if enabled is not None:
+        instrumentation.metrics.enabled = enabled not in ('0', 'false', 'off')
+    if request.form.get('reset', request.args.get('reset')) == '1':
+        instrumentation.metrics.reset()
+    return {'enabled': instrumentation.metrics.enabled}
+
+
+# Full-text search across customers, orders and expenses
+@app.route('/search')
+@login_required
+def search_json():
+    kinds = [k for k in request.args.get('type', '').split(',') if k in search.SEARCH_SQL] or list(search.SEARCH_SQL)
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+    return search.search(get_db(), request.args.get('q', ''), kinds, limit)
+
+# Connection pool statistics, used to size DB_POOL_SIZE
+@app.route('/pool_stats')
+@login_required
+def pool_stats():
+    return get_pool().stats()
+
 # Update payment status for orders via AJAX
 @app.route('/update_payment_status', methods=['POST'])
 @login_required
 def update_payment_status_ajax():
-    data = request.get_json()
-    order_id = data.get('order_id')
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    order_id = _order_id_arg(data.get('order_id'))
     status = data.get('status')
-    if status not in ['Paid', 'Credit'] or not order_id:
+    expected_version = data.get('expected_version')
+    if status not in PAYMENT_STATUSES or order_id is None or not _valid_version(expected_version):
         return {'success': False, 'error': 'Invalid input'}, 400
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
-    conn.commit()
-    conn.close()
-    return {'success': True}
+    # Also marks the order's payments row paid/unpaid for the customer statement
+    result, version = ledger.set_order_status(get_db(), order_id, status, expected_version=expected_version)
+    if result == ledger.NOT_FOUND:
+        return {'success': False, 'error': 'Order not found'}, 404
+    if result == ledger.CONFLICT:
+        return {'success': False, 'error': 'Order was changed by someone else', 'version': version}, 409
+    dashboard_cache.invalidate()
+    return {'success': True, 'version': version}
+
+
+# Settle many orders at once: {"orders": [{"order_id", "status", "expected_version"}, ...]}
+@app.route('/update_payment_status/batch', methods=['POST'])
+@login_required
+def update_payment_status_batch():
+    entries = (request.get_json(silent=True) or {}).get('orders')
+    if not isinstance(entries, list) or not entries:
+        return {'success': False, 'error': 'Expected a non-empty "orders" list'}, 400
+    if len(entries) > ledger.MAX_BATCH_STATUS_CHANGES:
+        return {'success': False, 'error': f'At most {ledger.MAX_BATCH_STATUS_CHANGES} orders per batch'}, 400
+    results = [None] * len(entries)
+    changes, positions = [], []
+    for i, entry in enumerate(entries):
+        entry = entry if isinstance(entry, dict) else {}
+        order_id, status = _order_id_arg(entry.get('order_id')), entry.get('status')
+        expected_version = entry.get('expected_version')
+        if status not in PAYMENT_STATUSES or order_id is None or not _valid_version(expected_version):
+            results[i] = {'order_id': entry.get('order_id'), 'result': 'invalid'}
+            continue
+        changes.append((order_id, status, expected_version))
+        positions.append(i)
+    # One write transaction for the whole batch
+    applied = ledger.set_order_statuses(get_db(), changes) if changes else []
+    for i, (order_id, _, _), (result, version) in zip(positions, changes, applied):
+        results[i] = {'order_id': order_id, 'result': result, 'version': version}
+    if any(r['result'] == ledger.UPDATED for r in results):
+        dashboard_cache.invalidate()
+    return {'success': all(r['result'] == ledger.UPDATED for r in results), 'results': results}
+
+
+def _order_id_arg(order_id):
+    """A positive integer order id, or None; digit strings count (the completed orders page sends them)."""
+    if isinstance(order_id, str) and order_id.isascii() and order_id.isdigit():
+        order_id = int(order_id)
+    if isinstance(order_id, int) and not isinstance(order_id, bool) and order_id > 0:
+        return order_id
+    return None
+
+
+def _valid_version(version):
+    return version is None or (isinstance(version, int) and not isinstance(version, bool))
 
 
 
 # Order Details Route (placed after all imports, app, and login_required)
 @app.route('/order_details/<int:order_id>')
 @login_required
+@page_cache.cached('orders', 'customers')
 def order_details(order_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
-    c.execute('''
-        SELECT o.id, c.name, c.mobile, c.email, c.address,
-               o.service, o.amount, o.payment_mode,
-               o.order_date, o.status
-        FROM orders o
-        JOIN customers c ON o.customer_id = c.id
-        WHERE o.id = ?
-    ''', (order_id,))
+    c.execute(ORDER_RECEIPT_SQL, (order_id,))
     order = c.fetchone()
-    conn.close()
     if not order:
         flash('Order not found', 'error')
         return redirect(url_for('completed_orders'))
@@ -70,78 +204,317 @@ def order_details(order_id):
 # Database initialization
 # -------------------------
 def init_db():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
+    """Apply pending migrations and seed the admin user; returns the migrations applied."""
+    conn = db.connect(app.config['DATABASE'])
+    try:
+        # Up to date (every start but the first after an upgrade): one PRAGMA read
+        if migrations.current_version(conn) >= migrations.latest_version():
+            return []
+        applied = migrations.migrate(conn)
+        c = conn.cursor()
 
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    password TEXT)''')
+        # Add default admin user if not exists
+        c.execute('SELECT * FROM users WHERE username=?', ('admin',))
+        if not c.fetchone():
+            c.execute('INSERT INTO users (username, password) VALUES (?, ?)', ('admin', 'admin123'))
 
-    c.execute('''CREATE TABLE IF NOT EXISTS customers (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT,
-                    contact TEXT)''')
-    # Add new columns if they don't exist
-    try:
-        c.execute('ALTER TABLE customers ADD COLUMN mobile TEXT')
-    except sqlite3.OperationalError:
-        pass
-    try:
-        c.execute('ALTER TABLE customers ADD COLUMN email TEXT')
-    except sqlite3.OperationalError:
-        pass
-    try:
-        c.execute('ALTER TABLE customers ADD COLUMN address TEXT')
-    except sqlite3.OperationalError:
-        pass
-
-    c.execute('''CREATE TABLE IF NOT EXISTS orders (
-                    id INTEGER PRIMARY KEY,
-                    customer_id INTEGER,
-                    service TEXT,
-                    order_date TEXT,
-                    amount REAL,
-                    payment_mode TEXT,
-                    status TEXT)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS payments (
-                    id INTEGER PRIMARY KEY,
-                    amount REAL,
-                    paid INTEGER,
-                    payment_date TEXT)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS employees (
-                    id INTEGER PRIMARY KEY,
-                    name TEXT,
-                    role TEXT)''')
-    # Add new columns if they don't exist
+        conn.commit()
+    finally:
+        conn.close()
+    return applied
+
+
+def configure_app(overrides=None, started=None):
+    """Configure the module-level ``app``, bring the database up to date and return it.
+
+    This is not an application factory: routes are registered on ``app`` at
+    import, so every call configures that one instance.  wsgi.py and serve.py
+    call it once per process.  ``started`` is a time.perf_counter()
+    reading from before the import, used to report the cold start time.
+    """
+    if overrides:
+        app.config.update(overrides)
+    # Built at import time from the defaults
+    dashboard_cache.ttl = app.config['DASHBOARD_CACHE_TTL']
+    company_info.path = app.config['COMPANY_SETTINGS']
+    company_info.invalidate()
+    instrumentation.metrics.enabled = app.config['INSTRUMENTATION']
+    instrumentation.metrics.slow_query_ms = app.config['SLOW_QUERY_MS']
+    page_cache.enabled = app.config['PAGE_CACHE']
+    page_cache.max_entries = app.config['PAGE_CACHE_ENTRIES']
+    applied = init_db()
+    if started is not None:
+        instrumentation.metrics.startup_seconds = time.perf_counter() - started
+        rss = instrumentation.resident_memory()
+        log.info('Ready in %.3f s (migrations applied: %s), %s resident, pid %d',
+                 instrumentation.metrics.startup_seconds, applied or 'none',
+                 f'{rss / 1048576:.1f} MB' if rss else 'unknown', os.getpid())
+    return app
+
+
+# -------------------------
+# Route queries
+# -------------------------
+# Queries that filter orders by status or id.  They are also run through
+# EXPLAIN QUERY PLAN by `flask check-query-plans` so a missing index shows up
+# as a failure instead of a slow page.
+ORDER_RECEIPTS_SQL = '''
+    SELECT o.id, c.name, c.mobile, c.email, c.address,
+           o.service, o.amount, o.payment_mode,
+           o.order_date, o.status
+    FROM orders o
+    JOIN customers c ON o.customer_id = c.id
+'''
+ORDER_RECEIPT_SQL = ORDER_RECEIPTS_SQL + ' WHERE o.id = ?'
+# Batch printing filters; the status list lets a date range use idx_orders_status_date
+RECEIPT_CUSTOMER_FILTER = 'o.customer_id = ?'
+RECEIPT_DATE_FILTER = "o.status IN ('pending', 'Completed', 'Paid', 'Credit') AND o.order_date >= ? AND o.order_date <= ?"
+MAX_BATCH_RECEIPTS = 500
+PENDING_ORDERS_SQL = '''
+    SELECT orders.id, customers.name, customers.contact, customers.mobile, customers.email, customers.address, orders.service, orders.order_date, orders.status,
+           work_items.due_date, employees.name
+    FROM orders
+    JOIN customers ON orders.customer_id = customers.id
+    LEFT JOIN work_items ON work_items.order_id = orders.id
+    LEFT JOIN employees ON employees.id = work_items.employee_id
+    WHERE orders.status = ?
+'''
+PAYMENT_STATUSES = ('Paid', 'Credit')
+COMPLETED_ORDERS_SQL = '''
+    SELECT orders.id, customers.name, orders.service, orders.amount, orders.status, orders.order_date,
+           orders.version
+    FROM orders
+    JOIN customers ON orders.customer_id = customers.id
+    WHERE orders.status IN ('Completed', 'Paid', 'Credit')
+'''
+CUSTOMERS_BY_ORDER_STATUS_SQL = '''
+    SELECT DISTINCT c.id, c.name, c.mobile, c.email, c.address
+    FROM customers c
+    JOIN orders o ON c.id = o.customer_id
+    WHERE o.status = ?
+'''
+CUSTOMERS_SQL = 'SELECT id, name, mobile, email, address FROM customers WHERE 1=1'
+EMPLOYEES_SQL = 'SELECT id, name, role, mobile, email, address FROM employees WHERE 1=1'
+EXPENSES_SQL = 'SELECT id, amount, description, date FROM expenses WHERE 1=1'
+LOGIN_SQL = 'SELECT * FROM users WHERE username=? AND password=?'
+EXPENSES_BY_DATE_SQL = 'SELECT id, amount, description, date FROM expenses WHERE date >= ? AND date <= ?'
+
+# Sort options for the paginated listings: name -> (sort columns, row -> cursor values).
+# Nullable columns sort as '' (the *_key indexes of migration 20) so the seek never meets a NULL.
+PENDING_ORDER_SORTS = {
+    'date': (("COALESCE(orders.order_date, '')", 'orders.id'), lambda row: (row[7] or '', row[0])),
+    'id': (('orders.id',), lambda row: (row[0],)),
+}
+COMPLETED_ORDER_SORTS = {
+    'date': (("COALESCE(orders.order_date, '')", 'orders.id'), lambda row: (row[5] or '', row[0])),
+    'id': (('orders.id',), lambda row: (row[0],)),
+}
+CUSTOMER_SORTS = {
+    'id': (('id',), lambda row: (row[0],)),
+    'name': (("COALESCE(name, '')", 'id'), lambda row: (row[1] or '', row[0])),
+}
+EMPLOYEE_SORTS = {
+    'id': (('id',), lambda row: (row[0],)),
+    'name': (("COALESCE(name, '')", 'id'), lambda row: (row[1] or '', row[0])),
+}
+EXPENSE_SORTS = {
+    'date': (("COALESCE(date, '')", 'id'), lambda row: (row[3] or '', row[0])),
+    'id': (('id',), lambda row: (row[0],)),
+}
+
+QUERY_PLAN_CHECKS = {
+    'order_details/print_order': (ORDER_RECEIPT_SQL, (1,)),
+    'print_orders.customer': (ORDER_RECEIPTS_SQL + ' WHERE ' + RECEIPT_CUSTOMER_FILTER, (1,)),
+    'print_orders.date_range': (ORDER_RECEIPTS_SQL + ' WHERE ' + RECEIPT_DATE_FILTER, ('2000-01-01', '2000-12-31')),
+    'view_order': (PENDING_ORDERS_SQL, ('pending',)),
+    'complete_order': (COMPLETED_ORDERS_SQL, ()),
+    'customer_ledger': (ledger.CREDIT_LEDGER_SQL, ()),
+    'payment_voucher': (CUSTOMERS_BY_ORDER_STATUS_SQL, ('Paid',)),
+    'dashboard.pending': (dashboard_metrics.PENDING_COUNT_SQL, ()),
+    'dashboard.completed': (dashboard_metrics.COMPLETED_COUNT_SQL, ()),
+    'dashboard.credit_customers': (dashboard_metrics.CREDIT_CUSTOMERS_COUNT_SQL, ()),
+    'dashboard.working': (dashboard_metrics.WORKING_COUNT_SQL, ()),
+    'work_queue.next': (work_queue.NEXT_SQL.format(services=''), ()),
+    'work_queue.next_for_service': (work_queue.NEXT_SQL.format(services=' AND service IN (?)'), ('banner',)),
+    'work_queue.missing': (work_queue.MISSING_SQL, ()),
+    'work_queue.new': (work_queue.NEW_SQL, ()),
+    'work_queue.queued': (work_queue.QUEUED_SQL, (200,)),
+    'work_queue.claimed': (work_queue.CLAIMED_SQL, ()),
+    'login': (LOGIN_SQL, ('admin', '')),
+    'expenses.date_range': (EXPENSES_BY_DATE_SQL, ('2000-01-01', '2000-12-31')),
+    'system_report.periods': (reports.REPORT_SQL.format(period=reports.PERIODS['week']), ('2000-01-01', '2000-12-31')),
+    'system_report.services': (reports.SERVICE_REPORT_SQL, ('2000-01-01', '2000-12-31')),
+}
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Apply pending schema migrations without starting the server."""
+    applied = init_db()
+    click.echo(f"Applied migration(s) {', '.join(map(str, applied))}" if applied else 'Database is up to date')
+
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any route query needs a full table scan."""
+    conn = db.connect(app.config['DATABASE'])
+    failures = migrations.check_query_plans(conn, QUERY_PLAN_CHECKS)
+    conn.close()
+    for name, scans in failures.items():
+        click.echo(f'FAIL {name}: ' + '; '.join(scans))
+    if failures:
+        raise SystemExit(1)
+    click.echo(f'OK: {len(QUERY_PLAN_CHECKS)} route queries use indexes')
+
+
+@app.cli.command('rebuild-counters')
+@click.option('--check', 'check_only', is_flag=True, help='Only report drift, do not rebuild.')
+def rebuild_counters_command(check_only):
+    """Recount the trigger-maintained summary and rollup tables from orders and expenses."""
+    conn = db.connect(app.config['DATABASE'])
+    # Archived orders are still counted, so recount them too
+    orders = archive.sources(conn, app.config['ARCHIVE_DATABASE'])['orders']
+    drift = []
+    for module in (counters, reports):
+        drift += module.check(conn, orders) if check_only else module.rebuild(conn, orders)
+    conn.close()
+    for line in drift:
+        click.echo(line)
+    if check_only and drift:
+        raise SystemExit(1)
+    click.echo(f'{len(drift)} difference(s) found' + ('' if check_only else ', counters rebuilt'))
+
+
+@app.cli.command('archive-orders')
+@click.option('--days', type=int, default=None, help='Archive Paid orders older than this many days.')
+@click.option('--dry-run', is_flag=True, help='Only report how many orders would move.')
+def archive_orders_command(days, dry_run):
+    """Move old Paid orders and their payments into the archive database."""
+    before = archive.cutoff(app.config['ARCHIVE_AFTER_DAYS'] if days is None else days)
+    conn = db.connect(app.config['DATABASE'])
     try:
-        c.execute('ALTER TABLE employees ADD COLUMN mobile TEXT')
-    except sqlite3.OperationalError:
-        pass
+        count, amount = archive.pending(conn, before)
+        click.echo(f'{count} Paid order(s) dated before {before} (GHC {amount:.2f})')
+        if not dry_run and count:
+            try:
+                moved = archive.archive_orders(conn, app.config['ARCHIVE_DATABASE'], before)
+            except archive.ArchiveError as e:
+                raise SystemExit(f'Archive stopped: {e}')
+            click.echo(f"{moved} order(s) moved to {app.config['ARCHIVE_DATABASE']}")
+    finally:
+        conn.close()
+
+
+@app.cli.command('backup')
+@click.option('--dest', default=None, help='Snapshot directory (default BACKUP_DIR).')
+@click.option('--keep', type=int, default=None, help='Snapshots to keep (default BACKUP_KEEP).')
+def backup_command(dest, keep):
+    """Take a verified online snapshot of the database while the app keeps running."""
+    conn = db.connect(app.config['DATABASE'])
     try:
-        c.execute('ALTER TABLE employees ADD COLUMN email TEXT')
-    except sqlite3.OperationalError:
-        pass
+        stats = backup.run(conn, app.config['DATABASE'], dest or app.config['BACKUP_DIR'],
+                           app.config['BACKUP_KEEP'] if keep is None else keep)
+    finally:
+        conn.close()
+    click.echo(f"{stats['path']}: {stats['pages']} pages, {stats['bytes'] / 1048576:.1f} MB "
+               f"in {stats['seconds']:.2f}s ({stats['steps']} steps), verified")
+    for path in stats['pruned']:
+        click.echo(f'pruned {path}')
+
+
+@app.cli.command('verify-backup')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def verify_backup_command(path):
+    """Check that a snapshot opens and passes an integrity check."""
+    problems = backup.verify(path)
+    for problem in problems:
+        click.echo(f'FAIL {problem}')
+    if problems:
+        raise SystemExit(1)
+    click.echo(f'OK: {path}')
+
+
+@app.cli.command('restore-backup')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore_backup_command(path, yes):
+    """Verify a snapshot and copy it over the database.  Stop the app first."""
+    if not yes:
+        click.confirm(f"Replace {app.config['DATABASE']} with {path}?", abort=True)
     try:
-        c.execute('ALTER TABLE employees ADD COLUMN address TEXT')
-    except sqlite3.OperationalError:
-        pass
+        backup.restore(path, app.config['DATABASE'])
+    except backup.BackupError as e:
+        raise SystemExit(f'Not restored: {e}')
+    click.echo(f"Restored {app.config['DATABASE']} from {path}")
+
+
+@app.cli.command('bench-intake')
+@click.option('--orders', default=1000, help='Number of orders to write.')
+@click.option('--items', default=5, help='Line items per order.')
+def bench_intake_command(orders, items):
+    """Compare bulk order intake with one INSERT and commit per line, on a scratch database."""
+    import tempfile
+    import time
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.connect(os.path.join(tmp, 'bench.db'))
+        migrations.migrate(conn)
+        conn.execute("INSERT INTO customers (name, mobile, email, address) VALUES ('Bench', '0', 'b@x', 'x')")
+        conn.commit()
+        batch = [{'customer_id': 1, 'order_date': '2025-01-01',
+                  'items': [{'service': 'banner', 'amount': 10 + i} for i in range(items)]}
+                 for _ in range(orders)]
+        total = orders * items
+
+        start = time.perf_counter()
+        for order in batch:
+            for item in order['items']:
+                # Ids come from the id high-water marks, as in order_intake, so archived ids are never reused
+                conn.execute('BEGIN IMMEDIATE')
+                order_id = counters.next_id(conn, 'orders')
+                conn.execute('INSERT INTO orders (id, customer_id, service, order_date, amount, payment_mode, status) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             (order_id, 1, item['service'], order['order_date'], item['amount'], 'Unpaid', 'pending'))
+                conn.execute('INSERT INTO payments (id, order_id, amount, paid, payment_date) VALUES (?, ?, ?, ?, ?)',
+                             (counters.next_id(conn, 'payments'), order_id, item['amount'], 0, order['order_date']))
+                conn.commit()
+        per_row = time.perf_counter() - start
+
+        start = time.perf_counter()
+        order_intake.create_orders(conn, [order_intake.normalize_order(order) for order in batch])
+        bulk = time.perf_counter() - start
+        conn.close()
+    click.echo(f'{total} line items')
+    click.echo(f'per-row inserts: {per_row:.3f}s ({total / per_row:,.0f} items/s)')
+    click.echo(f'bulk intake:     {bulk:.3f}s ({total / bulk:,.0f} items/s, {per_row / bulk:.1f}x faster)')
 
-    c.execute('''CREATE TABLE IF NOT EXISTS expenses (
-                    id INTEGER PRIMARY KEY,
-                    amount REAL,
-                    description TEXT,
-                    date TEXT)''')
 
-    # Add default admin user if not exists
-    c.execute('SELECT * FROM users WHERE username=?', ('admin',))
-    if not c.fetchone():
-        c.execute('INSERT INTO users (username, password) VALUES (?, ?)', ('admin', 'admin123'))
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(importer.VALIDATORS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=importer.DEFAULT_CHUNK_SIZE, help='Rows per transaction.')
+@click.option('--defer-indexes', is_flag=True, help='Drop secondary indexes during the load and rebuild them after.')
+def import_data_command(kind, path, fmt, chunk_size, defer_indexes):
+    """Import customers, orders or expenses from a CSV or JSON file."""
+    fmt = fmt or ('json' if path.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv')
 
-    conn.commit()
-    conn.close()
+    def progress(report):
+        click.echo(f'{report.rows} rows read, {report.inserted} inserted, {report.error_count} errors', err=True)
+
+    conn = db.connect(app.config['DATABASE'])
+    try:
+        with open(path, 'rb') as f:
+            report = importer.import_stream(conn, kind, f, fmt, chunk_size=chunk_size,
+                                            defer_indexes=defer_indexes, progress=progress)
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Batches before the unreadable part are already committed
+        raise SystemExit(f'Import stopped, the file could not be read: {e}')
+    finally:
+        conn.close()
+    for error in report.errors:
+        click.echo(f"line {error['line']}: {error['error']}")
+    result = report.as_dict()
+    click.echo(f"{result['inserted']} inserted, {result['skipped']} skipped, {result['error_count']} errors "
+               f"in {result['elapsed_s']}s ({result['rows_per_s']} rows/s)")
 
 
 # -------------------------
@@ -157,11 +530,10 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        conn = sqlite3.connect('database.db')
+        conn = get_db()
         c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE username=? AND password=?', (username, password))
+        c.execute(LOGIN_SQL, (username, password))
         user = c.fetchone()
-        conn.close()
         if user:
             session['user_id'] = user[0]
             return redirect(url_for('dashboard'))
@@ -179,25 +551,57 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    # Total customers
-    c.execute('SELECT COUNT(*) FROM customers')
-    total_orders = c.fetchone()[0]
-    # Pending orders
-    c.execute("SELECT COUNT(*) FROM orders WHERE status = 'pending'")
-    pending_orders = c.fetchone()[0]
-    # Completed orders
-    c.execute("SELECT COUNT(*) FROM orders WHERE status IN ('Completed', 'Paid', 'Credit')")
-    completed_orders = c.fetchone()[0]
-    # Working orders (number of employees)
-    c.execute('SELECT COUNT(*) FROM employees')
-    working_orders = c.fetchone()[0]
-    # Number of credit customers
-    c.execute("SELECT COUNT(DISTINCT customers.id) FROM customers JOIN orders ON customers.id = orders.customer_id WHERE orders.status = 'Credit'")
-    credit_customers_count = c.fetchone()[0]
-    conn.close()
-    return render_template('dashboard.html', total_orders=total_orders, pending_orders=pending_orders, completed_orders=completed_orders, working_orders=working_orders, credit_customers_count=credit_customers_count)
+    # total_orders is the customer count; working_orders is the claimed print queue items
+    metrics = dashboard_cache.get(get_db())
+    return render_template('dashboard.html', **metrics)
+
+
+SYSTEM_SUMMARY_SQL = f'''
+    SELECT (SELECT COUNT(*) FROM customers),
+           (SELECT COALESCE(SUM(order_count), 0) FROM order_status_counts),
+           ({dashboard_metrics.PENDING_COUNT_SQL}),
+           ({dashboard_metrics.COMPLETED_COUNT_SQL}),
+           ({dashboard_metrics.CREDIT_CUSTOMERS_COUNT_SQL}),
+           (SELECT COUNT(*) FROM employees),
+           (SELECT COALESCE(SUM(total_amount), 0) FROM order_status_counts)
+'''
+SYSTEM_SUMMARY_FIELDS = ('total_customers', 'total_orders', 'pending_orders', 'completed_orders',
+                         'credit_customers_count', 'total_employees', 'total_revenue')
+RECENT_ORDERS_SQL = '''
+    SELECT o.id, c.name AS customer_name, o.service, o.amount, o.status, o.order_date
+    FROM orders o LEFT JOIN customers c ON c.id = o.customer_id
+    ORDER BY o.id DESC LIMIT 10
+'''
+
+
+def _report_date(name, default):
+    value = request.args.get(name, '')
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        return default.isoformat()
+
+
+# Summary plus a date-range report from the daily rollup tables
+@app.route('/system_report')
+@login_required
+def system_report():
+    conn = get_db()
+    summary = dict(zip(SYSTEM_SUMMARY_FIELDS, conn.execute(SYSTEM_SUMMARY_SQL).fetchone()))
+    # Rows by column name for the template; set on the cursor, not the pooled connection
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    recent_orders = cursor.execute(RECENT_ORDERS_SQL).fetchall()
+    today = datetime.date.today()
+    end = _report_date('end_date', today)
+    start = _report_date('start_date', today - datetime.timedelta(days=30))
+    group = request.args.get('group', 'day')
+    if group not in reports.PERIODS:
+        group = 'day'
+    periods, totals = reports.report(conn, start, end, group)
+    services = reports.service_report(conn, start, end)
+    return render_template('system_report.html', recent_orders=recent_orders, periods=periods, totals=totals,
+                           services=services, start_date=start, end_date=end, group=group, **summary)
 
 
 # -------------------------
@@ -206,7 +610,7 @@ def dashboard():
 @app.route('/add_order', methods=['GET', 'POST'])
 @login_required
 def add_order():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     # Get all customers for selection
     c.execute('SELECT id, name FROM customers')
@@ -214,56 +618,245 @@ def add_order():
     if request.method == 'POST':
         customer_id = request.form['customer_id']
         services = request.form.getlist('service')
-        amount = request.form['amount']
-        payment_mode = request.form['payment_mode']
+        amount = request.form.get('amount', '').strip()
         order_date = request.form['order_date']
-        for service in services:
-            # Always initialize payment_mode to 'Unpaid' for new orders
-            c.execute('INSERT INTO orders (customer_id, service, order_date, amount, payment_mode, status) VALUES (?, ?, ?, ?, ?, ?)', (customer_id, service, order_date, amount, 'Unpaid', 'pending'))
-            c.execute('INSERT INTO payments (amount, paid, payment_date) VALUES (?, ?, ?)', (amount, 0, order_date))
-        conn.commit()
-        conn.close()
+        try:
+            if amount:
+                items = [{'service': service, 'amount': amount} for service in services]
+            else:
+                # No amount keyed in: price each service from the dimensions
+                quotes = price_book.get(conn).quote([
+                    {'service': service, 'qty': request.form.get('qty') or 1,
+                     'height': request.form.get('height') or 0, 'width': request.form.get('width') or 0,
+                     'unit': request.form.get('size_unit', 'ft'), 'size': request.form.get('size', 'A4')}
+                    for service in services])
+                errors = [q['error'] for q in quotes if 'error' in q]
+                if errors:
+                    raise order_intake.IntakeError(f'Cannot price order: {errors[0]}')
+                items = [{'service': service, 'amount': q['amount']} for service, q in zip(services, quotes)]
+            order = order_intake.normalize_order({
+                'customer_id': customer_id,
+                'order_date': order_date,
+                'items': items,
+            })
+            due = request.form.get('due_date', '').strip() or None
+            if due:
+                try:
+                    due = datetime.date.fromisoformat(due).isoformat()
+                except ValueError:
+                    raise order_intake.IntakeError('Due date must be YYYY-MM-DD') from None
+            order_ids = order_intake.create_orders(conn, [order])[0]
+        except order_intake.IntakeError as e:
+            flash(str(e), 'error')
+            return render_template('add_order.html', customers=customers)
+        # Straight into the print queue, with the print time estimated from the dimensions
+        work_queue.enqueue(conn, price_book.get(conn), order_ids, order['items'],
+                           order['order_date'], due=due, dimensions=_order_dimensions(request.form))
+        dashboard_cache.invalidate()
         return redirect(url_for('view_order'))
-    conn.close()
     return render_template('add_order.html', customers=customers)
 
 
+def _order_dimensions(form):
+    try:
+        return {'qty': float(form.get('qty') or 1), 'height': float(form.get('height') or 0),
+                'width': float(form.get('width') or 0), 'unit': form.get('size_unit', 'ft'),
+                'size': form.get('size', 'A4')}
+    except ValueError:
+        return None
+
+
+# Bulk order intake: one order object, or {"orders": [...]} with many
+@app.route('/api/orders', methods=['POST'])
+@login_required
+def api_create_orders():
+    data = request.get_json(silent=True)
+    if isinstance(data, dict) and 'orders' in data:
+        data = data['orders']
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        return {'success': False, 'error': 'Expected an order or a list of orders'}, 400
+    try:
+        orders = [order_intake.normalize_order(order) for order in data]
+        ids = order_intake.create_orders(get_db(), orders)
+    except order_intake.IntakeError as e:
+        return {'success': False, 'error': str(e)}, 400
+    dashboard_cache.invalidate()
+    return {'success': True, 'orders': [{'order_ids': order_ids} for order_ids in ids]}, 201
+
+
+# Bulk import of an uploaded CSV/JSON file (form field 'file')
+@app.route('/import/<kind>', methods=['POST'])
+@login_required
+def import_upload(kind):
+    if kind not in importer.VALIDATORS:
+        return {'success': False, 'error': 'Unknown import kind'}, 404
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return {'success': False, 'error': 'No file uploaded'}, 400
+    fmt = request.args.get('format') or ('json' if upload.filename.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv')
+    try:
+        report = importer.import_stream(get_db(), kind, upload.stream, fmt)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    dashboard_cache.invalidate()
+    return {'success': True, **report.as_dict()}
+
+
+# Streaming CSV/XLSX export; filters: start_date, end_date, status (repeatable)
+@app.route('/export/<dataset>')
+@login_required
+def export(dataset):
+    fmt = request.args.get('format', 'csv')
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        return {'success': False, 'error': 'Unknown export'}, 404
+    sql, params, header = exports.build_query(
+        dataset,
+        start_date=request.args.get('start_date') or None,
+        end_date=request.args.get('end_date') or None,
+        statuses=[s for s in request.args.getlist('status') if s])
+    writer, mimetype = exports.FORMATS[fmt]
+    # The request context (and its pooled connection) stays open while streaming
+    rows = exports.iter_rows(get_db(), sql, params)
+    return Response(stream_with_context(writer(header, rows)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={dataset}.{fmt}'})
+
+
+# Background jobs: JSON {"kind", "params"}, or a multipart upload for kind=import
+@app.route('/jobs', methods=['GET', 'POST'])
+@login_required
+def job_list():
+    conn = get_db()
+    if request.method == 'GET':
+        return {'jobs': jobs.recent(conn)}
+    if request.files.get('file'):
+        upload = request.files['file']
+        kind = request.form.get('import_kind', '')
+        if kind not in importer.VALIDATORS:
+            return {'success': False, 'error': 'Unknown import kind'}, 400
+        fmt = request.form.get('format') or ('json' if upload.filename.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv')
+        os.makedirs(app.config['JOBS_DIR'], exist_ok=True)
+        path = os.path.join(app.config['JOBS_DIR'], f'upload-{os.urandom(8).hex()}')
+        upload.save(path)
+        job_kind, params = 'import', {'kind': kind, 'format': fmt, 'path': path}
+    else:
+        data = request.get_json(silent=True) or {}
+        job_kind, params = data.get('kind'), data.get('params') or {}
+        # Only uploads may name a file on the server
+        if job_kind == 'import' or not isinstance(params, dict):
+            return {'success': False, 'error': 'Imports need a file upload'}, 400
+        if job_kind == 'backup':
+            params = {'dest_dir': app.config['BACKUP_DIR'], 'keep': app.config['BACKUP_KEEP']}
+    try:
+        job_id = jobs.get_runner().submit(conn, job_kind, params)
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}, 400
+    return {'success': True, 'id': job_id, 'status_url': url_for('job_status', job_id=job_id)}, 202
+
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = jobs.get(get_db(), job_id)
+    if job is None:
+        return {'success': False, 'error': 'Job not found'}, 404
+    job.pop('result_path')
+    if job['status'] == 'done' and job['result_name']:
+        job['result_url'] = url_for('job_result', job_id=job_id)
+    return job
+
+
+@app.route('/jobs/<int:job_id>/result')
+@login_required
+def job_result(job_id):
+    job = jobs.get(get_db(), job_id)
+    if job is None or job['status'] != 'done' or not job['result_path']:
+        return {'success': False, 'error': 'No result for this job'}, 404
+    return send_file(os.path.abspath(job['result_path']), as_attachment=True, download_name=job['result_name'])
+
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def job_cancel(job_id):
+    if not jobs.get_runner().cancel(get_db(), job_id):
+        return {'success': False, 'error': 'Job is not running'}, 409
+    return {'success': True}
+
+
+# Live order changes for the order boards, as Server-Sent Events
+@app.route('/events')
+@login_required
+def order_events():
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    broadcaster = events.get_broadcaster()
+    sub = broadcaster.subscribe(last_event_id)
+    if sub is None:
+        return {'success': False, 'error': 'Too many live screens open'}, 503, {'Retry-After': '30'}
+    # No stream_with_context: the stream must not hold a pooled connection open
+    return Response(sub.stream(broadcaster), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/view_order')
 @login_required
+@page_cache.cached('orders', 'customers', 'work_items', 'employees')
 def view_order():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
+    conn = get_db()
     # Get orders with status 'pending' and join with customer details
-    c.execute('''SELECT orders.id, customers.name, customers.contact, customers.mobile, customers.email, customers.address, orders.service, orders.order_date, orders.status
-                FROM orders
-                JOIN customers ON orders.customer_id = customers.id
-                WHERE orders.status = ?''', ('pending',))
-    pending_orders = c.fetchall()
-    conn.close()
+    query = PENDING_ORDERS_SQL
+    params = ['pending']
+    match = search.match_query(request.args.get('q', ''))
+    if match:
+        query += f' AND ({search.ORDER_CUSTOMER_MATCH_SQL} OR {search.ORDER_SERVICE_MATCH_SQL})'
+        params += [match, match]
+    pending_orders = paginate_request(conn, query, params, PENDING_ORDER_SORTS, 'date')
     return render_template('view_order.html', pending_orders=pending_orders)
 
 
 @app.route('/customer_ledger')
 @login_required
+@page_cache.cached('orders', 'customers')
 def customer_ledger():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
-    # Find customers with credit orders
-    c.execute('''
-        SELECT DISTINCT c.id, c.name, c.mobile, c.email, c.address
-        FROM customers c
-        JOIN orders o ON c.id = o.customer_id
-        WHERE o.status = 'Credit'
-    ''')
+    # Customers with credit orders, largest outstanding balance first
+    c.execute(ledger.CREDIT_LEDGER_SQL)
     credit_customers = c.fetchall()
-    conn.close()
     return render_template('credit_customers.html', credit_customers=credit_customers)
 
 
+# Statement with running balance; optional start_date/end_date
+@app.route('/customer_statement/<int:customer_id>')
+@login_required
+def customer_statement(customer_id):
+    conn = get_db()
+    customer = conn.execute('SELECT id, name, mobile, email, address FROM customers WHERE id = ?',
+                            (customer_id,)).fetchone()
+    if not customer:
+        flash('Customer not found', 'error')
+        return redirect(url_for('customer_ledger'))
+    start = request.args.get('start_date', '')
+    end = request.args.get('end_date', '')
+    # Without a date range only the latest entries are shown, with the balance brought forward
+    limit = None if start or end else ledger.STATEMENT_PAGE_SIZE
+    include_archive = request.args.get('include_archive') == '1'
+    tables = archive.sources(conn, app.config['ARCHIVE_DATABASE']) if include_archive else {}
+    opening, entries = ledger.statement(conn, customer_id, start, end, limit, **tables)
+    return render_template('customer_statement.html', customer=customer, opening=opening, entries=entries,
+                           balance=ledger.balance(conn, customer_id), start_date=start, end_date=end,
+                           include_archive=include_archive, credit_orders=ledger.credit_orders(conn, customer_id))
+
+
 @app.route('/view_customer', methods=['GET', 'POST'])
 @login_required
+@page_cache.cached('customers',)
 def view_customer():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         name = request.form['name']
@@ -272,27 +865,29 @@ def view_customer():
         address = request.form['address']
         c.execute('INSERT INTO customers (name, mobile, email, address) VALUES (?, ?, ?, ?)', (name, mobile, email, address))
         conn.commit()
-        conn.close()
+        dashboard_cache.invalidate()
         return redirect(url_for('view_customer'))
-    c.execute('SELECT id, name, mobile, email, address FROM customers')
-    customers = c.fetchall()
-    conn.close()
-    return render_template('view_customer.html', customers=customers)
+    return render_template('view_customer.html', customers=customer_page(conn))
+
+def customer_page(conn):
+    query = CUSTOMERS_SQL
+    params = []
+    match = search.match_query(request.args.get('q', ''))
+    if match:
+        query += ' AND ' + search.CUSTOMER_MATCH_SQL
+        params.append(match)
+    return paginate_request(conn, query, params, CUSTOMER_SORTS, 'id')
+
 
 @app.route('/payment_voucher')
 @login_required
+@page_cache.cached('orders', 'customers')
 def payment_voucher():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     # Find customers with paid orders
-    c.execute('''
-        SELECT DISTINCT c.id, c.name, c.mobile, c.email, c.address
-        FROM customers c
-        JOIN orders o ON c.id = o.customer_id
-        WHERE o.status = 'Paid'
-    ''')
+    c.execute(CUSTOMERS_BY_ORDER_STATUS_SQL, ('Paid',))
     paid_customers = c.fetchall()
-    conn.close()
     return render_template('paid_customers.html', paid_customers=paid_customers)
 
 
@@ -304,9 +899,9 @@ def payment_voucher():
 def expenses():
     import re
     from datetime import datetime
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
-    search = request.args.get('search', '')
+    search_text = request.args.get('search', '')
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
 
@@ -317,50 +912,46 @@ def expenses():
         c.execute('INSERT INTO expenses (amount, description, date) VALUES (?, ?, ?)', (amount, description, date))
         conn.commit()
 
-    query = 'SELECT id, amount, description, date FROM expenses WHERE 1=1'
+    query = EXPENSES_SQL
     params = []
     # Check if search is a date in DD/MM/YYYY format
-    date_match = re.match(r'^(\d{2})/(\d{2})/(\d{4})$', search)
+    date_match = re.match(r'^(\d{2})/(\d{2})/(\d{4})$', search_text)
     if date_match:
         # Convert to YYYY-MM-DD for SQLite
         day, month, year = date_match.groups()
         search_date = f"{year}-{month}-{day}"
         query += ' AND date = ?'
         params.append(search_date)
-    elif search:
-        query += ' AND description LIKE ?'
-        params.append('%' + search + '%')
+    elif search.match_query(search_text):
+        # Word-prefix match on the full-text index instead of LIKE '%term%'
+        query += ' AND ' + search.EXPENSE_MATCH_SQL
+        params.append(search.match_query(search_text))
     if start_date:
         query += ' AND date >= ?'
         params.append(start_date)
     if end_date:
         query += ' AND date <= ?'
         params.append(end_date)
-    c.execute(query, params)
-    expenses = c.fetchall()
-    conn.close()
+    expenses = paginate_request(conn, query, params, EXPENSE_SORTS, 'date')
     return render_template('expenses.html', expenses=expenses)
 
 # Expense History Route
 @app.route('/expense_history')
 @login_required
+@page_cache.cached('expenses',)
 def expense_history():
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute('SELECT id, amount, description, date FROM expenses ORDER BY date DESC')
-    expenses = c.fetchall()
-    conn.close()
+    conn = get_db()
+    expenses = paginate_request(conn, EXPENSES_SQL, [], EXPENSE_SORTS, 'date')
     return render_template('expense_history.html', expenses=expenses)
 
 
 @app.route('/delete_expense/<int:expense_id>', methods=['POST'])
 @login_required
 def delete_expense(expense_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     c.execute('DELETE FROM expenses WHERE id=?', (expense_id,))
     conn.commit()
-    conn.close()
     return redirect(url_for('expenses'))
 
 
@@ -370,7 +961,7 @@ def delete_expense(expense_id):
 @app.route('/users', methods=['GET', 'POST'])
 @login_required
 def users():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         username = request.form['username']
@@ -379,36 +970,32 @@ def users():
         conn.commit()
     c.execute('SELECT id, username FROM users')
     users = c.fetchall()
-    conn.close()
     return render_template('users.html', users=users)
 
 
 @app.route('/edit_user/<int:user_id>', methods=['GET', 'POST'])
 @login_required
 def edit_user(user_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         c.execute('UPDATE users SET username=?, password=? WHERE id=?', (username, password, user_id))
         conn.commit()
-        conn.close()
         return redirect(url_for('users'))
     c.execute('SELECT id, username, password FROM users WHERE id=?', (user_id,))
     user = c.fetchone()
-    conn.close()
     return render_template('edit_user.html', user=user)
 
 
 @app.route('/delete_user/<int:user_id>', methods=['POST'])
 @login_required
 def delete_user(user_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     c.execute('DELETE FROM users WHERE id=?', (user_id,))
     conn.commit()
-    conn.close()
     return redirect(url_for('users'))
 
 
@@ -418,7 +1005,7 @@ def delete_user(user_id):
 @app.route('/customers', methods=['GET', 'POST'])
 @login_required
 def customers():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         name = request.form['name']
@@ -427,10 +1014,8 @@ def customers():
         address = request.form['address']
         c.execute('INSERT INTO customers (name, mobile, email, address) VALUES (?, ?, ?, ?)', (name, mobile, email, address))
         conn.commit()
-    c.execute('SELECT id, name, mobile, email, address FROM customers')
-    customers = c.fetchall()
-    conn.close()
-    return render_template('view_customer.html', customers=customers)
+        dashboard_cache.invalidate()
+    return render_template('view_customer.html', customers=customer_page(conn))
 
 
     # Removed job completion by job_id
@@ -439,7 +1024,7 @@ def customers():
 @app.route('/edit_customer/<int:customer_id>', methods=['GET', 'POST'])
 @login_required
 def edit_customer(customer_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         name = request.form['name']
@@ -448,32 +1033,179 @@ def edit_customer(customer_id):
         address = request.form['address']
         c.execute('UPDATE customers SET name=?, mobile=?, email=?, address=? WHERE id=?', (name, mobile, email, address, customer_id))
         conn.commit()
-        conn.close()
         return redirect(url_for('view_customer'))
     c.execute('SELECT id, name, contact, mobile, email, address FROM customers WHERE id=?', (customer_id,))
     customer = c.fetchone()
-    conn.close()
     return render_template('edit_customer.html', customer=customer)
 
 
 @app.route('/delete_customer/<int:customer_id>', methods=['POST'])
 @login_required
 def delete_customer(customer_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     c.execute('DELETE FROM customers WHERE id=?', (customer_id,))
     conn.commit()
-    conn.close()
+    dashboard_cache.invalidate()
     return redirect(url_for('customers'))
 
 
+# -------------------------
+# Print Work Queue
+# -------------------------
+def _work_queue_reply(result, message, order_id=None):
+    """JSON for API clients; a flash message and the queue page for the form."""
+    ok = result == ledger.UPDATED
+    if request.is_json:
+        if result == ledger.NOT_FOUND:
+            return {'success': False, 'error': 'Not in the print queue'}, 404
+        if result == ledger.CONFLICT:
+            return {'success': False, 'error': message}, 409
+        return {'success': True, 'order_id': order_id}
+    flash(message, 'success' if ok else 'error')
+    return redirect(url_for('work_queue_page'))
+
+
+def _work_queue_data():
+    if request.is_json:
+        data = request.get_json(silent=True)
+        return data if isinstance(data, dict) else {}
+    return request.form
+
+
+def _employee_arg(data):
+    """The employee id from the request if that employee exists, else None."""
+    employee_id = data.get('employee_id')
+    if isinstance(employee_id, bool):
+        return None
+    try:
+        employee_id = int(employee_id)
+    except (TypeError, ValueError):
+        return None
+    row = get_db().execute('SELECT id FROM employees WHERE id = ?', (employee_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _work_queue_error(message):
+    if request.is_json:
+        return {'success': False, 'error': message}, 400
+    flash(message, 'error')
+    return redirect(url_for('work_queue_page'))
+
+
+def _unknown_employee(message='Unknown employee'):
+    if request.is_json:
+        return {'success': False, 'error': 'Unknown employee'}, 400
+    flash(message, 'error')
+    return redirect(url_for('work_queue_page'))
+
+
+def _holder_arg(data):
+    """(employee_id or None, error response): None means any holder, an id that does not resolve is an error."""
+    if data.get('employee_id') in (None, ''):
+        return None, None
+    employee_id = _employee_arg(data)
+    return employee_id, (_unknown_employee() if employee_id is None else None)
+
+
+# Not page-cached: the waits on it move with the clock
+@app.route('/work_queue')
+@login_required
+def work_queue_page():
+    conn = get_db()
+    rates = price_book.get(conn)
+    work_queue.sync(conn, rates)
+    return render_template('work_queue.html', queued=work_queue.queued(conn), claimed=work_queue.claimed(conn),
+                           stats=work_queue.stats(conn), services=rates.services,
+                           employees=conn.execute('SELECT id, name FROM employees ORDER BY name').fetchall())
+
+
+# Claim the next order: {"employee_id", "services": [...]} or the queue page's form
+@app.route('/work_queue/claim', methods=['POST'])
+@login_required
+def work_queue_claim():
+    data = _work_queue_data()
+    employee_id = _employee_arg(data)
+    if employee_id is None:
+        return _unknown_employee('Choose an employee')
+    services = data.get('services') if request.is_json else [s for s in request.form.getlist('service') if s]
+    if services is not None and (not isinstance(services, list)
+                                 or not all(isinstance(s, str) and s.strip() for s in services)):
+        return _work_queue_error('"services" must be a list of service names' if request.is_json
+                                 else 'Choose services by name')
+    conn = get_db()
+    order_id = work_queue.claim(conn, price_book.get(conn), employee_id, services)
+    if order_id is None:
+        if request.is_json:
+            return {'success': True, 'order_id': None}
+        flash('Nothing waiting in the queue', 'error')
+        return redirect(url_for('work_queue_page'))
+    dashboard_cache.invalidate()
+    return _work_queue_reply(ledger.UPDATED, f'Order {order_id} assigned', order_id)
+
+
+@app.route('/work_queue/<int:order_id>/complete', methods=['POST'])
+@login_required
+def work_queue_complete(order_id):
+    data = _work_queue_data()
+    employee_id, error = _holder_arg(data)
+    if error:
+        return error
+    result = work_queue.complete(get_db(), order_id, employee_id)
+    if result == ledger.UPDATED:
+        dashboard_cache.invalidate()
+    return _work_queue_reply(result, f'Order {order_id} completed' if result == ledger.UPDATED
+                             else f'Order {order_id} is not claimed by that employee', order_id)
+
+
+@app.route('/work_queue/<int:order_id>/release', methods=['POST'])
+@login_required
+def work_queue_release(order_id):
+    data = _work_queue_data()
+    employee_id, error = _holder_arg(data)
+    if error:
+        return error
+    result = work_queue.release(get_db(), order_id, employee_id)
+    if result == ledger.UPDATED:
+        dashboard_cache.invalidate()
+    return _work_queue_reply(result, f'Order {order_id} back in the queue' if result == ledger.UPDATED
+                             else f'Order {order_id} is not claimed by that employee', order_id)
+
+
+@app.route('/work_queue/<int:order_id>/due', methods=['POST'])
+@login_required
+def work_queue_due(order_id):
+    data = _work_queue_data()
+    try:
+        due = datetime.date.fromisoformat(str(data.get('due_date'))).isoformat()
+    except ValueError:
+        if request.is_json:
+            return {'success': False, 'error': 'due_date must be YYYY-MM-DD'}, 400
+        flash('Due date must be YYYY-MM-DD', 'error')
+        return redirect(url_for('work_queue_page'))
+    result = work_queue.set_due_date(get_db(), order_id, due)
+    return _work_queue_reply(result, f'Order {order_id} due {due}' if result == ledger.UPDATED
+                             else f'Order {order_id} is not in the print queue', order_id)
+
+
+# Queue depth and wait, and per-employee throughput over ?days= (default 30)
+@app.route('/work_queue/stats')
+@login_required
+def work_queue_stats():
+    days = request.args.get('days', 30, type=int)
+    if not 1 <= days <= 366:
+        return {'success': False, 'error': 'days must be between 1 and 366'}, 400
+    return work_queue.stats(get_db(), days)
+
+
 # -------------------------
 # Employee Management
 # -------------------------
 @app.route('/employees', methods=['GET', 'POST'])
 @login_required
+@page_cache.cached('employees',)
 def employees():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         name = request.form['name']
@@ -483,16 +1215,21 @@ def employees():
         address = request.form.get('address', '')
         c.execute('INSERT INTO employees (name, role, mobile, email, address) VALUES (?, ?, ?, ?, ?)', (name, role, mobile, email, address))
         conn.commit()
-    c.execute('SELECT id, name, role, mobile, email, address FROM employees')
-    employees = c.fetchall()
-    conn.close()
+        dashboard_cache.invalidate()
+    query = EMPLOYEES_SQL
+    params = []
+    search = request.args.get('q', '').strip()
+    if search:
+        query += ' AND (name LIKE ? OR role LIKE ?)'
+        params += ['%' + search + '%'] * 2
+    employees = paginate_request(conn, query, params, EMPLOYEE_SORTS, 'id')
     return render_template('employees.html', employees=employees)
 
 
 @app.route('/edit_employee/<int:employee_id>', methods=['GET', 'POST'])
 @login_required
 def edit_employee(employee_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         name = request.form['name']
@@ -502,144 +1239,157 @@ def edit_employee(employee_id):
         address = request.form.get('address', '')
         c.execute('UPDATE employees SET name=?, role=?, mobile=?, email=?, address=? WHERE id=?', (name, role, mobile, email, address, employee_id))
         conn.commit()
-        conn.close()
         return redirect(url_for('employees'))
     c.execute('SELECT id, name, role, mobile, email, address FROM employees WHERE id=?', (employee_id,))
     employee = c.fetchone()
-    conn.close()
     return render_template('edit_employee.html', employee=employee)
 @app.route('/completed_orders', methods=['GET', 'POST'])
+@login_required
+@page_cache.cached('orders', 'customers')
 def complete_order():
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     if request.method == 'POST':
         order_id = request.form.get('order_id')
         if order_id:
-            c.execute("UPDATE orders SET status = 'Completed' WHERE id = ?", (order_id,))
-            conn.commit()
-    c.execute("SELECT orders.id, customers.name, orders.service, orders.amount, orders.status, orders.order_date FROM orders JOIN customers ON orders.customer_id = customers.id WHERE orders.status IN ('Completed', 'Paid', 'Credit')")
-    completed_orders = c.fetchall()
-    conn.close()
-    # completed_orders columns: 0=id, 1=name, 2=service, 3=amount, 4=status, 5=order_date
+            ledger.set_order_status(conn, order_id, 'Completed')
+            dashboard_cache.invalidate()
+    query = COMPLETED_ORDERS_SQL
+    params = []
+    status = request.args.get('status', '')
+    if status in ('Completed', 'Paid', 'Credit'):
+        query += ' AND orders.status = ?'
+        params.append(status)
+    text = request.args.get('q', '').strip()
+    match = search.match_query(text)
+    if match:
+        query += f' AND ({search.ORDER_CUSTOMER_MATCH_SQL} OR {search.ORDER_SERVICE_MATCH_SQL} OR orders.order_date LIKE ?)'
+        params += [match, match, text + '%']
+    completed_orders = paginate_request(conn, query, params, COMPLETED_ORDER_SORTS, 'date')
+    # completed_orders columns: 0=id, 1=name, 2=service, 3=amount, 4=status, 5=order_date, 6=version
     return render_template('completed_orders.html', completed_orders=completed_orders)
 
 
 @app.route('/delete_employee/<int:employee_id>', methods=['POST'])
 @login_required
 def delete_employee(employee_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     c.execute('DELETE FROM employees WHERE id=?', (employee_id,))
     conn.commit()
-    conn.close()
+    dashboard_cache.invalidate()
     return redirect(url_for('employees'))
 
 
 @app.route('/print_order/<int:order_id>')
 @login_required
+@page_cache.cached('orders', 'customers')
 def print_order(order_id):
-    conn = sqlite3.connect('database.db')
+    conn = get_db()
     c = conn.cursor()
     
     # Get complete order details with customer information
-    c.execute('''
-        SELECT o.id, c.name, c.mobile, c.email, c.address, 
-               o.service, o.amount, o.payment_mode, 
-               o.order_date, o.status
-        FROM orders o
-        JOIN customers c ON o.customer_id = c.id
-        WHERE o.id = ?
-    ''', (order_id,))
-    
+    c.execute(ORDER_RECEIPT_SQL, (order_id,))
     order = c.fetchone()
-    conn.close()
     
     if not order:
         flash('Order not found', 'error')
         return redirect(url_for('view_order'))
     
-    # Load company info from settings
-    company_name = 'Bekabe Printing Press'
-    company_address = '123 Main Street, Accra, Ghana'
-    company_phone = '+233 55 123 4567'
-    company_logo = None
-    if os.path.exists('company_settings.txt'):
-        with open('company_settings.txt', 'r', encoding='utf-8') as f:
-            lines = f.read().splitlines()
-            if len(lines) >= 3:
-                company_name = lines[0]
-                company_address = lines[1]
-                company_phone = lines[2]
-            if len(lines) >= 4:
-                company_logo = lines[3]
-    return render_template('print_order.html', order=order, company_name=company_name, company_address=company_address, company_phone=company_phone, company_logo=company_logo)
+    return render_template('print_order.html', order=order)
+
+
+def _receipt_ids():
+    ids = []
+    for value in request.args.getlist('ids'):
+        ids.extend(v.strip() for v in value.split(',') if v.strip())
+    return [int(v) for v in ids if v.isdigit()]
+
+
+# Many receipts in one document, one per printed page: ?ids=1,2,3 or
+# ?customer_id=5 and/or ?start_date=&end_date= (either date alone means that day)
+@app.route('/print_orders')
+@login_required
+@page_cache.cached('orders', 'customers')
+def print_orders():
+    conditions, params = [], []
+    ids = _receipt_ids()
+    if ids:
+        if len(ids) > MAX_BATCH_RECEIPTS:
+            flash(f'More than {MAX_BATCH_RECEIPTS} receipts; narrow the selection', 'error')
+            return redirect(url_for('complete_order'))
+        conditions.append(f"o.id IN ({', '.join('?' * len(ids))})")
+        params += ids
+    customer_id = request.args.get('customer_id', type=int)
+    if customer_id:
+        conditions.append(RECEIPT_CUSTOMER_FILTER)
+        params.append(customer_id)
+    start, end = request.args.get('start_date', ''), request.args.get('end_date', '')
+    if start or end:
+        try:
+            start = datetime.date.fromisoformat(start or end).isoformat()
+            end = datetime.date.fromisoformat(end or start).isoformat()
+        except ValueError:
+            flash('Invalid date range', 'error')
+            return redirect(url_for('complete_order'))
+        conditions.append(RECEIPT_DATE_FILTER)
+        params += [start, end]
+    if not conditions:
+        flash('Choose orders, a customer or a date range to print', 'error')
+        return redirect(url_for('complete_order'))
+    # One query for the whole batch
+    query = ORDER_RECEIPTS_SQL + ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY o.order_date, o.id LIMIT ?'
+    orders = get_db().execute(query, params + [MAX_BATCH_RECEIPTS + 1]).fetchall()
+    if not orders or len(orders) > MAX_BATCH_RECEIPTS:
+        flash('No orders to print' if not orders else
+              f'More than {MAX_BATCH_RECEIPTS} receipts; narrow the selection', 'error')
+        return redirect(url_for('complete_order'))
+    return render_template('print_orders.html', orders=orders)
+
+
+# Calculator forms on service.html: form name -> (service, field prefix)
+CALCULATOR_FORMS = {
+    'sticker': ('sticker', ''),
+    'oneway': ('onewayvision', 'oneway_'),
+    'dtf': ('dtf', 'dtf_'),
+    'banner': ('banner', 'banner_'),
+    'transparent': ('transparent', 'transparent_'),
+}
 
 
 # Service route (must be above main block)
 @app.route('/service', methods=['GET', 'POST'])
 @login_required
 def service():
-    sticker_price = None
-    dtf_price = None
-    banner_price = None
-    transparent_price = None
+    prices = {f'{name}_price': None for name in CALCULATOR_FORMS}
     if request.method == 'POST':
-        try:
-            service_type = request.form.get('service_type', 'sticker')
-            if service_type == 'sticker':
-                qty = float(request.form.get('qty', 0))
-                height = float(request.form.get('height', 0))
-                width = float(request.form.get('width', 0))
-                size_unit = request.form.get('size_unit', 'ft')
-                if size_unit == 'in':
-                    raw_price = 2.2 * qty * (height * width) / 144
-                else:
-                    raw_price = 2.2 * qty * height * width
-                sticker_price = f"GHC {raw_price:,.1f}"
-            elif service_type == 'dtf':
-                qty = float(request.form.get('dtf_qty', 0))
-                dtf_size = request.form.get('dtf_size', 'A4')
-                if dtf_size == 'A3':
-                    raw_price = 14 * qty
-                else:
-                    raw_price = 7 * qty
-                dtf_price = f"GHC {raw_price:,.1f}"
-            elif service_type == 'banner':
-                qty = float(request.form.get('banner_qty', 0))
-                height = float(request.form.get('banner_height', 0))
-                width = float(request.form.get('banner_width', 0))
-                size_unit = request.form.get('banner_size_unit', 'ft')
-                if size_unit == 'in':
-                    raw_price = 2.5 * qty * (height * width) / 144
-                else:
-                    raw_price = 2.5 * qty * height * width
-                banner_price = f"GHC {raw_price:,.1f}"
-            elif service_type == 'transparent':
-                qty = float(request.form.get('transparent_qty', 0))
-                height = float(request.form.get('transparent_height', 0))
-                width = float(request.form.get('transparent_width', 0))
-                size_unit = request.form.get('transparent_size_unit', 'ft')
-                if size_unit == 'in':
-                    raw_price = 1.9 * qty * height * width / 144
-                else:
-                    raw_price = 1.9 * qty * height * width
-                transparent_price = f"GHC {raw_price:,.1f}"
-            elif service_type == 'onewayvision':
-                qty = float(request.form.get('onewayvision_qty', 0))
-                height = float(request.form.get('onewayvision_height', 0))
-                width = float(request.form.get('onewayvision_width', 0))
-                size_unit = request.form.get('onewayvision_size_unit', 'ft')
-                if size_unit == 'in':
-                    raw_price = 4.2 * qty * (height * width) / 144
-                else:
-                    raw_price = 4.2 * qty * height * width
-                onewayvision_price = f"GHC {raw_price:,.1f}"
-        except (TypeError, ValueError):
-            sticker_price = 'Invalid input.'
-            dtf_price = 'Invalid input.'
-            banner_price = 'Invalid input.'
-            transparent_price = 'Invalid input.'
-    return render_template('service.html', sticker_price=sticker_price, dtf_price=dtf_price, banner_price=banner_price, transparent_price=transparent_price)
+        name = request.form.get('service_type', 'sticker')
+        if name in CALCULATOR_FORMS:
+            service_name, prefix = CALCULATOR_FORMS[name]
+            form = request.form
+            try:
+                raw_price = price_book.get(get_db()).price(
+                    service_name, form.get(prefix + 'qty', 0), form.get(prefix + 'height', 0),
+                    form.get(prefix + 'width', 0), form.get(prefix + 'size_unit', 'ft'), form.get(prefix + 'size', 'A4'))
+                prices[f'{name}_price'] = f"GHC {raw_price:,.1f}"
+            except (TypeError, ValueError):
+                prices[f'{name}_price'] = 'Invalid input.'
+    return render_template('service.html', **prices)
+
+
+# Batch quote: {"items": [{"service", "qty", "height", "width", "unit", "size"}, ...]}
+@app.route('/api/quote', methods=['POST'])
+@login_required
+def api_quote():
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return {'success': False, 'error': 'Expected a list of items'}, 400
+    if len(items) > pricing.MAX_QUOTE_ITEMS:
+        return {'success': False, 'error': f'At most {pricing.MAX_QUOTE_ITEMS} items per quote'}, 400
+    results = price_book.get(get_db()).quote(items)
+    total = sum(r['amount'] for r in results if 'amount' in r)
+    return {'success': all('amount' in r for r in results), 'items': results, 'total': round(total, 2)}
 
 
 # -------------------------
@@ -648,41 +1398,29 @@ def service():
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
-    company_name = 'Bekabe Printing Press'
-    company_address = '123 Main Street, Accra, Ghana'
-    company_phone = '+233 55 123 4567'
-    company_logo = None
     message = None
-    # Load saved settings if available
-    if os.path.exists('company_settings.txt'):
-        with open('company_settings.txt', 'r', encoding='utf-8') as f:
-            lines = f.read().splitlines()
-            if len(lines) >= 3:
-                company_name = lines[0]
-                company_address = lines[1]
-                company_phone = lines[2]
-            if len(lines) >= 4:
-                company_logo = lines[3]
     if request.method == 'POST':
-        company_name = request.form.get('company_name', company_name)
-        company_address = request.form.get('company_address', company_address)
-        company_phone = request.form.get('company_phone', company_phone)
+        company = company_info.get()
+        values = {
+            'name': request.form.get('company_name', company.name),
+            'address': request.form.get('company_address', company.address),
+            'phone': request.form.get('company_phone', company.phone),
+        }
         logo_file = request.files.get('company_logo')
         if logo_file and hasattr(logo_file, 'filename') and logo_file.filename:
             filename = secure_filename(logo_file.filename)
             upload_folder = os.path.join('static', 'uploads')
             os.makedirs(upload_folder, exist_ok=True)
             logo_file.save(os.path.join(upload_folder, filename))
-            company_logo = filename
-        # Save settings
-        with open('company_settings.txt', 'w', encoding='utf-8') as f:
-            f.write(f"{company_name}\n{company_address}\n{company_phone}\n{company_logo if company_logo else ''}")
+            values['logo'] = filename
+        # Save settings; the cached copy is replaced at the same time
+        company_info.save(**values)
         message = 'Settings updated successfully.'
-    return render_template('settings.html', company_name=company_name, company_address=company_address, company_phone=company_phone, company_logo=company_logo, message=message)
+    return render_template('settings.html', message=message)
 
 # -------------------------
 # Run app
 # -------------------------
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True)
\ No newline at end of file
+    # Development server; see serve.py for production
+    configure_app().run(debug=True)
\ No newline at end of file
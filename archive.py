@@ -0,0 +1,203 @@
+"""Hot/cold archival of finished orders into ``archive.db``.
+
+Paid orders older than ``ARCHIVE_AFTER_DAYS`` move, with their payments rows,
+to a separate database attached to the connection as schema ``archive``, so
+the status-filtered pages only index the live working set.  Status counts,
+customer balances and daily rollups keep counting archived orders: while
+orders are deleted after the copy, a row in ``archive_guard`` makes the
+DELETE triggers (counters.UNLESS_ARCHIVING) skip them.  The FTS index does
+follow the delete, so the search box only looks at live orders.
+
+Each batch is copied in one transaction and deleted in a second.  In WAL mode
+a transaction spanning two attached databases is not atomic as a whole, so
+the copy can be re-run: rows already archived are refreshed when they are the
+same order (id, customer, service, date and amount), the delete only touches
+orders whose archived copy has the same version, and the ``all_*`` views
+ignore an archived row while the live one still exists.  A crash between the
+two steps leaves the batch live, and the next run finishes it.  Archived ids
+are never reused (counters.id_sequence); a different row under an archived id
+stops the run with ArchiveError rather than overwriting history.
+"""
+import datetime
+import os
+import sqlite3
+
+import counters
+import db
+
+SCHEMA = 'archive'
+ARCHIVE_BATCH_SIZE = 2000
+
+# Columns kept in the archive and exposed by the all_* views
+ORDER_COLUMNS = 'id, customer_id, service, order_date, amount, payment_mode, status, version'
+PAYMENT_COLUMNS = 'id, amount, paid, payment_date, order_id'
+
+TABLES_SQL = f'''
+CREATE TABLE IF NOT EXISTS {SCHEMA}.orders (
+    id INTEGER PRIMARY KEY,
+    customer_id INTEGER,
+    service TEXT,
+    order_date TEXT,
+    amount REAL,
+    payment_mode TEXT,
+    status TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    archived_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS {SCHEMA}.idx_orders_customer_date ON orders(customer_id, order_date);
+CREATE TABLE IF NOT EXISTS {SCHEMA}.payments (
+    id INTEGER PRIMARY KEY,
+    amount REAL,
+    paid INTEGER,
+    payment_date TEXT,
+    order_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS {SCHEMA}.idx_payments_order ON payments(order_id);
+'''
+
+# Temporary, so they exist only on connections that attached the archive
+VIEWS_SQL = f'''
+CREATE TEMP VIEW IF NOT EXISTS all_orders AS
+    SELECT {ORDER_COLUMNS} FROM main.orders
+    UNION ALL
+    SELECT {ORDER_COLUMNS} FROM {SCHEMA}.orders a
+    WHERE NOT EXISTS (SELECT 1 FROM main.orders o WHERE o.id = a.id);
+CREATE TEMP VIEW IF NOT EXISTS all_payments AS
+    SELECT {PAYMENT_COLUMNS} FROM main.payments
+    UNION ALL
+    SELECT {PAYMENT_COLUMNS} FROM {SCHEMA}.payments a
+    WHERE NOT EXISTS (SELECT 1 FROM main.payments p WHERE p.id = a.id);
+CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY);
+'''
+
+CANDIDATES_SQL = '''
+    SELECT id FROM main.orders WHERE status = 'Paid' AND order_date < ? AND id > ? ORDER BY id LIMIT ?
+'''
+PENDING_SQL = "SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM main.orders WHERE status = 'Paid' AND order_date < ?"
+# An order's id, customer, service, date and amount never change; a payment
+# keeps its order and amount.  Only status, version and paid move.
+SAME_ORDER = ('a.customer_id IS o.customer_id AND a.service IS o.service AND a.order_date IS o.order_date '
+              'AND a.amount IS o.amount')
+SAME_PAYMENT = 'a.order_id IS p.order_id AND a.amount IS p.amount'
+COPY_SQL = (
+    # Re-runs refresh what an earlier run copied
+    f'''UPDATE {SCHEMA}.orders AS a SET payment_mode = o.payment_mode, status = o.status, version = o.version
+        FROM main.orders o WHERE o.id = a.id AND o.id IN (SELECT id FROM temp.archive_batch) AND {SAME_ORDER}''',
+    f'''INSERT INTO {SCHEMA}.orders ({ORDER_COLUMNS})
+        SELECT {ORDER_COLUMNS} FROM main.orders o WHERE o.id IN (SELECT id FROM temp.archive_batch)
+        AND NOT EXISTS (SELECT 1 FROM {SCHEMA}.orders a WHERE a.id = o.id AND {SAME_ORDER})''',
+    f'''UPDATE {SCHEMA}.payments AS a SET paid = p.paid, payment_date = p.payment_date
+        FROM main.payments p WHERE p.id = a.id AND p.order_id IN (SELECT id FROM temp.archive_batch)
+        AND {SAME_PAYMENT}''',
+    f'''INSERT INTO {SCHEMA}.payments ({PAYMENT_COLUMNS})
+        SELECT {PAYMENT_COLUMNS} FROM main.payments p WHERE p.order_id IN (SELECT id FROM temp.archive_batch)
+        AND NOT EXISTS (SELECT 1 FROM {SCHEMA}.payments a WHERE a.id = p.id AND {SAME_PAYMENT})''',
+)
+# Live rows whose id is already archived as something else
+CLASH_SQL = (
+    f'''SELECT o.id FROM main.orders o JOIN {SCHEMA}.orders a ON a.id = o.id
+        WHERE o.id IN (SELECT id FROM temp.archive_batch) AND NOT ({SAME_ORDER}) LIMIT 10''',
+    f'''SELECT p.id FROM main.payments p JOIN {SCHEMA}.payments a ON a.id = p.id
+        WHERE p.order_id IN (SELECT id FROM temp.archive_batch) AND NOT ({SAME_PAYMENT}) LIMIT 10''',
+)
+HIGHEST_SQL = f'SELECT (SELECT MAX(id) FROM {SCHEMA}.orders), (SELECT MAX(id) FROM {SCHEMA}.payments)'
+DELETE_SQL = (
+    # Skips orders changed since the copy; they are picked up again next run
+    f'''DELETE FROM main.orders WHERE id IN (SELECT id FROM temp.archive_batch) AND status = 'Paid'
+        AND EXISTS (SELECT 1 FROM {SCHEMA}.orders a WHERE a.id = orders.id AND a.version = orders.version)''',
+    f'''DELETE FROM main.payments WHERE order_id IN (SELECT id FROM temp.archive_batch)
+        AND NOT EXISTS (SELECT 1 FROM main.orders o WHERE o.id = payments.order_id)
+        AND EXISTS (SELECT 1 FROM {SCHEMA}.payments a WHERE a.id = payments.id)''',
+)
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def attach(conn, path, create=False):
+    """Attach the archive as schema ``archive``; returns False if it does not exist (and create is off)."""
+    if any(row[1] == SCHEMA for row in conn.execute('PRAGMA database_list')):
+        return True
+    if not create and not os.path.exists(path):
+        return False
+    conn.execute(f'ATTACH DATABASE ? AS {SCHEMA}', (path,))
+    conn.execute(f'PRAGMA {SCHEMA}.journal_mode = WAL')
+    conn.execute(f'PRAGMA {SCHEMA}.synchronous = NORMAL')
+    db.run_script(conn, TABLES_SQL)
+    db.run_script(conn, VIEWS_SQL)
+    return True
+
+
+def sources(conn, path):
+    """Names to read orders/payments from: the all_* views when an archive exists, else the live tables."""
+    if attach(conn, path):
+        return {'orders': 'all_orders', 'payments': 'all_payments'}
+    return {'orders': 'orders', 'payments': 'payments'}
+
+
+def cutoff(days, today=None):
+    today = today or datetime.date.today()
+    return (today - datetime.timedelta(days=days)).isoformat()
+
+
+def pending(conn, before):
+    """(count, amount) of orders that would be archived."""
+    return tuple(conn.execute(PENDING_SQL, (before,)).fetchone())
+
+
+def archive_orders(conn, path, before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move Paid orders dated before ``before`` and their payments to the archive; returns the count moved."""
+    attach(conn, path, create=True)
+    # Archives written before id_sequence existed: keep their ids out of use from now on
+    _transaction(conn, _raise_id_floor)
+    moved = last_id = 0
+    while True:
+        # Keyset over id, so orders left live by a concurrent change are not retried this run
+        ids = [row[0] for row in conn.execute(CANDIDATES_SQL, (before, last_id, batch_size))]
+        if not ids:
+            break
+        last_id = ids[-1]
+        _transaction(conn, _copy_batch, ids)
+        moved += _transaction(conn, _delete_batch)
+    return moved
+
+
+def _transaction(conn, fn, *args):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn(conn, *args)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return result
+
+
+def _raise_id_floor(conn):
+    for table, highest in zip(('orders', 'payments'), conn.execute(HIGHEST_SQL).fetchone()):
+        if highest:
+            counters.raise_id_floor(conn, table, highest)
+
+
+def _copy_batch(conn, ids):
+    conn.execute('DELETE FROM temp.archive_batch')
+    conn.executemany('INSERT INTO temp.archive_batch (id) VALUES (?)', [(i,) for i in ids])
+    for table, sql in zip(('Order', 'Payment'), CLASH_SQL):
+        clashes = [row[0] for row in conn.execute(sql)]
+        if clashes:
+            raise ArchiveError(f'{table} id(s) {clashes} are already archived as different rows; '
+                               'nothing in this batch was moved')
+    try:
+        for sql in COPY_SQL:
+            conn.execute(sql)
+    except sqlite3.IntegrityError as e:
+        raise ArchiveError(f'Archive copy failed: {e}') from e
+
+
+def _delete_batch(conn):
+    conn.execute('INSERT INTO archive_guard (active) VALUES (1)')
+    deleted = conn.execute(DELETE_SQL[0]).rowcount
+    conn.execute(DELETE_SQL[1])
+    conn.execute('DELETE FROM archive_guard')
+    return deleted
@@ -0,0 +1,274 @@
+"""Online snapshots of the database with SQLite's backup API.
+
+A snapshot copies the live database a few hundred pages at a time while the
+source connection holds one read transaction.  Under WAL that transaction is
+a fixed view of the database, so order entry carries on writing to the WAL
+the whole time and the copy never restarts (the backup API starts over
+whenever another connection writes between steps unless the source reads
+from a snapshot).  Row counts taken in the same transaction are checked
+against the finished copy along with ``PRAGMA integrity_check``, so every
+snapshot is known to restore.
+
+Snapshots are single files (journal_mode DELETE) named
+``database-YYYYmmdd-HHMMSS.db`` under ``BACKUP_DIR``; the newest
+``BACKUP_KEEP`` are kept.  Each run is logged in ``backups`` with its timing,
+which /metrics reports.  With ``BACKUP_INTERVAL_MINUTES`` set, one worker
+process takes a snapshot whenever the last one is older than that.
+"""
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+import db
+
+log = logging.getLogger('printing_press.backup')
+
+# Checked between the live database and the snapshot
+VERIFY_TABLES = ('customers', 'orders', 'payments', 'employees', 'expenses', 'users')
+
+PREFIX = 'database-'
+SUFFIX = '.db'
+# 1024 pages is 4 MB at the default page size; the pause lets other IO through
+STEP_PAGES = 1024
+STEP_SLEEP = 0.005
+
+
+class BackupError(Exception):
+    pass
+
+
+def _counts(conn, tables=VERIFY_TABLES):
+    present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {t: conn.execute(f'SELECT COUNT(*) FROM {t}').fetchone()[0] for t in tables if t in present}
+
+
+def snapshot_name(now=None):
+    return f"{PREFIX}{(now or datetime.datetime.now()).strftime('%Y%m%d-%H%M%S')}{SUFFIX}"
+
+
+def snapshot(src_path, dest_path, pages=STEP_PAGES, sleep=STEP_SLEEP, progress=None):
+    """Copy ``src_path`` to ``dest_path`` online and verify the copy.
+
+    ``progress(copied, total)`` is called after each step.  Returns a dict
+    with the page count, size, steps, seconds and the verified row counts.
+    """
+    started = time.perf_counter()
+    tmp = dest_path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    src = db.connect(src_path)
+    steps = 0
+    try:
+        # One read transaction for the whole copy: a fixed snapshot, and writers are not blocked
+        src.execute('BEGIN')
+        expected = _counts(src)
+        version = src.execute('PRAGMA user_version').fetchone()[0]
+        dst = sqlite3.connect(tmp)
+        try:
+            def step(status, remaining, total):
+                nonlocal steps
+                steps += 1
+                if progress:
+                    progress(total - remaining, total)
+
+            src.backup(dst, pages=pages, progress=step, sleep=sleep)
+            # A self-contained file, no -wal to carry around
+            dst.execute('PRAGMA journal_mode = DELETE')
+            page_count = dst.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            dst.close()
+        src.rollback()
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        src.close()
+    problems = verify(tmp, expected, version)
+    if problems:
+        os.remove(tmp)
+        raise BackupError('; '.join(problems))
+    os.replace(tmp, dest_path)
+    return {'path': dest_path, 'pages': page_count, 'bytes': os.path.getsize(dest_path), 'steps': steps,
+            'seconds': time.perf_counter() - started, 'counts': expected}
+
+
+def verify(path, expected_counts=None, expected_version=None):
+    """Return a list of problems with the snapshot at ``path`` (empty when it is good)."""
+    if not os.path.exists(path):
+        return [f'{path} does not exist']
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        result = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+        if result != ['ok']:
+            return ['integrity check: ' + '; '.join(result[:5])]
+        problems = []
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if expected_version is not None and version != expected_version:
+            problems.append(f'schema version {version}, expected {expected_version}')
+        counts = _counts(conn)
+        for table, expected in (expected_counts or {}).items():
+            if counts.get(table) != expected:
+                problems.append(f'{table}: {counts.get(table)} rows, expected {expected}')
+        return problems
+    except sqlite3.DatabaseError as e:
+        return [f'not a readable database: {e}']
+    finally:
+        conn.close()
+
+
+def snapshots(dest_dir):
+    """Snapshot paths under ``dest_dir``, oldest first."""
+    if not os.path.isdir(dest_dir):
+        return []
+    names = sorted(n for n in os.listdir(dest_dir) if n.startswith(PREFIX) and n.endswith(SUFFIX))
+    return [os.path.join(dest_dir, n) for n in names]
+
+
+def prune(dest_dir, keep):
+    """Delete all but the newest ``keep`` snapshots; returns the removed paths."""
+    removed = snapshots(dest_dir)[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def restore(backup_path, target_path, pages=STEP_PAGES):
+    """Verify ``backup_path`` and copy it over ``target_path``.
+
+    The app must be stopped: this replaces the live database's contents.
+    """
+    problems = verify(backup_path)
+    if problems:
+        raise BackupError('; '.join(problems))
+    src = sqlite3.connect(f'file:{backup_path}?mode=ro', uri=True)
+    dst = db.connect(target_path)
+    try:
+        src.backup(dst, pages=pages)
+        dst.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        dst.close()
+        src.close()
+
+
+def run(conn, src_path, dest_dir, keep, trigger='manual', backup_id=None, progress=None):
+    """Take, verify and log one snapshot, then prune old ones; returns the snapshot stats."""
+    os.makedirs(dest_dir, exist_ok=True)
+    if backup_id is None:
+        backup_id = conn.execute('INSERT INTO backups (trigger) VALUES (?)', (trigger,)).lastrowid
+        conn.commit()
+    path = os.path.join(dest_dir, snapshot_name())
+    try:
+        stats = snapshot(src_path, path, progress=progress)
+    except BaseException as e:
+        conn.execute("UPDATE backups SET status = 'failed', error = ?, finished_at = datetime('now') WHERE id = ?",
+                     (f'{type(e).__name__}: {e}', backup_id))
+        conn.commit()
+        raise
+    conn.execute("UPDATE backups SET status = 'done', path = ?, pages = ?, bytes = ?, seconds = ?, steps = ?, "
+                 "finished_at = datetime('now') WHERE id = ?",
+                 (path, stats['pages'], stats['bytes'], stats['seconds'], stats['steps'], backup_id))
+    conn.commit()
+    stats['pruned'] = prune(dest_dir, keep)
+    return stats
+
+
+def claim(conn, interval_minutes):
+    """Start a scheduled backup unless one started within the interval; returns its id or None.
+
+    BEGIN IMMEDIATE makes the check and the insert atomic, so only one worker
+    process wins each slot.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        recent = conn.execute("SELECT 1 FROM backups WHERE status != 'failed' AND started_at > datetime('now', ?)",
+                              (f'-{int(interval_minutes * 60)} seconds',)).fetchone()
+        backup_id = None
+        if recent is None:
+            backup_id = conn.execute("INSERT INTO backups (trigger) VALUES ('scheduled')").lastrowid
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return backup_id
+
+
+def last(conn):
+    """Stats for /metrics: the latest successful snapshot and the failure count."""
+    row = conn.execute("SELECT CAST(strftime('%s', finished_at) AS INTEGER), seconds, bytes, pages FROM backups "
+                       "WHERE status = 'done' ORDER BY id DESC LIMIT 1").fetchone()
+    stats = {'failures': conn.execute("SELECT COUNT(*) FROM backups WHERE status = 'failed'").fetchone()[0]}
+    if row:
+        stats.update(last_success_timestamp=row[0], last_duration_seconds=round(row[1], 3),
+                     last_bytes=row[2], last_pages=row[3])
+    return stats
+
+
+class Scheduler:
+    """Takes a snapshot every ``interval`` minutes from a daemon thread in this process."""
+
+    def __init__(self, path, dest_dir, keep, interval, check_every=60.0):
+        self.path = path
+        self.dest_dir = dest_dir
+        self.keep = keep
+        self.interval = interval
+        self.check_every = check_every
+        self.pid = os.getpid()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        # Spread worker processes out a little so they do not all check at once
+        if self._stop.wait(self.check_every * (os.getpid() % 10) / 10):
+            return
+        conn = db.connect(self.path)
+        try:
+            while True:
+                try:
+                    backup_id = claim(conn, self.interval)
+                    if backup_id is not None:
+                        run(conn, self.path, self.dest_dir, self.keep, backup_id=backup_id)
+                except Exception:
+                    log.exception('Scheduled backup failed')
+                if self._stop.wait(self.check_every):
+                    return
+        finally:
+            conn.close()
+
+    def stop(self):
+        self._stop.set()
+
+
+# -------------------------
+# Flask integration
+# -------------------------
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(app=None):
+    """Start this process's scheduler if BACKUP_INTERVAL_MINUTES is set; returns it or None."""
+    app = app or current_app
+    if app.config['BACKUP_INTERVAL_MINUTES'] <= 0:
+        return None
+    scheduler = app.extensions.get('backup_scheduler')
+    # Threads do not survive fork(); start a fresh one in the child
+    if scheduler is None or scheduler.pid != os.getpid():
+        with _scheduler_lock:
+            scheduler = app.extensions.get('backup_scheduler')
+            if scheduler is None or scheduler.pid != os.getpid():
+                scheduler = Scheduler(app.config['DATABASE'], app.config['BACKUP_DIR'], app.config['BACKUP_KEEP'],
+                                      app.config['BACKUP_INTERVAL_MINUTES'])
+                app.extensions['backup_scheduler'] = scheduler
+    return scheduler
+
+
+def init_app(app):
+    app.config.setdefault('BACKUP_DIR', 'backups')
+    app.config.setdefault('BACKUP_KEEP', 14)
+    app.config.setdefault('BACKUP_INTERVAL_MINUTES', 0)
@@ -0,0 +1,8 @@
+"""Benchmark suite: synthetic data generator and route latency harness.
+
+    python -m bench generate --orders 100000 --db /tmp/bench.db
+    python -m bench run --orders 100000 --out results.json
+    python -m bench compare baseline.json results.json
+
+See ``python -m bench --help`` for all options.
+"""
@@ -0,0 +1,91 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+from bench import datagen, harness
+
+
+def _generate(args):
+    counts = datagen.create(args.db, orders=args.orders, seed=args.seed)
+    print(', '.join(f'{n} {table}' for table, n in counts.items()), f'written to {args.db}')
+
+
+def _run(args):
+    # Imported here so `generate` and `compare` work without the app's settings
+    from app import app, page_cache
+
+    tmp = None
+    path = args.db
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, 'bench.db')
+        print(f'Generating {args.orders} orders (seed {args.seed})...', file=sys.stderr)
+        datagen.create(path, orders=args.orders, seed=args.seed)
+    app.config['DATABASE'] = path
+    # Otherwise every timed request after the first is a rendered-page LRU hit
+    app.config['PAGE_CACHE'] = page_cache.enabled = args.page_cache
+    # The slow query log would print on every request of a large run
+    logging.getLogger('printing_press.sql').setLevel(logging.ERROR)
+    try:
+        routes = {name: url for name, url in harness.ROUTES.items() if not args.route or name in args.route}
+        result = harness.run(app, routes, requests=args.requests, warmup=args.warmup)
+    finally:
+        pool = app.extensions.pop('db_pool', None)
+        if pool:
+            pool.close()
+        if tmp:
+            tmp.cleanup()
+    for name, r in result['routes'].items():
+        print(f"{name:<24} {r['status']}  p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+              f"p99 {r['p99_ms']:8.2f} ms  {r['rps']:8.1f} req/s")
+    if args.out:
+        harness.save(result, args.out)
+        print(f'Results written to {args.out}')
+
+
+def _compare(args):
+    lines, regressed = harness.compare(harness.load(args.baseline), harness.load(args.current),
+                                       args.metric, args.threshold)
+    print('\n'.join(lines))
+    if regressed:
+        print(f'{len(regressed)} route(s) regressed by more than {args.threshold:.0%}')
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m bench', description='Printing press benchmarks.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('generate', help='Write a synthetic database.')
+    p.add_argument('--db', required=True, help='New database file to create.')
+    p.add_argument('--orders', type=int, default=10000)
+    p.add_argument('--seed', type=int, default=42)
+    p.set_defaults(func=_generate)
+
+    p = sub.add_parser('run', help='Time the routes and optionally write JSON results.')
+    p.add_argument('--db', help='Existing benchmark database (default: generate a temporary one).')
+    p.add_argument('--orders', type=int, default=10000)
+    p.add_argument('--seed', type=int, default=42)
+    p.add_argument('--requests', type=int, default=200, help='Timed requests per route.')
+    p.add_argument('--warmup', type=int, default=20, help='Untimed requests per route first.')
+    p.add_argument('--route', action='append', help='Only this route (repeatable).')
+    p.add_argument('--page-cache', action='store_true',
+                   help='Serve repeat requests from the rendered-page cache (off: time the queries).')
+    p.add_argument('--out', help='Write results to this JSON file.')
+    p.set_defaults(func=_run)
+
+    p = sub.add_parser('compare', help='Compare two result files; exit 1 on regressions.')
+    p.add_argument('baseline')
+    p.add_argument('current')
+    p.add_argument('--metric', default='p95_ms', choices=('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'))
+    p.add_argument('--threshold', type=float, default=0.10, help='Allowed slowdown, e.g. 0.10 for 10%%.')
+    p.set_defaults(func=_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
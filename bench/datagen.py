@@ -0,0 +1,102 @@
+"""Deterministic synthetic printing-press data.
+
+The same seed and sizes always produce the same database.  Distributions are
+loosely modelled on a real shop: a few regular customers place most orders
+(Zipf), stickers and banners dominate, most jobs are paid, and dates run
+back a year from a fixed anchor so results do not drift with the calendar.
+"""
+import datetime
+import itertools
+import random
+
+import db
+import migrations
+import pricing
+
+ANCHOR_DATE = datetime.date(2025, 1, 1)
+DAYS = 365
+CHUNK = 10000
+
+SERVICE_WEIGHTS = {'sticker': 35, 'banner': 25, 'dtf': 20, 'transparent': 10, 'onewayvision': 10}
+STATUS_WEIGHTS = {'Paid': 50, 'Credit': 20, 'Completed': 15, 'pending': 15}
+PAYMENT_MODES = ('cash', 'momo', 'card')
+EXPENSE_ITEMS = ('ink', 'vinyl roll', 'banner material', 'DTF film', 'electricity', 'transport', 'maintenance', 'rent')
+ROLES = ('Designer', 'Printer', 'Finisher', 'Cashier', 'Manager')
+FIRST_NAMES = ('Kwame', 'Ama', 'Kofi', 'Akosua', 'Yaw', 'Abena', 'Kojo', 'Efua', 'Kwesi', 'Adwoa', 'Jude', 'Esi')
+LAST_NAMES = ('Mensah', 'Owusu', 'Boateng', 'Asante', 'Appiah', 'Osei', 'Addo', 'Agyeman', 'Darko', 'Ofori')
+TOWNS = ('Accra', 'Kumasi', 'Tamale', 'Takoradi', 'Cape Coast', 'Wa', 'Ho', 'Koforidua')
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _day(rng):
+    return (ANCHOR_DATE - datetime.timedelta(days=rng.randrange(DAYS))).isoformat()
+
+
+def _line_amount(rng, rates, service):
+    if service == 'dtf':
+        return rates.price('dtf', rng.randint(1, 20), size=rng.choice(('A4', 'A4', 'A3')))
+    # Most jobs are a few square feet; a few are large banners
+    height = round(rng.lognormvariate(0.8, 0.6), 1)
+    width = round(rng.lognormvariate(1.0, 0.6), 1)
+    return rates.price(service, rng.randint(1, 10), height, width)
+
+
+def generate(conn, orders=10000, seed=42, customers=None, expenses=None, employees=12):
+    """Fill an empty, migrated database; returns the row counts written."""
+    rng = random.Random(seed)
+    customers = customers or max(10, orders // 20)
+    expenses = expenses if expenses is not None else max(10, orders // 10)
+    rates = pricing.RateTable.load(conn)
+    # Zipf-like: customer i is picked with weight 1 / i ** 0.9, so low ids are the regulars
+    customer_ids = range(1, customers + 1)
+    cum_weights = list(itertools.accumulate(1 / i ** 0.9 for i in customer_ids))
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute("INSERT OR IGNORE INTO users (id, username, password) VALUES (1, 'admin', 'admin123')")
+        conn.executemany('INSERT INTO customers (id, name, mobile, email, address) VALUES (?, ?, ?, ?, ?)', (
+            (i, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}', f'0{rng.randrange(200000000, 599999999)}',
+             f'customer{i}@example.com', rng.choice(TOWNS))
+            for i in range(1, customers + 1)))
+        conn.executemany('INSERT INTO employees (id, name, role, mobile, email, address) VALUES (?, ?, ?, ?, ?, ?)', (
+            (i, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', rng.choice(ROLES),
+             f'0{rng.randrange(200000000, 599999999)}', f'staff{i}@example.com', rng.choice(TOWNS))
+            for i in range(1, employees + 1)))
+        for start in range(0, orders, CHUNK):
+            order_rows = []
+            payment_rows = []
+            order_ids = range(start + 1, min(start + CHUNK, orders) + 1)
+            picks = rng.choices(customer_ids, cum_weights=cum_weights, k=len(order_ids))
+            for order_id, customer_id in zip(order_ids, picks):
+                service = _weighted(rng, SERVICE_WEIGHTS)
+                status = _weighted(rng, STATUS_WEIGHTS)
+                day = _day(rng)
+                amount = round(_line_amount(rng, rates, service), 2)
+                order_rows.append((order_id, customer_id, service, day, amount,
+                                   rng.choice(PAYMENT_MODES) if status == 'Paid' else 'Unpaid', status))
+                payment_rows.append((order_id, order_id, amount, 1 if status == 'Paid' else 0, day))
+            conn.executemany('INSERT INTO orders (id, customer_id, service, order_date, amount, payment_mode, status) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?)', order_rows)
+            conn.executemany('INSERT INTO payments (id, order_id, amount, paid, payment_date) VALUES (?, ?, ?, ?, ?)',
+                             payment_rows)
+        conn.executemany('INSERT INTO expenses (amount, description, date) VALUES (?, ?, ?)', (
+            (round(rng.lognormvariate(4, 1), 2), rng.choice(EXPENSE_ITEMS), _day(rng)) for _ in range(expenses)))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return {'customers': customers, 'orders': orders, 'payments': orders, 'expenses': expenses, 'employees': employees}
+
+
+def create(path, **kwargs):
+    """Create a new database at ``path``, migrate it and fill it."""
+    conn = db.connect(path)
+    try:
+        migrations.migrate(conn)
+        if conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]:
+            raise ValueError(f'{path} already has orders; use a new file')
+        return generate(conn, **kwargs)
+    finally:
+        conn.close()
@@ -0,0 +1,128 @@
+"""Drive the Flask routes through the test client and time them."""
+import datetime
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import time
+
+# name -> URL; {order_id} and {customer_id} are filled in from the database
+ROUTES = {
+    'dashboard': '/dashboard',
+    'view_order': '/view_order',
+    'complete_order': '/completed_orders',
+    'complete_order.search': '/completed_orders?q=banner',
+    'customer_ledger': '/customer_ledger',
+    'view_customer': '/view_customer',
+    'expenses': '/expenses',
+    'expenses.date_range': '/expenses?start_date=2024-06-01&end_date=2024-06-30',
+    'print_order': '/print_order/{order_id}',
+    'customer_statement': '/customer_statement/{customer_id}',
+    'system_report': '/system_report?start_date=2024-01-01&end_date=2024-12-31&group=month',
+    'search': '/search?q=kwame',
+}
+
+
+def percentile(sorted_values, pct):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[pct - 1]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(app, routes=None, requests=200, warmup=20, username='admin', password='admin123'):
+    """Time each route ``requests`` times after ``warmup`` untimed calls; return a result dict."""
+    routes = routes or ROUTES
+    conn = sqlite3.connect(app.config['DATABASE'])
+    ids = {
+        # The busiest customer and one of their orders: the worst case for statements
+        'customer_id': conn.execute('SELECT customer_id FROM customer_balance ORDER BY order_count DESC LIMIT 1').fetchone()[0],
+        'order_id': conn.execute('SELECT MAX(id) FROM orders').fetchone()[0],
+    }
+    sizes = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+             for table in ('customers', 'orders', 'payments', 'expenses', 'employees')}
+    conn.close()
+
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': password})
+    results = {}
+    for name, url in routes.items():
+        url = url.format(**ids)
+        for _ in range(warmup):
+            client.get(url)
+        timings = []
+        status = None
+        start = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            timings.append(time.perf_counter() - t)
+            status = response.status_code
+        total = time.perf_counter() - start
+        timings.sort()
+        results[name] = {
+            'url': url,
+            'status': status,
+            'requests': requests,
+            'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'max_ms': round(timings[-1] * 1000, 3),
+            'rps': round(requests / total, 1),
+        }
+    return {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'sizes': sizes,
+            'requests': requests,
+            'warmup': warmup,
+            'page_cache': bool(app.config.get('PAGE_CACHE')),
+        },
+        'routes': results,
+    }
+
+
+def compare(baseline, current, metric='p95_ms', threshold=0.10):
+    """Return (report lines, regressed route names) comparing two result dicts."""
+    lines = [f"{'route':<24} {'base ' + metric:>14} {'new ' + metric:>14} {'change':>8}"]
+    regressed = []
+    for name, new in current['routes'].items():
+        old = baseline['routes'].get(name)
+        if old is None:
+            lines.append(f'{name:<24} {"-":>14} {new[metric]:>14.3f} {"new":>8}')
+            continue
+        change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+        flag = ''
+        if change > threshold:
+            regressed.append(name)
+            flag = '  REGRESSION'
+        lines.append(f'{name:<24} {old[metric]:>14.3f} {new[metric]:>14.3f} {change:>+8.1%}{flag}')
+    if baseline['meta'].get('sizes') != current['meta'].get('sizes'):
+        lines.append('warning: the two runs used different data sizes')
+    if baseline['meta'].get('page_cache') != current['meta'].get('page_cache'):
+        lines.append('warning: only one of the two runs served pages from the page cache')
+    return lines, regressed
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(result, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
@@ -0,0 +1,162 @@
+"""Conditional GET and rendered-page caching keyed on table data versions.
+
+``data_versions`` holds a counter per table, bumped by triggers on every
+insert, update and delete, so any connection in any worker process can tell
+whether a table changed with one primary-key lookup.  A page decorated with
+``PageCache.cached(*tables)`` gets an ETag built from those counters (plus the
+URL, the logged-in user and anything ``key_extra`` returns).  A browser that
+already has that version gets a 304 without the view running, and the
+rendered HTML of recent versions is kept in a small LRU, so a refresh after
+another terminal's refresh costs one query and no rendering.
+
+Only GET requests are cached, and responses that touch the session (flash
+messages, logins) are passed through untouched.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request, session
+
+import db
+
+# Tables whose changes invalidate cached pages (service_rates: pricing.Pricing)
+TABLES = ('customers', 'orders', 'payments', 'employees', 'expenses', 'users', 'work_items', 'service_rates')
+
+
+def _bump(table):
+    return (f"UPDATE data_versions SET version = version + 1, changed_at = datetime('now') "
+            f"WHERE name = '{table}';")
+
+
+def _triggers(table):
+    return f'''
+CREATE TRIGGER IF NOT EXISTS {table}_data_version_insert AFTER INSERT ON {table}
+BEGIN {_bump(table)} END;
+CREATE TRIGGER IF NOT EXISTS {table}_data_version_update AFTER UPDATE ON {table}
+BEGIN {_bump(table)} END;
+CREATE TRIGGER IF NOT EXISTS {table}_data_version_delete AFTER DELETE ON {table}
+BEGIN {_bump(table)} END;
+'''
+
+
+VERSIONS_SQL = 'SELECT name, version, changed_at FROM data_versions WHERE name IN ({})'
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def install(conn, tables=TABLES):
+    """(Re)create the version triggers of ``tables``; their data_versions rows must exist."""
+    db.replace_triggers(conn, ''.join(_triggers(t) for t in tables))
+
+
+def versions(conn, tables):
+    """Return ({table: version}, latest change as a datetime or None)."""
+    rows = conn.execute(VERSIONS_SQL.format(', '.join('?' * len(tables))), tables).fetchall()
+    changed = max((row[2] for row in rows), default=None)
+    if changed:
+        changed = datetime.fromisoformat(changed).replace(tzinfo=timezone.utc)
+    return {row[0]: row[1] for row in rows}, changed
+
+
+class PageCache:
+    def __init__(self, get_db, key_extra=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.get_db = get_db
+        self.key_extra = key_extra
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # etag -> (body, mimetype)
+        self._bytes = 0
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _etag(self, tables):
+        current, changed = versions(self.get_db(), tables)
+        parts = (request.endpoint, request.full_path, session.get('user_id'),
+                 sorted(current.items()), self.key_extra() if self.key_extra else None)
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest(), changed
+
+    def _get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def _put(self, etag, body, mimetype):
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            if etag in self._entries:
+                return
+            self._entries[etag] = (body, mimetype)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (old, _) = self._entries.popitem(last=False)
+                self._bytes -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def cached(self, *tables):
+        """Serve the view with an ETag over ``tables`` and cache its HTML."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Flashed messages are shown once, so those pages are never reused
+                if not self.enabled or request.method != 'GET' or '_flashes' in session:
+                    return view(*args, **kwargs)
+                etag, changed = self._etag(tables)
+                if request.if_none_match.contains(etag):
+                    with self._lock:
+                        self.not_modified += 1
+                    response = make_response('', 304)
+                    return self._finish(response, etag, changed)
+                entry = self._get(etag)
+                if entry is not None:
+                    return self._finish(make_response(entry[0]), etag, changed, entry[1])
+                response = make_response(view(*args, **kwargs))
+                if (response.status_code == 200 and not response.direct_passthrough
+                        and response.mimetype == 'text/html' and not session.modified):
+                    self._put(etag, response.get_data(), response.mimetype)
+                    return self._finish(response, etag, changed)
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _finish(response, etag, changed, mimetype=None):
+        if mimetype:
+            response.mimetype = mimetype
+        response.set_etag(etag)
+        if changed:
+            response.last_modified = changed
+        # Browsers keep the page but must ask again; the answer is usually a 304
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
@@ -1,14 +1,302 @@
+"""Operations queries against the live database, streamed from the cursor.
+
+    python check_orders_status.py                         # every order and its status
+    python check_orders_status.py orders --status Credit --since 2025-01-01 --format csv
+    python check_orders_status.py status                  # order counts per status
+    python check_orders_status.py credit --days 30 --summary
+    python check_orders_status.py daily --since 2025-09-01 --group week
+    python check_orders_status.py integrity [--full]
+    python check_orders_status.py analyze
+    python check_orders_status.py vacuum
+
+Rows are written as they come off the cursor (a few hundred at a time), so
+the first line appears straight away and memory use does not depend on the
+size of the database.  Filters are part of the SQL and use the same indexes
+as the app.  ``--format`` is ``table`` (fixed-width columns), ``csv`` or
+``json`` (one object per line).  The database is PPM_DATABASE or
+database.db unless ``--db`` is given; it must be migrated (the app does that
+on startup, or ``flask --app app init-db``), and its journal mode is left as
+it is.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
 import sqlite3
+import sys
+
+import archive
+import config
+import counters
+import db
+import migrations
+import reports
+from exports import iter_rows
+from importer import ORDER_STATUSES
+
+ORDERS_SQL = '''
+    SELECT o.id, c.name, o.service, o.amount, o.payment_mode, o.status, o.order_date
+    FROM orders o LEFT JOIN customers c ON c.id = o.customer_id
+'''
+ORDERS_COLUMNS = (('order_id', 8), ('customer', 24), ('service', 16), ('amount', 10),
+                  ('payment_mode', 12), ('status', 10), ('order_date', 10))
+
+STATUS_SQL = '''
+    SELECT status, order_count, total_amount FROM order_status_counts
+    WHERE order_count != 0 ORDER BY order_count DESC
+'''
+STATUS_COLUMNS = (('status', 12), ('orders', 10), ('amount', 14))
+
+# Credit orders dated on or before the cutoff, oldest first (idx_orders_status_date)
+OVERDUE_SQL = '''
+    SELECT o.id, c.id, c.name, c.mobile, o.service, o.amount, o.order_date,
+           CAST(julianday(:today) - julianday(o.order_date) AS INTEGER)
+    FROM orders o LEFT JOIN customers c ON c.id = o.customer_id
+    WHERE o.status = 'Credit' AND o.order_date <= :cutoff
+    ORDER BY o.order_date, o.id
+'''
+OVERDUE_COLUMNS = (('order_id', 8), ('customer_id', 11), ('customer', 24), ('mobile', 14),
+                   ('service', 16), ('amount', 10), ('order_date', 10), ('days', 5))
+OVERDUE_SUMMARY_SQL = '''
+    SELECT c.id, c.name, c.mobile, COUNT(*), SUM(o.amount), MIN(o.order_date)
+    FROM orders o LEFT JOIN customers c ON c.id = o.customer_id
+    WHERE o.status = 'Credit' AND o.order_date <= :cutoff
+    GROUP BY o.customer_id ORDER BY SUM(o.amount) DESC
+'''
+OVERDUE_SUMMARY_COLUMNS = (('customer_id', 11), ('customer', 24), ('mobile', 14), ('orders', 7),
+                           ('amount', 12), ('oldest', 10))
+
+DAILY_COLUMNS = (('period', 10), ('orders', 7), ('revenue', 12), ('paid', 12), ('credit', 12),
+                 ('expense_count', 13), ('expenses', 12), ('profit', 12))
+
+ORPHAN_CHECKS = (
+    ('orders without a customer',
+     'SELECT COUNT(*) FROM orders o WHERE NOT EXISTS (SELECT 1 FROM customers c WHERE c.id = o.customer_id)'),
+    ('payments for a missing order',
+     'SELECT COUNT(*) FROM payments p WHERE p.order_id IS NOT NULL '
+     'AND NOT EXISTS (SELECT 1 FROM orders o WHERE o.id = p.order_id)'),
+    ('orders with an unknown status',
+     f"SELECT COUNT(*) FROM orders WHERE status NOT IN ({', '.join(repr(s) for s in ORDER_STATUSES)})"),
+)
+INTEGRITY_COLUMNS = (('check', 30), ('result', 6), ('detail', 60))
+
+
+# -------------------------
+# Output
+# -------------------------
+def _cell(value, width):
+    if value is None:
+        text = ''
+    elif isinstance(value, float):
+        text = f'{value:.2f}'
+    else:
+        text = str(value)
+    text = text if len(text) <= width else text[:width - 1] + '~'
+    return text.rjust(width) if isinstance(value, (int, float)) else text.ljust(width)
+
+
+def write(rows, columns, fmt, out=None):
+    """Write ``rows`` one at a time as they are produced; returns the number written."""
+    out = out or sys.stdout
+    names = [name for name, _ in columns]
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(names)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+    elif fmt == 'json':
+        for count, row in enumerate(rows, 1):
+            out.write(json.dumps(dict(zip(names, row))) + '\n')
+    else:
+        out.write(' '.join(name[:width].ljust(width) for name, width in columns).rstrip() + '\n')
+        out.write(' '.join('-' * width for _, width in columns) + '\n')
+        for count, row in enumerate(rows, 1):
+            out.write(' '.join(_cell(value, width) for value, (_, width) in zip(row, columns)).rstrip() + '\n')
+    return count
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected YYYY-MM-DD, got {value!r}') from None
+
+
+# -------------------------
+# Subcommands
+# -------------------------
+def _orders(conn, args):
+    conditions, params = [], []
+    if args.status or args.since or args.until:
+        # Every status when only dates are given, so idx_orders_status_date still applies
+        statuses = args.status or ORDER_STATUSES
+        conditions.append(f"o.status IN ({', '.join('?' * len(statuses))})")
+        params += statuses
+    if args.since:
+        conditions.append('o.order_date >= ?')
+        params.append(args.since)
+    if args.until:
+        conditions.append('o.order_date <= ?')
+        params.append(args.until)
+    if args.customer:
+        conditions.append('o.customer_id = ?')
+        params.append(args.customer)
+    sql = ORDERS_SQL
+    if conditions and (args.status or args.since or args.until):
+        # Index order, grouped by status: sorting across statuses would buffer every row first
+        sql += ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY o.status, o.order_date, o.id'
+    elif conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY o.order_date, o.id'
+    else:
+        # Plain rowid order: no sort, the first rows print immediately
+        sql += ' ORDER BY o.id'
+    if args.limit:
+        sql += ' LIMIT ?'
+        params.append(args.limit)
+    write(iter_rows(conn, sql, params), ORDERS_COLUMNS, args.format)
+
+
+def _status(conn, args):
+    # Trigger-maintained counts: a handful of rows however many orders there are
+    write(iter_rows(conn, STATUS_SQL, ()), STATUS_COLUMNS, args.format)
+
+
+def _credit(conn, args):
+    today = datetime.date.today()
+    params = {'today': today.isoformat(), 'cutoff': (today - datetime.timedelta(days=args.days)).isoformat()}
+    if args.summary:
+        write(iter_rows(conn, OVERDUE_SUMMARY_SQL, params), OVERDUE_SUMMARY_COLUMNS, args.format)
+    else:
+        write(iter_rows(conn, OVERDUE_SQL, params), OVERDUE_COLUMNS, args.format)
+
+
+def _daily(conn, args):
+    until = args.until or datetime.date.today().isoformat()
+    since = args.since or (datetime.date.fromisoformat(until) - datetime.timedelta(days=30)).isoformat()
+    # From the daily rollup tables, not the orders table
+    sql = reports.REPORT_SQL.format(period=reports.PERIODS[args.group])
+    write(iter_rows(conn, sql, (since, until)), DAILY_COLUMNS, args.format)
+
+
+def _integrity(conn, args):
+    failed = False
+
+    def results():
+        nonlocal failed
+        pragma = 'integrity_check' if args.full else 'quick_check'
+        messages = [row[0] for row in conn.execute(f'PRAGMA {pragma}')]
+        ok = messages == ['ok']
+        failed |= not ok
+        yield pragma, 'ok' if ok else 'FAIL', '' if ok else '; '.join(messages[:5])
+        for name, sql in ORPHAN_CHECKS:
+            count = conn.execute(sql).fetchone()[0]
+            yield name, 'ok' if not count else 'warn', f'{count} row(s)' if count else ''
+        # Archived orders are still counted, so recount them too
+        orders = archive.sources(conn, args.archive)['orders']
+        for module, name in ((counters, 'status counts and balances'), (reports, 'daily rollups')):
+            drift = module.check(conn, orders)
+            failed |= bool(drift)
+            yield name, 'ok' if not drift else 'FAIL', (
+                f'{len(drift)} difference(s), first: {drift[0]}; fix with flask rebuild-counters' if drift else '')
+
+    write(results(), INTEGRITY_COLUMNS, args.format)
+    # Non-zero exit status for cron and monitoring
+    return 1 if failed else 0
+
+
+def _analyze(conn, args):
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    conn.commit()
+    tables = conn.execute("SELECT COUNT(DISTINCT tbl) FROM sqlite_stat1").fetchone()[0]
+    print(f'Statistics refreshed for {tables} table(s)', file=sys.stderr)
+
+
+def _vacuum(conn, args):
+    before = os.path.getsize(args.db)
+    # VACUUM rewrites the whole file and holds the write lock while it does
+    print('Vacuuming; order entry waits until this finishes', file=sys.stderr)
+    conn.execute('VACUUM')
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    after = os.path.getsize(args.db)
+    print(f'{before / 1048576:.1f} MB -> {after / 1048576:.1f} MB', file=sys.stderr)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description='Order and database checks for operations.')
+    parser.add_argument('--db', default=config.from_env()['DATABASE'], help='Database file (default %(default)s).')
+    parser.add_argument('--format', choices=('table', 'csv', 'json'), default='table')
+    commands = parser.add_subparsers(dest='command')
+
+    orders = commands.add_parser('orders', help='List orders (the default).')
+    orders.add_argument('--status', action='append', choices=ORDER_STATUSES, help='Repeat for several.')
+    orders.add_argument('--since', type=_date, help='First order date, YYYY-MM-DD.')
+    orders.add_argument('--until', type=_date, help='Last order date, YYYY-MM-DD.')
+    orders.add_argument('--customer', type=int, help='Customer id.')
+    orders.add_argument('--limit', type=int)
+    orders.set_defaults(run=_orders)
+
+    commands.add_parser('status', help='Order count and amount per status.').set_defaults(run=_status)
+
+    credit = commands.add_parser('credit', help='Credit orders older than --days.')
+    credit.add_argument('--days', type=int, default=30, help='Overdue after this many days (default %(default)s).')
+    credit.add_argument('--summary', action='store_true', help='One row per customer.')
+    credit.set_defaults(run=_credit)
+
+    daily = commands.add_parser('daily', help='Revenue and expense totals per day, week or month.')
+    daily.add_argument('--since', type=_date, help='Default: 30 days before --until.')
+    daily.add_argument('--until', type=_date, help='Default: today.')
+    daily.add_argument('--group', choices=sorted(reports.PERIODS), default='day')
+    daily.set_defaults(run=_daily)
+
+    integrity = commands.add_parser('integrity', help='Database, orphan row and counter checks.')
+    integrity.add_argument('--full', action='store_true', help='PRAGMA integrity_check instead of quick_check.')
+    integrity.add_argument('--archive', default=config.from_env()['ARCHIVE_DATABASE'])
+    integrity.set_defaults(run=_integrity)
+
+    commands.add_parser('analyze', help='Refresh query planner statistics.').set_defaults(run=_analyze)
+    commands.add_parser('vacuum', help='Rebuild the file and reclaim free space (blocks writers).').set_defaults(run=_vacuum)
+    return parser
+
+
+def connect(path):
+    """The app's connection tuning, except that the journal mode is left as the file has it."""
+    conn = sqlite3.connect(path, timeout=5.0, cached_statements=db.STATEMENT_CACHE_SIZE)
+    for name, value in db.PRAGMAS:
+        if name != 'journal_mode':
+            conn.execute(f'PRAGMA {name} = {value}')
+    return conn
 
-conn = sqlite3.connect('database.db')
-c = conn.cursor()
 
-# Show all orders and their status
-c.execute('SELECT id, service, amount, status FROM orders')
-orders = c.fetchall()
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        args = parser.parse_args(list(argv or sys.argv[1:]) + ['orders'])
+    if not os.path.exists(args.db):
+        parser.error(f'{args.db} does not exist')
+    conn = connect(args.db)
+    try:
+        # The queries rely on tables and columns the migrations add
+        try:
+            version = migrations.current_version(conn)
+        except sqlite3.DatabaseError as e:
+            parser.error(f'{args.db}: {e}')
+        if version < migrations.latest_version():
+            parser.error(f'{args.db} is at schema version {version}, these checks need '
+                         f'{migrations.latest_version()}; run: flask --app app init-db')
+        return args.run(conn, args) or 0
+    except BrokenPipeError:
+        # Piped into head and the reader went away; keep the interpreter from complaining at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except sqlite3.Error as e:
+        parser.exit(1, f'{parser.prog}: error: {e}\n')
+    finally:
+        conn.close()
 
-print('Order ID | Service | Amount | Status')
-for order in orders:
-    print(order)
 
-conn.close()
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Company details shown on receipts and the settings page.
+
+The settings file is read once and kept in memory.  It is re-read only when
+its modification time changes (checked at most every ``check_interval``
+seconds) or when ``save()`` writes new values, so rendering a receipt does no
+file I/O.  The file keeps its original format: name, address, phone and logo
+filename, one per line.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+
+Company = namedtuple('Company', 'name address phone logo')
+
+DEFAULTS = Company(
+    name='Bekabe Printing Press',
+    address='123 Main Street, Accra, Ghana',
+    phone='+233 55 123 4567',
+    logo=None,
+)
+
+
+def parse(text):
+    lines = text.splitlines()
+    company = DEFAULTS
+    if len(lines) >= 3:
+        company = company._replace(name=lines[0], address=lines[1], phone=lines[2])
+    if len(lines) >= 4:
+        company = company._replace(logo=lines[3] or None)
+    return company
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class CompanySettings:
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._company = None
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _load(self):
+        mtime = _mtime(self.path)
+        if mtime is None:
+            return DEFAULTS, None
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return parse(f.read()), mtime
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._company is not None and now - self._checked_at < self.check_interval:
+                return self._company
+            self._checked_at = now
+            if self._company is None or _mtime(self.path) != self._mtime:
+                self._company, self._mtime = self._load()
+            return self._company
+
+    def save(self, **values):
+        with self._lock:
+            company = (self._company or self._load()[0])._replace(**values)
+            # Write a temp file and swap it in so readers never see half a file
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(f"{company.name}\n{company.address}\n{company.phone}\n{company.logo or ''}")
+            os.replace(tmp, self.path)
+            self._company = company
+            self._mtime = _mtime(self.path)
+            self._checked_at = time.monotonic()
+            return company
+
+    def invalidate(self):
+        with self._lock:
+            self._company = None
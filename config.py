@@ -0,0 +1,80 @@
+"""Application and server settings, overridable through the environment.
+
+Every key in DEFAULTS (app.config) and SERVER_DEFAULTS (serve.py) can be set
+with a ``PPM_`` environment variable, e.g. ``PPM_DATABASE=/srv/press.db`` or
+``PPM_WORKERS=4``.  Values are converted to the type of the default.
+"""
+import os
+
+PREFIX = 'PPM_'
+
+DEFAULTS = {
+    'SECRET_KEY': 'your_secret_key',
+    'DATABASE': 'database.db',
+    'DB_POOL_SIZE': 8,
+    'DB_POOL_TIMEOUT': 10.0,
+    'DASHBOARD_CACHE_TTL': 5.0,
+    'COMPANY_SETTINGS': 'company_settings.txt',
+    # Paid orders older than this move to the archive database (flask archive-orders)
+    'ARCHIVE_DATABASE': 'archive.db',
+    'ARCHIVE_AFTER_DAYS': 365,
+    # ETags and rendered-page LRU for list and receipt pages (caching.py)
+    'PAGE_CACHE': True,
+    'PAGE_CACHE_ENTRIES': 256,
+    # Live order board over Server-Sent Events (events.py); each open
+    # stream holds one server thread, so the per-process limit is kept
+    # below THREADS (0 means half of them)
+    'EVENTS_POLL_INTERVAL': 0.5,
+    'EVENTS_MAX_CLIENTS': 0,
+    'EVENTS_KEEP': 10000,
+    # Online snapshots (backup.py); 0 minutes turns the schedule off
+    'BACKUP_DIR': 'backups',
+    'BACKUP_KEEP': 14,
+    'BACKUP_INTERVAL_MINUTES': 0,
+    'INSTRUMENTATION': True,
+    'SLOW_QUERY_MS': 100.0,
+    # Bearer token that lets a Prometheus scraper read /metrics without a
+    # login; empty means only logged-in users can
+    'METRICS_TOKEN': '',
+    'JOBS_DIR': 'jobs',
+    'JOB_WORKERS': 2,
+    # Finished background jobs and their result files are deleted after this
+    # many days (0 keeps them forever)
+    'JOB_KEEP_DAYS': 7,
+}
+
+SERVER_DEFAULTS = {
+    'SERVER': 'auto',  # gunicorn, waitress or auto (gunicorn where available)
+    'BIND': '0.0.0.0:8000',
+    # SQLite takes one writer at a time, so a few processes with threads go
+    # further than many single-threaded workers
+    'WORKERS': 2,
+    'THREADS': 4,
+    'TIMEOUT': 60,
+}
+
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off', '')
+
+
+def _convert(name, raw, default):
+    if isinstance(default, bool):
+        value = raw.strip().lower()
+        if value not in _TRUE + _FALSE:
+            raise ValueError(f'{PREFIX}{name} must be a boolean, got {raw!r}')
+        return value in _TRUE
+    try:
+        return type(default)(raw)
+    except ValueError:
+        raise ValueError(f'{PREFIX}{name} must be {type(default).__name__}, got {raw!r}') from None
+
+
+def from_env(defaults=DEFAULTS, environ=None):
+    """Return ``defaults`` with any PPM_* overrides from the environment applied."""
+    environ = os.environ if environ is None else environ
+    settings = dict(defaults)
+    for name, default in defaults.items():
+        raw = environ.get(PREFIX + name)
+        if raw is not None:
+            settings[name] = _convert(name, raw, default)
+    return settings
@@ -0,0 +1,163 @@
+"""Order status totals and per-customer balances, maintained by triggers.
+
+``order_status_counts`` holds one row per order status and ``customer_balance``
+one row per customer.  Triggers on ``orders`` keep both exact, so the dashboard
+reads a handful of rows no matter how much order history there is.
+``id_sequence`` records the highest order and payment id ever used, so ids of
+orders moved to the archive are never handed out again.
+"""
+import db
+
+# archive.py holds a row in archive_guard while it deletes orders it has moved
+# to the archive; those orders stay counted.
+UNLESS_ARCHIVING = 'WHEN NOT EXISTS (SELECT 1 FROM archive_guard)'
+
+
+def _apply(row, sign):
+    # Statements adding (sign '+') or removing (sign '-') one order row
+    status = f"COALESCE({row}.status, '')"
+    amount = f'COALESCE({row}.amount, 0)'
+    credit = f"CASE WHEN {row}.status = 'Credit' THEN 1 ELSE 0 END"
+    paid = f"CASE WHEN {row}.status = 'Paid' THEN 1 ELSE 0 END"
+    return f'''
+    INSERT OR IGNORE INTO order_status_counts (status) VALUES ({status});
+    UPDATE order_status_counts
+       SET order_count = order_count {sign} 1,
+           total_amount = total_amount {sign} {amount}
+     WHERE status = {status};
+    INSERT OR IGNORE INTO customer_balance (customer_id)
+        SELECT {row}.customer_id WHERE {row}.customer_id IS NOT NULL;
+    UPDATE customer_balance
+       SET order_count = order_count {sign} 1,
+           total_amount = total_amount {sign} {amount},
+           credit_orders = credit_orders {sign} {credit},
+           credit_amount = credit_amount {sign} {credit} * {amount},
+           paid_orders = paid_orders {sign} {paid},
+           paid_amount = paid_amount {sign} {paid} * {amount}
+     WHERE customer_id = {row}.customer_id;'''
+
+
+TRIGGERS_SQL = f'''
+CREATE TRIGGER IF NOT EXISTS orders_counters_insert AFTER INSERT ON orders
+BEGIN{_apply('NEW', '+')}
+END;
+CREATE TRIGGER IF NOT EXISTS orders_counters_delete AFTER DELETE ON orders {UNLESS_ARCHIVING}
+BEGIN{_apply('OLD', '-')}
+END;
+CREATE TRIGGER IF NOT EXISTS orders_counters_update AFTER UPDATE OF customer_id, amount, status ON orders
+BEGIN{_apply('OLD', '-')}{_apply('NEW', '+')}
+END;
+'''
+
+# Recomputed from scratch, used by rebuild() and check().  {orders} is
+# ``orders`` or archive.py's ``all_orders`` view.
+FRESH_STATUS_SQL = '''
+    SELECT COALESCE(status, ''), COUNT(*), COALESCE(SUM(amount), 0)
+    FROM {orders} GROUP BY COALESCE(status, '')
+'''
+FRESH_BALANCE_SQL = '''
+    SELECT customer_id, COUNT(*), COALESCE(SUM(amount), 0),
+           SUM(CASE WHEN status = 'Credit' THEN 1 ELSE 0 END),
+           COALESCE(SUM(CASE WHEN status = 'Credit' THEN amount END), 0),
+           SUM(CASE WHEN status = 'Paid' THEN 1 ELSE 0 END),
+           COALESCE(SUM(CASE WHEN status = 'Paid' THEN amount END), 0)
+    FROM {orders} WHERE customer_id IS NOT NULL GROUP BY customer_id
+'''
+
+# Highest id ever inserted per table.  archive.py deletes rows from the live
+# tables, so MAX(id) alone would give an archived order's id to a new one.
+SEQUENCE_TABLES = ('orders', 'payments')
+ID_SEQUENCE_TRIGGERS_SQL = ''.join(f'''
+CREATE TRIGGER IF NOT EXISTS {table}_id_sequence AFTER INSERT ON {table}
+BEGIN
+    UPDATE id_sequence SET last_id = NEW.id WHERE name = '{table}' AND last_id < NEW.id;
+END;
+''' for table in SEQUENCE_TABLES)
+NEXT_ID_SQL = '''
+    SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM {table}),
+               (SELECT COALESCE(MAX(last_id), 0) FROM id_sequence WHERE name = '{table}')) + 1
+'''
+
+STATUS_COUNT_SQL = 'SELECT COALESCE(SUM(order_count), 0) FROM order_status_counts WHERE status IN ({})'
+CREDIT_CUSTOMERS_COUNT_SQL = '''
+    SELECT COUNT(*) FROM customer_balance b
+    JOIN customers c ON c.id = b.customer_id
+    WHERE b.credit_orders > 0
+'''
+
+
+def install(conn):
+    db.replace_triggers(conn, TRIGGERS_SQL)
+
+
+def install_id_sequence(conn):
+    db.replace_triggers(conn, ID_SEQUENCE_TRIGGERS_SQL)
+
+
+def next_id(conn, table):
+    """First unused id for ``table`` ('orders' or 'payments'), counting archived rows.
+
+    Call inside the write transaction that inserts the rows.
+    """
+    return conn.execute(NEXT_ID_SQL.format(table=table)).fetchone()[0]
+
+
+def raise_id_floor(conn, table, last_id):
+    """Never hand out ids up to ``last_id`` again (archive.py passes its highest archived id)."""
+    conn.execute('UPDATE id_sequence SET last_id = ? WHERE name = ? AND last_id < ?', (last_id, table, last_id))
+
+
+def refill(conn, orders='orders'):
+    conn.execute('DELETE FROM order_status_counts')
+    conn.execute('DELETE FROM customer_balance')
+    conn.execute('INSERT INTO order_status_counts (status, order_count, total_amount) '
+                 + FRESH_STATUS_SQL.format(orders=orders))
+    conn.execute('INSERT INTO customer_balance (customer_id, order_count, total_amount, credit_orders, '
+                 'credit_amount, paid_orders, paid_amount) ' + FRESH_BALANCE_SQL.format(orders=orders))
+
+
+def check(conn, orders='orders'):
+    """Compare the summary tables with a full recount; return a list of differences."""
+    drift = []
+    stored = {row[0]: row[1:] for row in conn.execute(
+        'SELECT status, order_count, total_amount FROM order_status_counts WHERE order_count != 0')}
+    fresh = {row[0]: row[1:] for row in conn.execute(FRESH_STATUS_SQL.format(orders=orders))}
+    for status in sorted(set(stored) | set(fresh)):
+        if not _same(stored.get(status), fresh.get(status)):
+            drift.append(f'status {status!r}: stored {stored.get(status)}, actual {fresh.get(status)}')
+    stored = {row[0]: row[1:] for row in conn.execute(
+        'SELECT customer_id, order_count, total_amount, credit_orders, credit_amount, paid_orders, paid_amount '
+        'FROM customer_balance WHERE order_count != 0')}
+    fresh = {row[0]: row[1:] for row in conn.execute(FRESH_BALANCE_SQL.format(orders=orders))}
+    for customer_id in sorted(set(stored) | set(fresh)):
+        if not _same(stored.get(customer_id), fresh.get(customer_id)):
+            drift.append(f'customer {customer_id}: stored {stored.get(customer_id)}, actual {fresh.get(customer_id)}')
+    return drift
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a == b
+    return all(abs(x - y) < 0.005 for x, y in zip(a, b))
+
+
+def rebuild(conn, orders='orders'):
+    """Recount both summary tables from ``orders``; return the drift that was fixed."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        drift = check(conn, orders)
+        refill(conn, orders)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return drift
+
+
+def status_count(conn, *statuses):
+    sql = STATUS_COUNT_SQL.format(', '.join('?' * len(statuses)))
+    return conn.execute(sql, statuses).fetchone()[0]
+
+
+def credit_customer_count(conn):
+    return conn.execute(CREDIT_CUSTOMERS_COUNT_SQL).fetchone()[0]
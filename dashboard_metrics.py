@@ -0,0 +1,59 @@
+"""Dashboard counters, fetched in a single statement and cached in-process.
+
+Staff terminals refresh the dashboard constantly, so the counters are kept in
+memory until a write that can change them calls ``invalidate()``.  The TTL only
+bounds how stale another worker process can be, since invalidation is local.
+"""
+import threading
+import time
+
+import counters
+import work_queue
+
+# Order figures come from the trigger-maintained tables in counters.py
+PENDING_COUNT_SQL = counters.STATUS_COUNT_SQL.format("'pending'")
+COMPLETED_COUNT_SQL = counters.STATUS_COUNT_SQL.format("'Completed', 'Paid', 'Credit'")
+CREDIT_CUSTOMERS_COUNT_SQL = counters.CREDIT_CUSTOMERS_COUNT_SQL
+# Orders an employee has claimed from the print queue and not finished
+WORKING_COUNT_SQL = work_queue.CLAIMED_COUNT_SQL
+
+METRICS_SQL = f'''
+    SELECT (SELECT COUNT(*) FROM customers),
+           ({PENDING_COUNT_SQL}),
+           ({COMPLETED_COUNT_SQL}),
+           ({WORKING_COUNT_SQL}),
+           ({CREDIT_CUSTOMERS_COUNT_SQL})
+'''
+
+# Template variable names, in METRICS_SQL column order
+FIELDS = ('total_orders', 'pending_orders', 'completed_orders', 'working_orders', 'credit_customers_count')
+
+
+class DashboardMetrics:
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._values = None
+        self._loaded_at = 0.0
+        self._generation = 0
+
+    def compute(self, conn):
+        return dict(zip(FIELDS, conn.execute(METRICS_SQL).fetchone()))
+
+    def get(self, conn):
+        with self._lock:
+            if self._values is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._values
+            generation = self._generation
+        values = self.compute(conn)
+        with self._lock:
+            # Don't cache a result that an invalidate() raced with
+            if generation == self._generation:
+                self._values = values
+                self._loaded_at = time.monotonic()
+        return values
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+            self._generation += 1
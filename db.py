@@ -0,0 +1,208 @@
+"""SQLite connection handling shared by the web app and the maintenance scripts.
+
+Every request used to open (and tune) a brand new connection.  Connections are
+now kept in a small bounded pool per worker process and handed out once per
+application context through ``get_db()``.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+DEFAULT_DATABASE = 'database.db'
+
+# Applied to every new connection.  WAL lets readers carry on while a cashier
+# is saving an order; NORMAL sync is safe in WAL mode and avoids an fsync per
+# commit.  cache_size is negative so it is read as KiB (16 MB).
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -16000),
+    ('mmap_size', 268435456),
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+# Size of sqlite3's per-connection prepared statement cache.  The app only has
+# a few dozen distinct statements, so they all stay compiled.
+STATEMENT_CACHE_SIZE = 256
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def connect(path=DEFAULT_DATABASE, factory=sqlite3.Connection):
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE, factory=factory)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+def run_script(conn, script):
+    """Execute a multi-statement script inside the caller's transaction.
+
+    Unlike Connection.executescript() this does not COMMIT first, so it can be
+    used from migrations.
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ''
+    if statement.strip():
+        conn.execute(statement)
+
+
+_TRIGGER_NAME = re.compile(r'CREATE TRIGGER IF NOT EXISTS (\w+)')
+
+
+def replace_triggers(conn, script):
+    """Drop the triggers ``script`` creates, then run it, so changed trigger bodies take effect."""
+    for name in _TRIGGER_NAME.findall(script):
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+    run_script(conn, script)
+
+
+class ConnectionPool:
+    def __init__(self, path=DEFAULT_DATABASE, size=8, timeout=10.0, factory=sqlite3.Connection):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.factory = factory
+        self.pid = os.getpid()
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        # Statistics
+        self.checkouts = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        conn = None
+        with self._cond:
+            self.checkouts += 1
+            waited = False
+            while True:
+                if self._idle:
+                    # LIFO so the most recently used (warmest) connection is reused first
+                    conn = self._idle.pop()
+                    if not waited:
+                        self.hits += 1
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    self.misses += 1
+                    break
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if not self._idle:
+                        self.timeouts += 1
+                        raise PoolTimeout(f'No database connection free after {self.timeout}s')
+        if conn is None:
+            try:
+                conn = connect(self.path, self.factory)
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self.wait_time += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Broken connection, drop it and let the next checkout open a fresh one
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'in_use': self._created - len(self._idle),
+                'checkouts': self.checkouts,
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'hit_rate': round(self.hits / self.checkouts, 4) if self.checkouts else 0.0,
+                'wait_time_total_ms': round(self.wait_time * 1000, 3),
+                'wait_time_avg_ms': round(self.wait_time * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_time_max_ms': round(self.max_wait * 1000, 3),
+            }
+
+
+# -------------------------
+# Flask integration
+# -------------------------
+_pool_lock = threading.Lock()
+
+
+def get_pool(app=None):
+    app = app or current_app
+    pool = app.extensions.get('db_pool')
+    # A pool inherited through fork() (gunicorn --preload) must not be shared
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            pool = app.extensions.get('db_pool')
+            if pool is None or pool.pid != os.getpid():
+                pool = ConnectionPool(app.config['DATABASE'],
+                                      size=app.config['DB_POOL_SIZE'],
+                                      timeout=app.config['DB_POOL_TIMEOUT'],
+                                      factory=app.config['DB_CONNECTION_FACTORY'])
+                app.extensions['db_pool'] = pool
+    return pool
+
+
+def get_db():
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+
+def init_app(app):
+    app.config.setdefault('DATABASE', DEFAULT_DATABASE)
+    app.config.setdefault('DB_POOL_SIZE', 8)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10.0)
+    app.config.setdefault('DB_CONNECTION_FACTORY', sqlite3.Connection)
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,260 @@
+"""Order change feed pushed to browsers over Server-Sent Events.
+
+Triggers on ``orders`` append a row to ``order_events`` for every new order,
+status change and deletion, whichever code path made it (add_order,
+complete_order, the payment status endpoints, imports).  One poller thread per
+worker process reads new events and fans them out to every connected
+``/events`` stream.  Polling is skipped while ``PRAGMA data_version`` says no
+other connection has committed, so N screens cost one cheap check per
+interval plus one small message per change.
+
+Browsers reconnect with ``Last-Event-ID`` and get the events they missed
+replayed from the table (up to REPLAY_LIMIT, after which they are told to
+reload).  The log is pruned to the newest ``EVENTS_KEEP`` rows.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+
+import config
+import db
+from counters import UNLESS_ARCHIVING
+
+log = logging.getLogger('printing_press.events')
+
+TRIGGERS_SQL = f'''
+CREATE TRIGGER IF NOT EXISTS orders_events_insert AFTER INSERT ON orders
+BEGIN
+    INSERT INTO order_events (order_id, kind, status, version) VALUES (NEW.id, 'created', NEW.status, NEW.version);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_events_status AFTER UPDATE OF status ON orders
+WHEN OLD.status IS NOT NEW.status
+BEGIN
+    INSERT INTO order_events (order_id, kind, status, old_status, version)
+    VALUES (NEW.id, 'status', NEW.status, OLD.status, NEW.version);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_events_delete AFTER DELETE ON orders {UNLESS_ARCHIVING}
+BEGIN
+    INSERT INTO order_events (order_id, kind, old_status) VALUES (OLD.id, 'deleted', OLD.status);
+END;
+'''
+
+# Order and customer details for the board; deleted orders have none
+EVENTS_SQL = '''
+    SELECT e.id, e.order_id, e.kind, e.status, e.old_status, e.version, e.created_at,
+           c.name, c.mobile, c.email, c.address, o.service, o.amount, o.order_date
+    FROM order_events e
+    LEFT JOIN orders o ON o.id = e.order_id
+    LEFT JOIN customers c ON c.id = o.customer_id
+    WHERE e.id > ? AND e.id <= ?
+    ORDER BY e.id LIMIT ?
+'''
+EVENT_FIELDS = ('id', 'order_id', 'kind', 'status', 'old_status', 'version', 'created_at',
+                'customer_name', 'mobile', 'email', 'address', 'service', 'amount', 'order_date')
+LAST_ID_SQL = 'SELECT COALESCE(MAX(id), 0) FROM order_events'
+OLDEST_ID_SQL = 'SELECT COALESCE(MIN(id), 0) FROM order_events'
+PRUNE_SQL = 'DELETE FROM order_events WHERE id <= ?'
+
+FETCH_SIZE = 500
+REPLAY_LIMIT = 1000
+QUEUE_SIZE = 1000
+HEARTBEAT = 15.0
+PRUNE_INTERVAL = 600.0
+
+
+def install(conn):
+    db.replace_triggers(conn, TRIGGERS_SQL)
+
+
+def fetch(conn, after, upto=None, limit=FETCH_SIZE):
+    upto = (1 << 62) if upto is None else upto
+    return [dict(zip(EVENT_FIELDS, row)) for row in conn.execute(EVENTS_SQL, (after, upto, limit))]
+
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: order\ndata: {json.dumps(event)}\n\n"
+
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(QUEUE_SIZE)
+        # Set when the client fell too far behind; it reconnects and replays
+        self.closed = False
+
+    def stream(self, broadcaster, heartbeat=HEARTBEAT):
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = self.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    if self.closed:
+                        return
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(event) if event['kind'] != 'reset' else 'event: reset\ndata: {}\n\n'
+        finally:
+            broadcaster.unsubscribe(self)
+
+
+class Broadcaster:
+    def __init__(self, path, poll_interval=0.5, max_clients=32, keep=10000):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self.keep = keep
+        self.pid = os.getpid()
+        self.last_id = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # Statistics
+        self.polls = 0
+        self.queries = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def subscribe(self, last_event_id=None):
+        """Register a client; returns None when MAX_CLIENTS streams are already open."""
+        self._start()
+        sub = Subscription()
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            # Under the lock, so nothing between the replay and the live feed is lost
+            if last_event_id is not None and last_event_id < self.last_id:
+                for event in self._missed(last_event_id):
+                    sub.queue.put_nowait(event)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def _missed(self, last_event_id):
+        conn = db.connect(self.path)
+        try:
+            oldest = conn.execute(OLDEST_ID_SQL).fetchone()[0]
+            missed = fetch(conn, last_event_id, self.last_id, REPLAY_LIMIT + 1)
+        finally:
+            conn.close()
+        # Pruned or too far behind: the page is better off reloading
+        if last_event_id + 1 < oldest or len(missed) > REPLAY_LIMIT:
+            return [{'kind': 'reset'}]
+        return missed
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                conn = db.connect(self.path)
+                try:
+                    self.last_id = conn.execute(LAST_ID_SQL).fetchone()[0]
+                finally:
+                    conn.close()
+                self._thread = threading.Thread(target=self._run, name='order-events', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        conn = db.connect(self.path)
+        seen = None
+        pruned_at = time.monotonic()
+        try:
+            while not self._stop.wait(self.poll_interval):
+                self.polls += 1
+                # Only changes by other connections move data_version, and this one never writes events
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if version == seen:
+                    continue
+                seen = version
+                while True:
+                    self.queries += 1
+                    events = fetch(conn, self.last_id)
+                    if events:
+                        self._publish(events)
+                    if len(events) < FETCH_SIZE:
+                        break
+                if time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    conn.execute(PRUNE_SQL, (self.last_id - self.keep,))
+                    conn.commit()
+        finally:
+            conn.close()
+
+    def _publish(self, events):
+        with self._lock:
+            self.last_id = events[-1]['id']
+            for sub in list(self._subscribers):
+                for event in events:
+                    try:
+                        sub.queue.put_nowait(event)
+                    except queue.Full:
+                        # Too slow; drop it, the browser reconnects with Last-Event-ID
+                        sub.closed = True
+                        self._subscribers.discard(sub)
+                        self.dropped += 1
+                        break
+                else:
+                    self.sent += len(events)
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._subscribers), 'last_event_id': self.last_id or 0, 'polls': self.polls,
+                    'queries': self.queries, 'sent': self.sent, 'dropped': self.dropped}
+
+    def stop(self):
+        self._stop.set()
+
+
+# -------------------------
+# Flask integration
+# -------------------------
+_broadcaster_lock = threading.Lock()
+
+
+def client_limit(app):
+    """Streams one process may hold open.
+
+    Each open stream holds a server thread of that process, so by default
+    half of ``SERVER_THREADS`` may stream, and a configured limit that would
+    leave no thread for ordinary requests is lowered to leave one.
+    """
+    threads = app.config['SERVER_THREADS']
+    limit = app.config['EVENTS_MAX_CLIENTS']
+    if limit <= 0:
+        return threads // 2
+    if limit >= threads:
+        log.warning('EVENTS_MAX_CLIENTS=%d would let live screens hold all %d threads of a worker; '
+                    'allowing %d streams', limit, threads, threads - 1)
+        return threads - 1
+    return limit
+
+
+def get_broadcaster(app=None):
+    app = app or current_app
+    broadcaster = app.extensions.get('order_events')
+    # The poller thread does not survive fork(); start a fresh one in the child
+    if broadcaster is None or broadcaster.pid != os.getpid():
+        with _broadcaster_lock:
+            broadcaster = app.extensions.get('order_events')
+            if broadcaster is None or broadcaster.pid != os.getpid():
+                broadcaster = Broadcaster(app.config['DATABASE'], app.config['EVENTS_POLL_INTERVAL'],
+                                          client_limit(app), app.config['EVENTS_KEEP'])
+                app.extensions['order_events'] = broadcaster
+    return broadcaster
+
+
+def init_app(app):
+    app.config.setdefault('EVENTS_POLL_INTERVAL', 0.5)
+    app.config.setdefault('EVENTS_MAX_CLIENTS', 0)
+    # serve.py passes the real thread count; wsgi.py under a bare server gets PPM_THREADS
+    app.config.setdefault('SERVER_THREADS', config.from_env(config.SERVER_DEFAULTS)['THREADS'])
+    app.config.setdefault('EVENTS_KEEP', 10000)
@@ -0,0 +1,167 @@
+"""Streaming CSV and XLSX exports.
+
+Rows are pulled from the SQLite cursor in small batches and encoded as they
+go, so the first bytes reach the browser straight away and memory use does not
+depend on the size of the export.  XLSX files are written through zipfile in
+streaming mode (no seeking), with inline strings so no shared-string table has
+to be built up front.
+"""
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+FETCH_SIZE = 500
+
+# name -> (select ending in a WHERE clause, header, date column, status column, ORDER BY)
+DATASETS = {
+    'orders': (
+        '''SELECT o.id, c.name, o.service, o.amount, o.payment_mode, o.status, o.order_date
+           FROM orders o LEFT JOIN customers c ON c.id = o.customer_id WHERE 1=1''',
+        ('Order ID', 'Customer', 'Service', 'Amount', 'Payment Mode', 'Status', 'Order Date'),
+        'o.order_date', 'o.status', 'o.id'),
+    'customers': (
+        'SELECT id, name, mobile, email, address FROM customers WHERE 1=1',
+        ('ID', 'Name', 'Mobile', 'Email', 'Address'),
+        None, None, 'id'),
+    'credit': (
+        '''SELECT c.id, c.name, c.mobile, o.id, o.service, o.amount, o.order_date
+           FROM orders o JOIN customers c ON c.id = o.customer_id WHERE o.status = 'Credit\'''',
+        ('Customer ID', 'Customer', 'Mobile', 'Order ID', 'Service', 'Amount', 'Order Date'),
+        'o.order_date', None, 'o.customer_id, o.order_date, o.id'),
+    'paid': (
+        '''SELECT c.id, c.name, c.mobile, o.id, o.service, o.amount, o.order_date
+           FROM orders o JOIN customers c ON c.id = o.customer_id WHERE o.status = 'Paid\'''',
+        ('Customer ID', 'Customer', 'Mobile', 'Order ID', 'Service', 'Amount', 'Order Date'),
+        'o.order_date', None, 'o.customer_id, o.order_date, o.id'),
+    'expenses': (
+        'SELECT id, amount, description, date FROM expenses WHERE 1=1',
+        ('ID', 'Amount', 'Description', 'Date'),
+        'date', None, 'date, id'),
+}
+
+
+def build_query(dataset, start_date=None, end_date=None, statuses=()):
+    sql, header, date_column, status_column, order_by = DATASETS[dataset]
+    params = []
+    if date_column and start_date:
+        sql += f' AND {date_column} >= ?'
+        params.append(start_date)
+    if date_column and end_date:
+        sql += f' AND {date_column} <= ?'
+        params.append(end_date)
+    if status_column and statuses:
+        sql += f" AND {status_column} IN ({', '.join('?' * len(statuses))})"
+        params += list(statuses)
+    return sql + ' ORDER BY ' + order_by, params, header
+
+
+def iter_rows(conn, sql, params, size=FETCH_SIZE):
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield from rows
+
+
+def csv_stream(header, rows, flush_every=FETCH_SIZE):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % flush_every == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+class _Sink:
+    # Write-only, unseekable file object; zipfile switches to streaming mode
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+_XLSX_STATIC = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+
+# Characters XML 1.0 does not allow
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xml_row(row):
+    return '<row>' + ''.join(_cell(v) for v in row) + '</row>'
+
+
+def xlsx_stream(header, rows, flush_every=FETCH_SIZE):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_STATIC.items():
+            zf.writestr(name, content)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xml_row(header).encode('utf-8'))
+            for n, row in enumerate(rows, 1):
+                sheet.write(_xml_row(row).encode('utf-8'))
+                if n % flush_every == 0:
+                    yield sink.take()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.take()
+
+
+FORMATS = {
+    'csv': (csv_stream, 'text/csv'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
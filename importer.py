@@ -0,0 +1,333 @@
+"""Streaming CSV/JSON import for customers, orders and expenses.
+
+Rows are read one at a time, validated with the same rules as the entry forms
+(and pricing.py for orders given as dimensions instead of an amount) and
+written in large batches, one transaction per batch.  Only the current batch
+and a capped list of row errors are held in memory, so a file of any size
+imports in flat memory.  A JSON array element that does not parse ends the
+read with a row error, since the next element cannot be found reliably.
+"""
+import csv
+import functools
+import io
+import json
+import re
+import time
+
+import counters
+import migrations
+import pricing
+
+DEFAULT_CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+# A JSON array element still unparseable with this much text buffered is malformed
+MAX_JSON_ROW_CHARS = 1 << 20
+ORDER_STATUSES = ('pending', 'Completed', 'Paid', 'Credit')
+
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'skipped': self.skipped,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'elapsed_s': round(self.elapsed, 3),
+            'rows_per_s': round(self.rows / self.elapsed) if self.elapsed else 0,
+        }
+
+
+# -------------------------
+# Readers
+# -------------------------
+def read_rows(stream, fmt):
+    """Yield (line, row dict) from a binary stream of CSV, JSON array or JSON lines."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'json':
+        yield from _read_json(text)
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _read_json(text, chunk_size=65536):
+    decoder = json.JSONDecoder()
+    buf = text.read(chunk_size).lstrip()
+    if not buf.startswith('['):
+        # JSON lines, one object per line
+        line = 0
+        for raw in _lines(buf, text):
+            line += 1
+            if raw.strip():
+                try:
+                    yield line, json.loads(raw)
+                except ValueError:
+                    yield line, RowError('invalid JSON')
+        return
+    buf = buf[1:]
+    eof = False
+    index = 0
+    while True:
+        buf = buf.lstrip().lstrip(',').lstrip()
+        if buf.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof or len(buf) > MAX_JSON_ROW_CHARS:
+                # Where the next element starts is unknown, so the rest of the file is not read
+                yield index + 1, RowError('invalid JSON, import stopped here' if buf
+                                          else 'the JSON array is never closed')
+                return
+            more = text.read(chunk_size)
+            eof = not more
+            buf += more
+            continue
+        index += 1
+        yield index, obj
+        buf = buf[end:]
+
+
+def _lines(head, text):
+    pending = head
+    while True:
+        *complete, pending = pending.split('\n')
+        yield from complete
+        chunk = text.read(65536)
+        if not chunk:
+            break
+        pending += chunk
+    if pending:
+        yield pending
+
+
+# -------------------------
+# Validation (same rules as the forms)
+# -------------------------
+def _required(row, name):
+    value = row.get(name)
+    if value is None or str(value).strip() == '':
+        raise RowError(f'{name} is required')
+    return str(value).strip()
+
+
+def _number(value, name):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{name} must be a number')
+    if number < 0:
+        raise RowError(f'{name} must not be negative')
+    return number
+
+
+def _date(row, name):
+    value = _required(row, name)
+    if not _DATE.match(value):
+        raise RowError(f'{name} must be YYYY-MM-DD')
+    return value
+
+
+def validate_customer(row):
+    return tuple(_required(row, name) for name in ('name', 'mobile', 'email', 'address'))
+
+
+def validate_expense(row):
+    return (_number(_required(row, 'amount'), 'amount'), _required(row, 'description'), _date(row, 'date'))
+
+
+def validate_order(row, rates=None):
+    try:
+        customer_id = int(_required(row, 'customer_id'))
+    except ValueError:
+        raise RowError('customer_id must be an integer')
+    service = _required(row, 'service')
+    amount = row.get('amount')
+    if amount is None or str(amount).strip() == '':
+        if rates is None:
+            raise RowError('amount is required')
+        # Price it from dimensions like the calculator does
+        try:
+            amount = rates.price(service, row.get('qty') or 1, row.get('height') or 0, row.get('width') or 0,
+                                 row.get('unit') or 'ft', row.get('size') or 'A4')
+        except (TypeError, ValueError) as e:
+            raise RowError(f'cannot price {service}: {e}')
+    else:
+        amount = _number(amount, 'amount')
+    status = str(row.get('status') or 'pending').strip()
+    if status not in ORDER_STATUSES:
+        raise RowError(f"status must be one of {', '.join(ORDER_STATUSES)}")
+    payment_mode = str(row.get('payment_mode') or 'Unpaid').strip()
+    return (customer_id, service, _date(row, 'order_date'), round(amount, 2), payment_mode, status)
+
+
+VALIDATORS = {
+    'customers': validate_customer,
+    'orders': validate_order,
+    'expenses': validate_expense,
+}
+
+
+# -------------------------
+# Writers
+# -------------------------
+def _existing_customers(conn, names):
+    found = set()
+    # Through idx_customers_name, in chunks under SQLite's host parameter limit
+    for start in range(0, len(names), 500):
+        chunk = names[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        found.update(conn.execute(f'SELECT name, mobile, email FROM customers WHERE name IN ({placeholders})', chunk))
+    return found
+
+
+def _insert_customers(conn, rows):
+    # A customer already on file (same name, mobile and email), or repeated in
+    # the file, is skipped rather than added twice.  Checked here rather than
+    # left to a unique index, which only some older databases have.
+    seen = _existing_customers(conn, list({row[0] for row in rows}))
+    fresh = []
+    for row in rows:
+        if row[:3] not in seen:
+            seen.add(row[:3])
+            fresh.append(row)
+    conn.executemany('INSERT INTO customers (name, mobile, email, address) VALUES (?, ?, ?, ?)', fresh)
+    return len(fresh)
+
+
+def _insert_expenses(conn, rows):
+    conn.executemany('INSERT INTO expenses (amount, description, date) VALUES (?, ?, ?)', rows)
+    return len(rows)
+
+
+def _insert_orders(conn, rows):
+    next_order_id = counters.next_id(conn, 'orders')
+    next_payment_id = counters.next_id(conn, 'payments')
+    order_rows = []
+    payment_rows = []
+    for offset, (customer_id, service, order_date, amount, payment_mode, status) in enumerate(rows):
+        order_rows.append((next_order_id + offset, customer_id, service, order_date, amount, payment_mode, status))
+        payment_rows.append((next_payment_id + offset, next_order_id + offset, amount,
+                             1 if status == 'Paid' else 0, order_date))
+    conn.executemany('INSERT INTO orders (id, customer_id, service, order_date, amount, payment_mode, status) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)', order_rows)
+    conn.executemany('INSERT INTO payments (id, order_id, amount, paid, payment_date) VALUES (?, ?, ?, ?, ?)',
+                     payment_rows)
+    return len(rows)
+
+
+WRITERS = {
+    'customers': _insert_customers,
+    'orders': _insert_orders,
+    'expenses': _insert_expenses,
+}
+
+
+def _known_customers(conn, rows):
+    ids = list({row[1][0] for row in rows})
+    found = set()
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        found.update(r[0] for r in conn.execute(
+            f"SELECT id FROM customers WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+    return found
+
+
+def _flush(conn, kind, batch, report):
+    if kind == 'orders':
+        known = _known_customers(conn, batch)
+        valid = []
+        for line, row in batch:
+            if row[0] in known:
+                valid.append((line, row))
+            else:
+                report.add_error(line, f'unknown customer_id {row[0]}')
+        batch = valid
+    if not batch:
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        inserted = WRITERS[kind](conn, [row for _, row in batch])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    report.inserted += inserted
+    report.skipped += len(batch) - inserted
+
+
+def import_rows(conn, kind, rows, chunk_size=DEFAULT_CHUNK_SIZE, defer_indexes=False, progress=None):
+    """Validate and insert ``(line, row)`` pairs; return an ImportReport.
+
+    With ``defer_indexes`` the table's secondary indexes are dropped for the
+    load and rebuilt once at the end, which is much faster for big first-time
+    loads but leaves other readers without those indexes meanwhile.
+    """
+    if kind not in VALIDATORS:
+        raise ValueError(f'Unknown import kind: {kind}')
+    validate = VALIDATORS[kind]
+    if kind == 'orders':
+        validate = functools.partial(validate_order, rates=pricing.RateTable.load(conn))
+    report = ImportReport(kind)
+    dropped = []
+    if defer_indexes:
+        for name in migrations.indexes_for(kind):
+            conn.execute(f'DROP INDEX IF EXISTS {name}')
+            dropped.append(name)
+        conn.commit()
+    try:
+        batch = []
+        for line, row in rows:
+            report.rows += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                if not isinstance(row, dict):
+                    raise RowError('row must be an object')
+                batch.append((line, validate(row)))
+            except RowError as e:
+                report.add_error(line, str(e))
+            if len(batch) >= chunk_size:
+                _flush(conn, kind, batch, report)
+                batch = []
+                if progress:
+                    progress(report)
+        _flush(conn, kind, batch, report)
+    finally:
+        for name in dropped:
+            conn.execute(migrations.INDEXES[name])
+        conn.commit()
+        report.elapsed = time.perf_counter() - report.started
+    if progress:
+        progress(report)
+    return report
+
+
+def import_stream(conn, kind, stream, fmt, **kwargs):
+    return import_rows(conn, kind, read_rows(stream, fmt), **kwargs)
@@ -0,0 +1,236 @@
+"""Request and SQL instrumentation exposed as Prometheus text on /metrics.
+
+Request timing hooks into before_request/after_request.  Connections from the
+pool are InstrumentedConnection objects whose cursors time every statement
+(execute() up to the first row; fetching is not included), count them
+against the current request, and log statements slower than
+``SLOW_QUERY_MS`` with their parameters.  Everything is kept in plain
+counters behind one lock, and turning instrumentation off at runtime reduces
+each hook to a flag check.
+"""
+import bisect
+import hmac
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from flask import request
+
+log = logging.getLogger('printing_press.sql')
+
+# Histogram upper bounds in seconds
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class Metrics:
+    def __init__(self, slow_query_ms=100.0):
+        self.enabled = True
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Set by app.configure_app() when started through wsgi.py/serve.py
+        self.startup_seconds = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.request_time = {}     # endpoint -> Histogram
+            self.request_queries = {}  # endpoint -> Histogram of queries per request
+            self.responses = {}        # (endpoint, status) -> count
+            self.query_time = {}       # endpoint -> total seconds in SQL
+            self.slow_queries = 0
+
+    # -- per request --
+    def start_request(self):
+        if self.enabled:
+            self._local.request = [time.perf_counter(), 0, 0.0]
+
+    def end_request(self, endpoint, status):
+        state = getattr(self._local, 'request', None)
+        self._local.request = None
+        if state is None or not self.enabled:
+            return
+        elapsed = time.perf_counter() - state[0]
+        with self._lock:
+            hist = self.request_time.get(endpoint)
+            if hist is None:
+                hist = self.request_time[endpoint] = Histogram(REQUEST_BUCKETS)
+                self.request_queries[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+            hist.observe(elapsed)
+            self.request_queries[endpoint].observe(state[1])
+            self.query_time[endpoint] = self.query_time.get(endpoint, 0.0) + state[2]
+            key = (endpoint, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    # -- per statement --
+    def record_query(self, sql, params, elapsed):
+        state = getattr(self._local, 'request', None)
+        if state is not None:
+            state[1] += 1
+            state[2] += elapsed
+        if elapsed * 1000 >= self.slow_query_ms:
+            with self._lock:
+                self.slow_queries += 1
+            log.warning('Slow query (%.1f ms): %s params=%r', elapsed * 1000, ' '.join(sql.split()), params)
+
+    def render(self, pool_stats=None, page_cache_stats=None, events_stats=None, backup_stats=None):
+        out = []
+        with self._lock:
+            out.append('# HELP http_request_duration_seconds Request latency by endpoint.')
+            out.append('# TYPE http_request_duration_seconds histogram')
+            for endpoint, hist in sorted(self.request_time.items()):
+                out.extend(hist.lines('http_request_duration_seconds', f'endpoint="{endpoint}"'))
+            out.append('# HELP http_request_queries SQL statements per request by endpoint.')
+            out.append('# TYPE http_request_queries histogram')
+            for endpoint, hist in sorted(self.request_queries.items()):
+                out.extend(hist.lines('http_request_queries', f'endpoint="{endpoint}"'))
+            out.append('# HELP http_responses_total Responses by endpoint and status code.')
+            out.append('# TYPE http_responses_total counter')
+            for (endpoint, status), count in sorted(self.responses.items()):
+                out.append(f'http_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            out.append('# HELP db_query_seconds_total Time spent executing SQL by endpoint.')
+            out.append('# TYPE db_query_seconds_total counter')
+            for endpoint, seconds in sorted(self.query_time.items()):
+                out.append(f'db_query_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+            out.append('# HELP db_slow_queries_total Statements slower than the slow query threshold.')
+            out.append('# TYPE db_slow_queries_total counter')
+            out.append(f'db_slow_queries_total {self.slow_queries}')
+        if pool_stats:
+            out.append('# HELP db_pool Connection pool statistics.')
+            out.append('# TYPE db_pool gauge')
+            for key, value in sorted(pool_stats.items()):
+                out.append(f'db_pool{{stat="{key}"}} {value}')
+        if page_cache_stats:
+            out.append('# HELP page_cache Rendered page cache statistics for this process.')
+            out.append('# TYPE page_cache gauge')
+            for key, value in sorted(page_cache_stats.items()):
+                out.append(f'page_cache{{stat="{key}"}} {value}')
+        if events_stats:
+            out.append('# HELP order_events Live order board stream statistics for this process.')
+            out.append('# TYPE order_events gauge')
+            for key, value in sorted(events_stats.items()):
+                out.append(f'order_events{{stat="{key}"}} {value}')
+        if backup_stats:
+            out.append('# HELP backup Latest successful database snapshot and failed snapshot count.')
+            out.append('# TYPE backup gauge')
+            for key, value in sorted(backup_stats.items()):
+                out.append(f'backup{{stat="{key}"}} {value}')
+        rss = resident_memory()
+        if rss is not None:
+            out.append('# HELP process_resident_memory_bytes Resident memory of this worker process.')
+            out.append('# TYPE process_resident_memory_bytes gauge')
+            out.append(f'process_resident_memory_bytes{{pid="{os.getpid()}"}} {rss}')
+        if self.startup_seconds is not None:
+            out.append('# HELP app_startup_seconds Time from import to ready for this worker process.')
+            out.append('# TYPE app_startup_seconds gauge')
+            out.append(f'app_startup_seconds{{pid="{os.getpid()}"}} {self.startup_seconds:.6f}')
+        out.append(f'instrumentation_enabled {int(self.enabled)}')
+        return '\n'.join(out) + '\n'
+
+
+metrics = Metrics()
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, or None if it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    # Peak rather than current RSS; kilobytes except on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        if not metrics.enabled:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.record_query(sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not metrics.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.record_query(sql, '<executemany>', time.perf_counter() - start)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def token_matches(token):
+    """True if the request carries ``Authorization: Bearer <token>`` (never for an empty token)."""
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def init_app(app):
+    app.config.setdefault('INSTRUMENTATION', True)
+    app.config.setdefault('SLOW_QUERY_MS', 100.0)
+    app.config.setdefault('METRICS_TOKEN', '')
+    metrics.enabled = app.config['INSTRUMENTATION']
+    metrics.slow_query_ms = app.config['SLOW_QUERY_MS']
+    # Picked up by db.get_pool() when the pool is first created
+    app.config['DB_CONNECTION_FACTORY'] = InstrumentedConnection
+
+    @app.before_request
+    def _start_timer():
+        metrics.start_request()
+
+    @app.after_request
+    def _stop_timer(response):
+        metrics.end_request(request.endpoint or 'unmatched', response.status_code)
+        return response
+
+    @app.teardown_request
+    def _clear_timer(exc=None):
+        # after_request does not run when a view raises
+        if exc is not None:
+            metrics.end_request(request.endpoint or 'unmatched', 500)
@@ -0,0 +1,324 @@
+"""Background jobs for exports, imports, reports and backups.
+
+Jobs are rows in the ``background_jobs`` table and run on a small thread pool
+in the web process, each with its own database connection, so a long export
+or import never holds up a request thread.  A job reports progress through
+``Job.progress()``, which also notices cancellation: cancelling a queued job
+drops it, cancelling a running one makes its next progress() call raise
+JobCancelled.  Results are written to files under ``JOBS_DIR``.  Each job
+records the boot id of the server start that took it; when a runner starts,
+unfinished jobs from an earlier boot, or from a worker of this boot that has
+exited, are marked failed.  Finished jobs older than ``JOB_KEEP_DAYS`` are
+deleted with their files when a runner starts and after each job.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+import backup
+import db
+import exports
+import importer
+import reports
+
+FIELDS = ('id', 'kind', 'params', 'status', 'progress', 'message', 'result_name', 'error',
+          'cancel_requested', 'created_at', 'started_at', 'finished_at')
+
+# Seconds between progress writes to background_jobs
+PROGRESS_INTERVAL = 0.5
+
+# One per server start.  gunicorn forks its workers from the process that
+# imported the app (serve.py preloads it), so they all share it; set
+# PPM_BOOT_ID per start when a server imports the app in each worker.
+BOOT_ID = os.environ.get('PPM_BOOT_ID') or uuid.uuid4().hex
+
+UNFINISHED_SQL = "SELECT id, boot_id, worker_pid FROM background_jobs WHERE status IN ('queued', 'running')"
+
+EXPIRED_SQL = '''
+    SELECT id FROM background_jobs
+    WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < datetime('now', ?)
+'''
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Handle passed to a job function."""
+
+    def __init__(self, conn, job_id, params, result_dir):
+        self.conn = conn
+        self.id = job_id
+        self.params = params
+        self.result_dir = result_dir
+        self._last_write = 0.0
+
+    def progress(self, fraction=None, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        self.conn.execute('UPDATE background_jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message) '
+                          'WHERE id = ?', (fraction, message, self.id))
+        self.conn.commit()
+        if self.conn.execute('SELECT cancel_requested FROM background_jobs WHERE id = ?', (self.id,)).fetchone()[0]:
+            raise JobCancelled()
+
+    def result_path(self, name):
+        return os.path.join(self.result_dir, f'job-{self.id}-{name}')
+
+
+# -------------------------
+# Job kinds: fn(conn, job) -> (result file path, download name) or None
+# -------------------------
+def export_job(conn, job):
+    p = job.params
+    dataset, fmt = p.get('dataset'), p.get('format', 'csv')
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        raise ValueError('Unknown export')
+    sql, params, header = exports.build_query(dataset, p.get('start_date'), p.get('end_date'), p.get('statuses') or ())
+    total = conn.execute(f'SELECT COUNT(*) FROM ({sql})', params).fetchone()[0]
+
+    def rows():
+        for n, row in enumerate(exports.iter_rows(conn, sql, params), 1):
+            if n % 1000 == 0:
+                job.progress(n / total, f'{n} of {total} rows')
+            yield row
+
+    writer = exports.FORMATS[fmt][0]
+    path = job.result_path(f'{dataset}.{fmt}')
+    with open(path, 'wb') as f:
+        for chunk in writer(header, rows()):
+            f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    return path, f'{dataset}.{fmt}'
+
+
+def import_job(conn, job):
+    p = job.params
+    size = os.path.getsize(p['path']) or 1
+    try:
+        with open(p['path'], 'rb') as stream:
+            def progress(report):
+                # The reader's text wrapper closes the file once it is exhausted
+                done = size if stream.closed else stream.tell()
+                job.progress(min(done / size, 1.0), f'{report.rows} rows read, {report.inserted} inserted')
+
+            # Batches committed before a cancellation stay imported
+            report = importer.import_stream(conn, p['kind'], stream, p['format'], progress=progress)
+    finally:
+        os.remove(p['path'])
+    path = job.result_path('import.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report.as_dict(), f)
+    return path, f"import-{p['kind']}.json"
+
+
+def report_job(conn, job):
+    p = job.params
+    group = p.get('group', 'day')
+    if group not in reports.PERIODS:
+        raise ValueError('Unknown grouping')
+    periods, totals = reports.report(conn, p['start_date'], p['end_date'], group)
+    job.progress(0.5, 'Periods done')
+    services = reports.service_report(conn, p['start_date'], p['end_date'])
+    path = job.result_path('report.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'start_date': p['start_date'], 'end_date': p['end_date'], 'group': group,
+                   'periods': periods, 'totals': totals, 'services': services}, f)
+    return path, f"report-{p['start_date']}-{p['end_date']}.json"
+
+
+def backup_job(conn, job):
+    # The job's own connection is on the live database
+    src_path = conn.execute('PRAGMA database_list').fetchone()[2]
+
+    def progress(copied, total):
+        job.progress(copied / total, f'{copied} of {total} pages')
+
+    stats = backup.run(conn, src_path, job.params['dest_dir'], job.params['keep'], progress=progress)
+    path = job.result_path('backup.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f)
+    return path, 'backup.json'
+
+
+KINDS = {
+    'export': export_job,
+    'import': import_job,
+    'report': report_job,
+    'backup': backup_job,
+}
+
+
+def _alive(pid):
+    # os.kill() with signal 0 only probes on POSIX (on Windows it terminates the
+    # process); waitress runs a single process there, so nothing else is running jobs
+    if not pid or os.name != 'posix':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _stale(boot_id, pid):
+    # A pid is only meaningful within one boot: after a restart, a new worker
+    # may well have been given the pid an old job was recorded with
+    return boot_id != BOOT_ID or (pid != os.getpid() and not _alive(pid))
+
+
+def prune(conn, result_dir, keep_days):
+    """Delete finished jobs older than ``keep_days`` and their files; returns (jobs, files) removed."""
+    if keep_days <= 0:
+        return 0, 0
+    expired = {row[0] for row in conn.execute(EXPIRED_SQL, (f'-{keep_days} days',))}
+    if not expired:
+        return 0, 0
+    # Failed and cancelled jobs can leave partial files without a result_path
+    removed = 0
+    for name in os.listdir(result_dir) if os.path.isdir(result_dir) else ():
+        # Job.result_path() names them job-<id>-<name>
+        parts = name.split('-', 2)
+        if len(parts) == 3 and parts[0] == 'job' and parts[1].isdigit() and int(parts[1]) in expired:
+            try:
+                os.remove(os.path.join(result_dir, name))
+                removed += 1
+            except FileNotFoundError:
+                pass
+    conn.executemany('DELETE FROM background_jobs WHERE id = ?', [(job_id,) for job_id in expired])
+    conn.commit()
+    return len(expired), removed
+
+
+class JobRunner:
+    def __init__(self, path, result_dir, workers=2, on_finish=None, keep_days=0):
+        self.path = path
+        self.result_dir = result_dir
+        self.on_finish = on_finish
+        self.keep_days = keep_days
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._futures = {}
+        self._lock = threading.Lock()
+        os.makedirs(result_dir, exist_ok=True)
+        conn = db.connect(path)
+        try:
+            # Other workers of this boot keep their jobs while their process is alive
+            stale = [job_id for job_id, boot_id, pid in conn.execute(UNFINISHED_SQL) if _stale(boot_id, pid)]
+            conn.executemany("UPDATE background_jobs SET status = 'failed', error = 'Interrupted by a restart', "
+                             "finished_at = datetime('now') WHERE id = ?", [(job_id,) for job_id in stale])
+            conn.commit()
+            prune(conn, result_dir, keep_days)
+        finally:
+            conn.close()
+
+    def submit(self, conn, kind, params):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown job kind: {kind}')
+        job_id = conn.execute('INSERT INTO background_jobs (kind, params, boot_id, worker_pid) VALUES (?, ?, ?, ?)',
+                              (kind, json.dumps(params), BOOT_ID, self.pid)).lastrowid
+        conn.commit()
+        with self._lock:
+            self._futures[job_id] = self._executor.submit(self._run, job_id, kind, params)
+        return job_id
+
+    def cancel(self, conn, job_id):
+        """Request cancellation; returns False if the job is unknown or already finished."""
+        cursor = conn.execute("UPDATE background_jobs SET cancel_requested = 1 "
+                              "WHERE id = ? AND status IN ('queued', 'running')", (job_id,))
+        conn.commit()
+        if not cursor.rowcount:
+            return False
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            # Never started
+            conn.execute("UPDATE background_jobs SET status = 'cancelled', finished_at = datetime('now') WHERE id = ?",
+                         (job_id,))
+            conn.commit()
+        return True
+
+    def _run(self, job_id, kind, params):
+        conn = db.connect(self.path)
+        try:
+            if conn.execute('SELECT cancel_requested FROM background_jobs WHERE id = ?', (job_id,)).fetchone()[0]:
+                status, error, result = 'cancelled', None, None
+            else:
+                conn.execute("UPDATE background_jobs SET status = 'running', started_at = datetime('now') WHERE id = ?",
+                             (job_id,))
+                conn.commit()
+                try:
+                    result = KINDS[kind](conn, Job(conn, job_id, params, self.result_dir))
+                    status, error = 'done', None
+                except JobCancelled:
+                    status, error, result = 'cancelled', None, None
+                except Exception as e:
+                    status, error, result = 'failed', f'{type(e).__name__}: {e}', None
+                if conn.in_transaction:
+                    conn.rollback()
+            path, name = result or (None, None)
+            conn.execute("UPDATE background_jobs SET status = ?, error = ?, result_path = ?, result_name = ?, "
+                         "progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END, finished_at = datetime('now') "
+                         "WHERE id = ?", (status, error, path, name, status, job_id))
+            conn.commit()
+            prune(conn, self.result_dir, self.keep_days)
+        finally:
+            conn.close()
+            with self._lock:
+                self._futures.pop(job_id, None)
+        if self.on_finish:
+            self.on_finish(kind, status)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def get(conn, job_id):
+    row = conn.execute(f"SELECT {', '.join(FIELDS)}, result_path FROM background_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(zip(FIELDS, row))
+    job['params'] = json.loads(job['params'])
+    job['result_path'] = row[-1]
+    return job
+
+
+def recent(conn, limit=50):
+    return [dict(zip(FIELDS, row)) for row in conn.execute(
+        f"SELECT {', '.join(FIELDS)} FROM background_jobs ORDER BY id DESC LIMIT ?", (limit,))]
+
+
+# -------------------------
+# Flask integration
+# -------------------------
+_runner_lock = threading.Lock()
+
+
+def get_runner(app=None):
+    app = app or current_app
+    runner = app.extensions.get('job_runner')
+    # Worker threads do not survive fork(); start a fresh pool in the child
+    if runner is None or runner.pid != os.getpid():
+        with _runner_lock:
+            runner = app.extensions.get('job_runner')
+            if runner is None or runner.pid != os.getpid():
+                runner = JobRunner(app.config['DATABASE'], app.config['JOBS_DIR'], app.config['JOB_WORKERS'],
+                                   on_finish=app.config['JOB_ON_FINISH'], keep_days=app.config['JOB_KEEP_DAYS'])
+                app.extensions['job_runner'] = runner
+    return runner
+
+
+def init_app(app, on_finish=None):
+    app.config.setdefault('JOBS_DIR', 'jobs')
+    app.config.setdefault('JOB_WORKERS', 2)
+    app.config.setdefault('JOB_KEEP_DAYS', 7)
+    app.config['JOB_ON_FINISH'] = on_finish
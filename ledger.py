@@ -0,0 +1,191 @@
+"""Customer statements with running balances.
+
+Every order is a charge on its order date and every paid ``payments`` row
+(linked through ``payments.order_id``) is a credit on its payment date.  The
+running balance is a window SUM over just the entries shown, read through
+the (customer_id, order_date) index and counted back from the closing
+balance, so a page costs about its own size however long the customer's
+history is.  Outstanding totals come from the
+trigger-maintained ``customer_balance`` table (see counters.py) and are
+indexed, so the credit list sorts by them without recomputing anything.
+"""
+import datetime
+
+import counters
+
+STATEMENT_PAGE_SIZE = 500
+MAX_BATCH_STATUS_CHANGES = 500
+
+# Results of a status change
+UPDATED, NOT_FOUND, CONFLICT = 'updated', 'not_found', 'conflict'
+
+# Rows written before payments.order_id existed, paired with orders below
+UNLINKED_PAYMENTS_SQL = 'SELECT id, amount, payment_date FROM payments WHERE order_id IS NULL ORDER BY id'
+ORDER_PAYMENTS_SQL = 'SELECT id, paid, payment_date FROM payments WHERE order_id = ? ORDER BY id'
+
+# {orders}/{payments} are the hot tables or archive.py's all_* views.  Only
+# entries between :start and :end are read and windowed, walking
+# idx_orders_customer_date; each row's balance is the :closing balance (after
+# the last entry) less everything after it.  A payment is never dated before
+# its order, so orders after :end cannot have entries in range.
+STATEMENT_SQL = '''
+    WITH entries AS (
+        SELECT o.order_date AS day, 0 AS seq, o.id AS order_id, o.service AS description,
+               COALESCE(o.amount, 0) AS debit, 0 AS credit, o.status AS status
+        FROM {orders} o
+        WHERE o.customer_id = :customer_id AND o.order_date >= :start AND o.order_date <= :end
+        UNION ALL
+        SELECT p.payment_date, 1, p.order_id, 'Payment for order #' || p.order_id,
+               0, COALESCE(p.amount, 0), 'Paid'
+        FROM {orders} o JOIN {payments} p ON p.order_id = o.id
+        WHERE o.customer_id = :customer_id AND o.order_date <= :end
+          AND p.paid = 1 AND p.payment_date >= :start AND p.payment_date <= :end
+    ),
+    latest AS (
+        SELECT * FROM entries ORDER BY day DESC, order_id DESC, seq DESC LIMIT :limit
+    )
+    SELECT day, order_id, description, debit, credit, status,
+           :closing + debit - credit
+           - SUM(debit - credit) OVER (ORDER BY day DESC, order_id DESC, seq DESC ROWS UNBOUNDED PRECEDING)
+    FROM latest
+    ORDER BY day DESC, order_id DESC, seq DESC
+'''
+# Balance as of :end when it is not today's (customer_balance has that)
+CLOSING_SQL = '''
+    SELECT (SELECT COALESCE(SUM(o.amount), 0) FROM {orders} o
+            WHERE o.customer_id = :customer_id AND o.order_date <= :end)
+         - (SELECT COALESCE(SUM(p.amount), 0) FROM {orders} o JOIN {payments} p ON p.order_id = o.id
+            WHERE o.customer_id = :customer_id AND o.order_date <= :end AND p.paid = 1 AND p.payment_date <= :end)
+'''
+# The ``limit``-th latest order in range: older entries cannot make the page
+LIMIT_START_SQL = '''
+    SELECT order_date FROM {orders}
+    WHERE customer_id = :customer_id AND order_date >= :start AND order_date <= :end
+    ORDER BY order_date DESC LIMIT 1 OFFSET :limit - 1
+'''
+STATEMENT_FIELDS = ('day', 'order_id', 'description', 'debit', 'credit', 'status', 'balance')
+
+CREDIT_LEDGER_SQL = '''
+    SELECT c.id, c.name, c.mobile, c.email, c.address,
+           b.total_amount - b.paid_amount, b.credit_orders, b.credit_amount
+    FROM customer_balance b JOIN customers c ON c.id = b.customer_id
+    WHERE b.credit_orders > 0
+    ORDER BY (b.total_amount - b.paid_amount) DESC
+'''
+CREDIT_ORDERS_SQL = "SELECT id, version FROM orders WHERE customer_id = ? AND status = 'Credit' ORDER BY id"
+BALANCE_SQL = '''
+    SELECT COALESCE(total_amount, 0), COALESCE(paid_amount, 0), COALESCE(total_amount - paid_amount, 0)
+    FROM customer_balance WHERE customer_id = ?
+'''
+
+
+def link_legacy_payments(conn):
+    """Link payments rows from before ``payments.order_id`` to their orders; returns how many.
+
+    The old Add Order wrote each order and then its payment with the same
+    amount and date, so unlinked rows are paired with orders of that amount
+    and date in id order.  An order whose only payment is a later row (one
+    the first version of migration 9 added) takes over the legacy row
+    instead, keeping the newer row's paid state, and the duplicate goes.
+    """
+    unlinked = {}
+    for payment_id, amount, day in conn.execute(UNLINKED_PAYMENTS_SQL).fetchall():
+        unlinked.setdefault((amount, day), []).append(payment_id)
+    if not unlinked:
+        return 0
+    linked = 0
+    for order_id, amount, day in conn.execute('SELECT id, amount, order_date FROM orders ORDER BY id').fetchall():
+        candidates = unlinked.get((amount, day))
+        if not candidates:
+            continue
+        existing = conn.execute(ORDER_PAYMENTS_SQL, (order_id,)).fetchall()
+        if len(existing) > 1 or (existing and existing[0][0] < candidates[0]):
+            continue
+        payment_id = candidates.pop(0)
+        if existing:
+            duplicate, paid, payment_date = existing[0]
+            conn.execute('DELETE FROM payments WHERE id = ?', (duplicate,))
+            conn.execute('UPDATE payments SET order_id = ?, paid = ?, payment_date = ? WHERE id = ?',
+                         (order_id, paid, payment_date, payment_id))
+        else:
+            conn.execute('UPDATE payments SET order_id = ? WHERE id = ?', (order_id, payment_id))
+        linked += 1
+    return linked
+
+
+def change_status(conn, order_id, status, today, expected_version=None):
+    """Change one order inside the caller's transaction; returns (result, version)."""
+    row = conn.execute('SELECT amount, status, version FROM orders WHERE id = ?', (order_id,)).fetchone()
+    if row is None:
+        return NOT_FOUND, None
+    amount, old_status, version = row
+    # Someone else changed the order since the caller read it
+    if expected_version is not None and version != expected_version:
+        return CONFLICT, version
+    paid = 1 if status == 'Paid' else 0
+    conn.execute('UPDATE orders SET status = ?, version = version + 1 WHERE id = ?', (status, order_id))
+    if paid and old_status != 'Paid':
+        # Paid today; the payment date is what the statement credits on
+        updated = conn.execute('UPDATE payments SET paid = 1, payment_date = ? WHERE order_id = ?',
+                               (today, order_id)).rowcount
+    else:
+        updated = conn.execute('UPDATE payments SET paid = ? WHERE order_id = ?', (paid, order_id)).rowcount
+    if not updated:
+        conn.execute('INSERT INTO payments (id, order_id, amount, paid, payment_date) VALUES (?, ?, ?, ?, ?)',
+                     (counters.next_id(conn, 'payments'), order_id, amount, paid, today))
+    return UPDATED, version + 1
+
+
+def set_order_statuses(conn, changes, today=None):
+    """Apply (order_id, status, expected_version) changes in one transaction.
+
+    ``expected_version`` may be None to skip the version check.  Returns a
+    (result, version) pair per change: UPDATED with the new version,
+    CONFLICT with the current version (the order is left alone), or
+    NOT_FOUND.  Conflicts do not stop the other changes from applying.
+    """
+    today = today or datetime.date.today().isoformat()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        results = [change_status(conn, order_id, status, today, expected_version)
+                   for order_id, status, expected_version in changes]
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return results
+
+
+def set_order_status(conn, order_id, status, today=None, expected_version=None):
+    """Change an order's status and mark its payment paid or unpaid, atomically."""
+    return set_order_statuses(conn, [(order_id, status, expected_version)], today)[0]
+
+
+def credit_orders(conn, customer_id):
+    return [{'order_id': order_id, 'version': version}
+            for order_id, version in conn.execute(CREDIT_ORDERS_SQL, (customer_id,))]
+
+
+def statement(conn, customer_id, start='', end='', limit=None, orders='orders', payments='payments'):
+    """Return (opening balance, rows) for the latest ``limit`` entries dated between start and end."""
+    params = {'customer_id': customer_id, 'start': start or '', 'end': end or '9999-12-31',
+              'limit': -1 if limit is None else limit}
+    if limit is not None and limit > 0:
+        row = conn.execute(LIMIT_START_SQL.format(orders=orders), params).fetchone()
+        if row:
+            params['start'] = max(params['start'], row[0])
+    if end:
+        params['closing'] = conn.execute(CLOSING_SQL.format(orders=orders, payments=payments), params).fetchone()[0]
+    else:
+        params['closing'] = balance(conn, customer_id)['outstanding']
+    sql = STATEMENT_SQL.format(orders=orders, payments=payments)
+    rows = [dict(zip(STATEMENT_FIELDS, row)) for row in conn.execute(sql, params)]
+    rows.reverse()
+    # The balance carried into the first row shown
+    opening = rows[0]['balance'] - rows[0]['debit'] + rows[0]['credit'] if rows else 0
+    return opening, rows
+
+
+def balance(conn, customer_id):
+    row = conn.execute(BALANCE_SQL, (customer_id,)).fetchone()
+    return dict(zip(('total', 'paid', 'outstanding'), row or (0, 0, 0)))
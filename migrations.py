@@ -0,0 +1,427 @@
+"""Versioned schema migrations.
+
+The schema version is stored in ``PRAGMA user_version``.  Each migration runs
+once, in its own transaction, and bumps the version when it succeeds, so a
+database that is already up to date costs a single PRAGMA read at startup.
+
+Each migration spells out the tables, indexes and seed rows of its version,
+so editing a module later never changes what an old version created; schema
+changes get a new migration.  The modules' install() functions only drop and
+recreate their triggers, and a migration calls them again when triggers change.
+"""
+import re
+
+import caching
+import counters
+import db
+import events
+import ledger
+import pricing
+import reports
+import search
+import work_queue
+
+MIGRATIONS = []
+
+# Secondary indexes, kept by name so bulk loads can drop and rebuild them
+INDEXES = {
+    'idx_orders_status_date': 'CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders(status, order_date)',
+    'idx_orders_customer_status': 'CREATE INDEX IF NOT EXISTS idx_orders_customer_status ON orders(customer_id, status)',
+    'idx_expenses_date': 'CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date)',
+    'idx_users_username': 'CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)',
+    'idx_customers_name': 'CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name)',
+    'idx_payments_order': 'CREATE INDEX IF NOT EXISTS idx_payments_order ON payments(order_id)',
+}
+
+
+def indexes_for(table):
+    return [name for name, sql in INDEXES.items() if f' ON {table}(' in sql]
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def migrate(conn):
+    """Apply pending migrations and return the versions that were applied."""
+    applied = []
+    version = current_version(conn)
+    for number, description, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        # Another worker starting at the same time may have got here first
+        if current_version(conn) >= number:
+            conn.execute('ROLLBACK')
+            continue
+        try:
+            fn(conn)
+            conn.execute(f'PRAGMA user_version = {int(number)}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        applied.append(number)
+    return applied
+
+
+def column_names(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def add_column(conn, table, column, decl):
+    if column not in column_names(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+
+# -------------------------
+# Migrations
+# -------------------------
+@migration(1, 'Base tables')
+def _base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY,
+                    username TEXT,
+                    password TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS customers (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    contact TEXT)''')
+    add_column(conn, 'customers', 'mobile', 'TEXT')
+    add_column(conn, 'customers', 'email', 'TEXT')
+    add_column(conn, 'customers', 'address', 'TEXT')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS orders (
+                    id INTEGER PRIMARY KEY,
+                    customer_id INTEGER,
+                    service TEXT,
+                    order_date TEXT,
+                    amount REAL,
+                    payment_mode TEXT,
+                    status TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS payments (
+                    id INTEGER PRIMARY KEY,
+                    amount REAL,
+                    paid INTEGER,
+                    payment_date TEXT)''')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS employees (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    role TEXT)''')
+    add_column(conn, 'employees', 'mobile', 'TEXT')
+    add_column(conn, 'employees', 'email', 'TEXT')
+    add_column(conn, 'employees', 'address', 'TEXT')
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS expenses (
+                    id INTEGER PRIMARY KEY,
+                    amount REAL,
+                    description TEXT,
+                    date TEXT)''')
+
+
+@migration(2, 'Indexes for status, customer and date filters')
+def _indexes(conn):
+    for name in ('idx_orders_status_date', 'idx_orders_customer_status', 'idx_expenses_date', 'idx_users_username'):
+        conn.execute(INDEXES[name])
+
+
+@migration(3, 'Trigger-maintained order status counts and customer balances')
+def _counters(conn):
+    db.run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS order_status_counts (
+            status TEXT PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS customer_balance (
+            customer_id INTEGER PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            credit_orders INTEGER NOT NULL DEFAULT 0,
+            credit_amount REAL NOT NULL DEFAULT 0,
+            paid_orders INTEGER NOT NULL DEFAULT 0,
+            paid_amount REAL NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_customer_balance_credit ON customer_balance(credit_orders) WHERE credit_orders > 0;
+    ''')
+    counters.install(conn)
+    counters.refill(conn)
+
+
+@migration(4, 'Index for sorting customers by name')
+def _customer_name_index(conn):
+    conn.execute(INDEXES['idx_customers_name'])
+
+
+@migration(5, 'Full-text search indexes for customers, orders and expenses')
+def _search_indexes(conn):
+    db.run_script(conn, '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+            name, mobile, email, address, content='customers', content_rowid='id', prefix='2 3');
+        CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+            service, content='orders', content_rowid='id', prefix='2 3');
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description, content='expenses', content_rowid='id', prefix='2 3');
+    ''')
+    search.install(conn)
+    for table in ('customers_fts', 'orders_fts', 'expenses_fts'):
+        conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+
+@migration(6, 'Link payments to their order')
+def _payment_order_link(conn):
+    add_column(conn, 'payments', 'order_id', 'INTEGER')
+    conn.execute(INDEXES['idx_payments_order'])
+
+
+@migration(7, 'Service rate table for pricing')
+def _service_rates(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS service_rates (
+                    service TEXT NOT NULL,
+                    size TEXT NOT NULL DEFAULT '',
+                    rate REAL NOT NULL,
+                    PRIMARY KEY (service, size))''')
+    # GHC per sq ft, or per sheet for DTF
+    conn.executemany('INSERT OR IGNORE INTO service_rates (service, size, rate) VALUES (?, ?, ?)', [
+        ('sticker', '', 2.2), ('banner', '', 2.5), ('transparent', '', 1.9), ('onewayvision', '', 4.2),
+        ('dtf', 'A4', 7), ('dtf', 'A3', 14),
+    ])
+
+
+@migration(8, 'Daily revenue/expense rollups for reports')
+def _daily_rollups(conn):
+    db.run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS daily_rollup (
+            day TEXT PRIMARY KEY,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            paid_revenue REAL NOT NULL DEFAULT 0,
+            credit_revenue REAL NOT NULL DEFAULT 0,
+            expense_count INTEGER NOT NULL DEFAULT 0,
+            expenses REAL NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS daily_service_rollup (
+            day TEXT NOT NULL,
+            service TEXT NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, service)
+        ) WITHOUT ROWID;
+    ''')
+    reports.install(conn)
+    reports.refill(conn)
+
+
+@migration(9, 'Customer statements: payment links and outstanding index')
+def _customer_statements(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_customer_date ON orders(customer_id, order_date)')
+    # Matches the ORDER BY of ledger.CREDIT_LEDGER_SQL
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_customer_balance_outstanding '
+                 'ON customer_balance((total_amount - paid_amount)) WHERE credit_orders > 0')
+    ledger.link_legacy_payments(conn)
+    # Orders with no payments row at all (not even a legacy one) get one now.
+    # Ids are handed out explicitly; nothing can have been archived before
+    # version 17, so the live MAX(id) is the high-water mark counters.next_id
+    # reads once id_sequence exists.
+    next_payment_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM payments').fetchone()[0]
+    conn.execute('''
+        INSERT INTO payments (id, order_id, amount, paid, payment_date)
+        SELECT ? + ROW_NUMBER() OVER (ORDER BY o.id) - 1,
+               o.id, o.amount, CASE WHEN o.status = 'Paid' THEN 1 ELSE 0 END, o.order_date
+        FROM orders o
+        WHERE NOT EXISTS (SELECT 1 FROM payments p WHERE p.order_id = o.id)
+    ''', (next_payment_id,))
+    conn.execute('''
+        UPDATE payments SET paid = CASE WHEN (SELECT status FROM orders WHERE id = payments.order_id) = 'Paid'
+                                        THEN 1 ELSE 0 END
+        WHERE order_id IS NOT NULL
+    ''')
+
+
+@migration(10, 'Background job table')
+def _jobs(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS background_jobs (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL DEFAULT '{}',
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    result_path TEXT,
+                    result_name TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker_pid INTEGER,
+                    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                    started_at TEXT,
+                    finished_at TEXT)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_background_jobs_status ON background_jobs(status)')
+
+
+@migration(11, 'Order version column for optimistic locking')
+def _order_version(conn):
+    add_column(conn, 'orders', 'version', 'INTEGER NOT NULL DEFAULT 0')
+
+
+@migration(12, 'Keep archived orders counted: guard the order DELETE triggers')
+def _archive_guard(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS archive_guard (active INTEGER PRIMARY KEY)')
+    counters.install(conn)
+    reports.install(conn)
+
+
+@migration(13, 'Per-table data versions for HTTP caching')
+def _data_versions(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    changed_at TEXT NOT NULL DEFAULT (datetime('now'))) WITHOUT ROWID''')
+    tables = ('customers', 'orders', 'payments', 'employees', 'expenses', 'users')
+    conn.executemany('INSERT OR IGNORE INTO data_versions (name) VALUES (?)', [(t,) for t in tables])
+    caching.install(conn, tables)
+
+
+@migration(14, 'Order event log for the live order board')
+def _order_events(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS order_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    status TEXT,
+                    old_status TEXT,
+                    version INTEGER,
+                    created_at TEXT NOT NULL DEFAULT (datetime('now')))''')
+    events.install(conn)
+
+
+@migration(15, 'Backup log')
+def _backups(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS backups (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    trigger TEXT NOT NULL DEFAULT 'manual',
+                    pages INTEGER,
+                    bytes INTEGER,
+                    seconds REAL,
+                    steps INTEGER,
+                    error TEXT,
+                    started_at TEXT NOT NULL DEFAULT (datetime('now')),
+                    finished_at TEXT)''')
+
+
+@migration(16, 'Print queue: work items for pending orders')
+def _work_queue(conn):
+    db.run_script(conn, '''
+        CREATE TABLE IF NOT EXISTS work_items (
+            order_id INTEGER PRIMARY KEY,
+            service TEXT,
+            due_date TEXT NOT NULL,
+            est_minutes REAL NOT NULL,
+            rank REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            employee_id INTEGER,
+            queued_at TEXT NOT NULL DEFAULT (datetime('now')),
+            claimed_at TEXT,
+            done_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_work_items_queue ON work_items(rank, order_id) WHERE status = 'queued';
+        CREATE INDEX IF NOT EXISTS idx_work_items_employee ON work_items(employee_id);
+        CREATE INDEX IF NOT EXISTS idx_work_items_claimed ON work_items(employee_id) WHERE status = 'claimed';
+    ''')
+    work_queue.install(conn)
+    work_queue.enqueue_missing(conn, pricing.RateTable.load(conn))
+    # Queue pages are cached on work_items
+    conn.execute("INSERT OR IGNORE INTO data_versions (name) VALUES ('work_items')")
+    caching.install(conn, ('work_items',))
+
+
+@migration(17, 'Order and payment id high-water marks, so archived ids are not reused')
+def _id_sequence(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS id_sequence (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''')
+    for table in ('orders', 'payments'):
+        conn.execute(f'INSERT OR IGNORE INTO id_sequence (name, last_id) SELECT ?, COALESCE(MAX(id), 0) FROM {table}',
+                     (table,))
+    counters.install_id_sequence(conn)
+
+
+@migration(18, 'Link legacy payments rows the statement backfill had duplicated')
+def _link_legacy_payments(conn):
+    ledger.link_legacy_payments(conn)
+
+
+@migration(19, 'Data version for service rates, so price changes reach running workers')
+def _rates_version(conn):
+    conn.execute("INSERT OR IGNORE INTO data_versions (name) VALUES ('service_rates')")
+    caching.install(conn, ('service_rates',))
+
+
+@migration(20, 'Indexes on the non-NULL sort keys of the paginated listings')
+def _sort_key_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_date_key ON orders(status, COALESCE(order_date, ''))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customers_name_key ON customers(COALESCE(name, ''))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_employees_name_key ON employees(COALESCE(name, ''))")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date_key ON expenses(COALESCE(date, ''))")
+
+
+@migration(21, 'Boot id of the server start that took each background job')
+def _job_boot_id(conn):
+    add_column(conn, 'background_jobs', 'boot_id', 'TEXT')
+
+
+# -------------------------
+# Query plan checks
+# -------------------------
+_FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)')
+_SCAN_INDEX = re.compile(r' USING (?:COVERING )?INDEX (\w+)')
+
+
+def _partial_indexes(conn):
+    return {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")}
+
+
+def full_scans(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN steps of ``sql`` that scan a whole table.
+
+    Walking a partial index only visits the rows it covers, so that is not
+    counted as a full scan.
+    """
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    partial = _partial_indexes(conn)
+    scans = []
+    for row in plan:
+        if not _FULL_SCAN.match(row[3]):
+            continue
+        index = _SCAN_INDEX.search(row[3])
+        if index and index.group(1) in partial:
+            continue
+        scans.append(row[3])
+    return scans
+
+
+def check_query_plans(conn, queries):
+    """Check named (sql, params) pairs; return {name: [full scan steps]} for offenders."""
+    failures = {}
+    for name, (sql, params) in queries.items():
+        scans = full_scans(conn, sql, params)
+        if scans:
+            failures[name] = scans
+    return failures
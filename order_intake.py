@@ -0,0 +1,87 @@
+"""Bulk order intake.
+
+An order is one customer, date and list of line items; every line item becomes
+a row in ``orders`` (the app has always stored one service per row) plus its
+``payments`` row.  Any number of orders is written with two executemany()
+calls inside one IMMEDIATE transaction, so a big job is atomic and costs one
+commit instead of two statements and a commit per line.
+"""
+import counters
+
+
+class IntakeError(ValueError):
+    pass
+
+
+def normalize_order(data):
+    if not isinstance(data, dict):
+        raise IntakeError('Each order must be an object')
+    try:
+        customer_id = int(data['customer_id'])
+    except (KeyError, TypeError, ValueError):
+        raise IntakeError('customer_id is required')
+    order_date = data.get('order_date')
+    if not order_date:
+        raise IntakeError('order_date is required')
+    items = data.get('items')
+    if not items or not isinstance(items, list):
+        raise IntakeError('items must be a non-empty list')
+    lines = []
+    for item in items:
+        service = item.get('service') if isinstance(item, dict) else None
+        if not service:
+            raise IntakeError('Each item needs a service')
+        try:
+            amount = float(item.get('amount'))
+        except (TypeError, ValueError):
+            raise IntakeError(f'Invalid amount for {service}')
+        if amount < 0:
+            raise IntakeError(f'Invalid amount for {service}')
+        lines.append((service, amount))
+    return {'customer_id': customer_id, 'order_date': str(order_date), 'items': lines}
+
+
+def create_orders(conn, orders, check_customers=True):
+    """Insert normalized orders in one transaction; return the new order ids per order."""
+    if check_customers:
+        wanted = {order['customer_id'] for order in orders}
+        found = set()
+        wanted_list = list(wanted)
+        # Stay under SQLite's host parameter limit
+        for start in range(0, len(wanted_list), 500):
+            chunk = wanted_list[start:start + 500]
+            found.update(row[0] for row in conn.execute(
+                f"SELECT id FROM customers WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+        missing = wanted - found
+        if missing:
+            raise IntakeError(f'Unknown customer id(s): {sorted(missing)}')
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Ids are assigned here rather than read back one row at a time; the
+        # write lock taken above guarantees nobody else allocates them.
+        next_order_id = counters.next_id(conn, 'orders')
+        next_payment_id = counters.next_id(conn, 'payments')
+        order_rows = []
+        payment_rows = []
+        result = []
+        for order in orders:
+            ids = []
+            for service, amount in order['items']:
+                # New orders always start out pending and 'Unpaid'
+                order_rows.append((next_order_id, order['customer_id'], service, order['order_date'],
+                                   amount, 'Unpaid', 'pending'))
+                payment_rows.append((next_payment_id, next_order_id, amount, 0, order['order_date']))
+                ids.append(next_order_id)
+                next_order_id += 1
+                next_payment_id += 1
+            result.append(ids)
+        conn.executemany('INSERT INTO orders (id, customer_id, service, order_date, amount, payment_mode, status) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)', order_rows)
+        conn.executemany('INSERT INTO payments (id, order_id, amount, paid, payment_date) VALUES (?, ?, ?, ?, ?)',
+                         payment_rows)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return result
@@ -0,0 +1,127 @@
+"""Keyset (seek) pagination for the listing pages.
+
+Pages are addressed by an opaque cursor holding the sort key of the last (or
+first) row shown, so fetching page 200 costs the same as page 1: an index seek
+followed by LIMIT.  OFFSET is never used.
+"""
+import base64
+import json
+
+from flask import abort, request, url_for
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    def __init__(self, rows, size, next_cursor=None, prev_cursor=None):
+        self.rows = rows
+        self.size = size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.next_url = None
+        self.prev_url = None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """The sort key values in ``token`` (None without one); raises ValueError if it is not a cursor."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError('Invalid page cursor') from None
+    # Only plain values can be bound as SQL parameters
+    if not isinstance(values, list) or not all(
+            isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+        raise ValueError('Invalid page cursor')
+    return values
+
+
+def page_size(default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(request.args.get('size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(conn, sql, params, keys, key, descending=True, after=None, before=None, size=DEFAULT_PAGE_SIZE):
+    """Run one page of ``sql``.
+
+    ``sql`` must end in a WHERE clause (``WHERE 1=1`` is fine); the seek
+    condition, ORDER BY and LIMIT are appended here.  ``keys`` are the sort
+    expressions, ending with a unique column, and ``key(row)`` returns the
+    matching values from a result row.  None of them may be NULL: a row value
+    comparison with a NULL is never true, so those rows would be skipped.
+    Wrap nullable columns in COALESCE (with an index on the expression).
+    """
+    columns = '(' + ', '.join(keys) + ')'
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+    if cursor is not None and len(cursor) != len(keys):
+        # Cursor from a different sort order, start from the top
+        cursor, backwards = None, False
+    # Walking backwards flips both the comparison and the sort order
+    reverse = descending != backwards
+    params = list(params)
+    if cursor is not None:
+        placeholders = '(' + ', '.join('?' * len(keys)) + ')'
+        sql += f" AND {columns} {'<' if reverse else '>'} {placeholders}"
+        params.extend(cursor)
+    order = ' DESC' if reverse else ' ASC'
+    sql += ' ORDER BY ' + ', '.join(k + order for k in keys) + ' LIMIT ?'
+    params.append(size + 1)
+    rows = conn.execute(sql, params).fetchall()
+    more = len(rows) > size
+    rows = rows[:size]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, cursor is not None
+    page = Page(rows, size)
+    if rows and has_next:
+        page.next_cursor = encode_cursor(key(rows[-1]))
+    if rows and has_prev:
+        page.prev_cursor = encode_cursor(key(rows[0]))
+    return page
+
+
+def paginate_request(conn, sql, params, sorts, default_sort):
+    """Paginate using the ``sort``, ``order``, ``size``, ``after`` and ``before`` query args.
+
+    ``sorts`` maps a sort name to ``(keys, key)`` as taken by ``paginate()``.
+    Next/previous links keep every other query argument (search, filters).
+    """
+    sort = request.args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    descending = request.args.get('order', 'desc') != 'asc'
+    keys, key = sorts[sort]
+    try:
+        after, before = decode_cursor(request.args.get('after')), decode_cursor(request.args.get('before'))
+    except ValueError as e:
+        abort(400, str(e))
+    page = paginate(conn, sql, params, keys, key, descending=descending, after=after, before=before,
+                    size=page_size())
+    args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+    if page.next_cursor:
+        page.next_url = url_for(request.endpoint, **request.view_args, **args, after=page.next_cursor)
+    if page.prev_cursor:
+        page.prev_url = url_for(request.endpoint, **request.view_args, **args, before=page.prev_cursor)
+    page.sort = sort
+    page.descending = descending
+    return page
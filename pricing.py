@@ -0,0 +1,103 @@
+"""Service prices used by the calculator, order entry, imports and /api/quote.
+
+Rates live in the ``service_rates`` table: area-priced services have one row
+with an empty ``size`` and a rate per square foot, sheet-priced services (DTF)
+have one row per sheet size.  A RateTable is loaded from that table once and
+prices lines from memory; identical lines (same service, quantity and
+dimensions) are memoized, so quoting a few hundred lines with repeated sizes
+costs little more than quoting the distinct ones.
+"""
+import threading
+from functools import lru_cache
+
+RATES_VERSION_SQL = "SELECT version FROM data_versions WHERE name = 'service_rates'"
+
+# Names used by the add_order form for the same services
+SERVICE_ALIASES = {'oneway': 'onewayvision'}
+
+UNITS = {'ft': 1.0, 'in': 1 / 144}
+QUOTE_CACHE_SIZE = 4096
+MAX_QUOTE_ITEMS = 1000
+
+
+def canonical_service(service):
+    service = (service or '').strip().lower()
+    return SERVICE_ALIASES.get(service, service)
+
+
+class RateTable:
+    def __init__(self, rates):
+        self.area = {}
+        self.sheet = {}
+        for (service, size), rate in rates.items():
+            if size:
+                self.sheet.setdefault(service, {})[size] = rate
+            else:
+                self.area[service] = rate
+        self.services = tuple(sorted(set(self.area) | set(self.sheet)))
+        self._line = lru_cache(maxsize=QUOTE_CACHE_SIZE)(self._compute)
+
+    @classmethod
+    def load(cls, conn):
+        return cls({(service, size): rate for service, size, rate in
+                    conn.execute('SELECT service, size, rate FROM service_rates')})
+
+    def _compute(self, service, qty, height, width, unit, size):
+        if service in self.sheet:
+            sizes = self.sheet[service]
+            # Unknown sizes fall back to the smallest sheet, like the calculator form
+            rate = sizes.get(size) or min(sizes.values())
+            return rate * qty
+        if service not in self.area:
+            raise ValueError(f'Unknown service: {service}')
+        if unit not in UNITS:
+            raise ValueError(f'Unknown unit: {unit}')
+        return self.area[service] * qty * height * width * UNITS[unit]
+
+    def price(self, service, qty, height=0, width=0, unit='ft', size='A4'):
+        """Price one line; raises ValueError/TypeError on bad numbers, like the calculator form."""
+        numbers = (float(qty), float(height or 0), float(width or 0))
+        if not all(0 <= n < float('inf') for n in numbers):
+            raise ValueError('quantity and dimensions must be non-negative numbers')
+        return self._line(canonical_service(service), *numbers, unit or 'ft', size or 'A4')
+
+    def quote(self, items):
+        """Price a list of item dicts; returns one {'amount'} or {'error'} dict per item."""
+        results = []
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({'error': 'item must be an object'})
+                continue
+            try:
+                amount = self.price(item.get('service'), item.get('qty', 1), item.get('height', 0),
+                                    item.get('width', 0), item.get('unit', 'ft'), item.get('size', 'A4'))
+            except (TypeError, ValueError) as e:
+                results.append({'error': str(e)})
+                continue
+            results.append({'amount': round(amount, 2)})
+        return results
+
+    def cache_info(self):
+        return self._line.cache_info()
+
+
+class Pricing:
+    """Process-wide RateTable, reloaded when ``service_rates`` changes.
+
+    Every write to the table bumps its ``data_versions`` counter (see
+    caching.py), so a rate edited from any process or the sqlite shell is
+    picked up on the next quote at the cost of one primary-key lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._table = None
+        self._version = None
+
+    def get(self, conn):
+        version = conn.execute(RATES_VERSION_SQL).fetchone()
+        with self._lock:
+            if self._table is None or version != self._version:
+                self._table = RateTable.load(conn)
+                self._version = version
+            return self._table
@@ -0,0 +1,171 @@
+"""Date-range reports served from daily rollup tables.
+
+``daily_rollup`` holds one row per calendar day with order counts, revenue and
+expenses, and ``daily_service_rollup`` one row per day and service.  Triggers
+on ``orders`` and ``expenses`` keep both exact, so a report over a year reads
+about 365 rows however many orders were taken.  Revenue is the amount of every
+order placed that day; profit is revenue minus expenses.
+"""
+import db
+from counters import UNLESS_ARCHIVING
+
+
+def _day(column):
+    return f"COALESCE(date({column}), '')"
+
+
+def _apply_order(row, sign):
+    day = _day(f'{row}.order_date')
+    service = f"COALESCE({row}.service, '')"
+    amount = f'COALESCE({row}.amount, 0)'
+    paid = f"CASE WHEN {row}.status = 'Paid' THEN {amount} ELSE 0 END"
+    credit = f"CASE WHEN {row}.status = 'Credit' THEN {amount} ELSE 0 END"
+    return f'''
+    INSERT OR IGNORE INTO daily_rollup (day) VALUES ({day});
+    UPDATE daily_rollup
+       SET order_count = order_count {sign} 1,
+           revenue = revenue {sign} {amount},
+           paid_revenue = paid_revenue {sign} {paid},
+           credit_revenue = credit_revenue {sign} {credit}
+     WHERE day = {day};
+    INSERT OR IGNORE INTO daily_service_rollup (day, service) VALUES ({day}, {service});
+    UPDATE daily_service_rollup
+       SET order_count = order_count {sign} 1,
+           revenue = revenue {sign} {amount}
+     WHERE day = {day} AND service = {service};'''
+
+
+def _apply_expense(row, sign):
+    day = _day(f'{row}.date')
+    return f'''
+    INSERT OR IGNORE INTO daily_rollup (day) VALUES ({day});
+    UPDATE daily_rollup
+       SET expense_count = expense_count {sign} 1,
+           expenses = expenses {sign} COALESCE({row}.amount, 0)
+     WHERE day = {day};'''
+
+
+TRIGGERS_SQL = f'''
+CREATE TRIGGER IF NOT EXISTS orders_rollup_insert AFTER INSERT ON orders
+BEGIN{_apply_order('NEW', '+')}
+END;
+CREATE TRIGGER IF NOT EXISTS orders_rollup_delete AFTER DELETE ON orders {UNLESS_ARCHIVING}
+BEGIN{_apply_order('OLD', '-')}
+END;
+CREATE TRIGGER IF NOT EXISTS orders_rollup_update AFTER UPDATE OF order_date, service, amount, status ON orders
+BEGIN{_apply_order('OLD', '-')}{_apply_order('NEW', '+')}
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_rollup_insert AFTER INSERT ON expenses
+BEGIN{_apply_expense('NEW', '+')}
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_rollup_delete AFTER DELETE ON expenses
+BEGIN{_apply_expense('OLD', '-')}
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_rollup_update AFTER UPDATE OF date, amount ON expenses
+BEGIN{_apply_expense('OLD', '-')}{_apply_expense('NEW', '+')}
+END;
+'''
+
+# Recomputed from scratch, used by rebuild() and check().  {orders} is
+# ``orders`` or archive.py's ``all_orders`` view.
+FRESH_DAILY_SQL = f'''
+    SELECT day, SUM(order_count), SUM(revenue), SUM(paid_revenue), SUM(credit_revenue),
+           SUM(expense_count), SUM(expenses)
+    FROM (
+        SELECT {_day('order_date')} AS day, COUNT(*) AS order_count, COALESCE(SUM(amount), 0) AS revenue,
+               COALESCE(SUM(CASE WHEN status = 'Paid' THEN amount END), 0) AS paid_revenue,
+               COALESCE(SUM(CASE WHEN status = 'Credit' THEN amount END), 0) AS credit_revenue,
+               0 AS expense_count, 0 AS expenses
+        FROM {{orders}} GROUP BY 1
+        UNION ALL
+        SELECT {_day('date')}, 0, 0, 0, 0, COUNT(*), COALESCE(SUM(amount), 0)
+        FROM expenses GROUP BY 1
+    ) GROUP BY day
+'''
+FRESH_SERVICE_SQL = f'''
+    SELECT {_day('order_date')}, COALESCE(service, ''), COUNT(*), COALESCE(SUM(amount), 0)
+    FROM {{orders}} GROUP BY 1, 2
+'''
+
+# Period start for each grouping; weeks start on Monday
+PERIODS = {
+    'day': 'day',
+    'week': "date(day, '-6 days', 'weekday 1')",
+    'month': "substr(day, 1, 7) || '-01'",
+}
+
+REPORT_SQL = '''
+    SELECT {period} AS period, SUM(order_count), SUM(revenue), SUM(paid_revenue), SUM(credit_revenue),
+           SUM(expense_count), SUM(expenses), SUM(revenue) - SUM(expenses)
+    FROM daily_rollup WHERE day BETWEEN ? AND ?
+    GROUP BY period ORDER BY period
+'''
+REPORT_FIELDS = ('period', 'order_count', 'revenue', 'paid_revenue', 'credit_revenue',
+                 'expense_count', 'expenses', 'profit')
+
+SERVICE_REPORT_SQL = '''
+    SELECT service, SUM(order_count), SUM(revenue)
+    FROM daily_service_rollup WHERE day BETWEEN ? AND ?
+    GROUP BY service ORDER BY SUM(revenue) DESC
+'''
+SERVICE_FIELDS = ('service', 'order_count', 'revenue')
+
+
+def install(conn):
+    db.replace_triggers(conn, TRIGGERS_SQL)
+
+
+def refill(conn, orders='orders'):
+    conn.execute('DELETE FROM daily_rollup')
+    conn.execute('DELETE FROM daily_service_rollup')
+    conn.execute('INSERT INTO daily_rollup (day, order_count, revenue, paid_revenue, credit_revenue, '
+                 'expense_count, expenses) ' + FRESH_DAILY_SQL.format(orders=orders))
+    conn.execute('INSERT INTO daily_service_rollup (day, service, order_count, revenue) '
+                 + FRESH_SERVICE_SQL.format(orders=orders))
+
+
+def check(conn, orders='orders'):
+    """Compare the rollups with a full recount; return a list of differences."""
+    drift = []
+    for name, stored_sql, fresh_sql, width in (
+            ('day', 'SELECT day, order_count, revenue, paid_revenue, credit_revenue, expense_count, expenses '
+                    'FROM daily_rollup WHERE order_count != 0 OR expense_count != 0', FRESH_DAILY_SQL, 1),
+            ('service', 'SELECT day, service, order_count, revenue FROM daily_service_rollup '
+                        'WHERE order_count != 0', FRESH_SERVICE_SQL, 2)):
+        stored = {row[:width]: row[width:] for row in conn.execute(stored_sql)}
+        fresh = {row[:width]: row[width:] for row in conn.execute(fresh_sql.format(orders=orders))}
+        for key in sorted(set(stored) | set(fresh)):
+            if not _same(stored.get(key), fresh.get(key)):
+                drift.append(f'{name} {key}: stored {stored.get(key)}, actual {fresh.get(key)}')
+    return drift
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a == b
+    return all(abs(x - y) < 0.005 for x, y in zip(a, b))
+
+
+def rebuild(conn, orders='orders'):
+    """Recompute both rollup tables from ``orders`` and ``expenses``; return the drift that was fixed."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        drift = check(conn, orders)
+        refill(conn, orders)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return drift
+
+
+def report(conn, start, end, group='day'):
+    """Rows per period between two YYYY-MM-DD dates (inclusive), plus totals."""
+    sql = REPORT_SQL.format(period=PERIODS[group])
+    rows = [dict(zip(REPORT_FIELDS, row)) for row in conn.execute(sql, (start, end))]
+    totals = {field: sum(row[field] for row in rows) for field in REPORT_FIELDS[1:]}
+    return rows, totals
+
+
+def service_report(conn, start, end):
+    return [dict(zip(SERVICE_FIELDS, row)) for row in conn.execute(SERVICE_REPORT_SQL, (start, end))]
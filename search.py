@@ -0,0 +1,102 @@
+"""Full-text search over customers, order services and expense descriptions.
+
+Each table has an external-content FTS5 index kept in sync by triggers, so
+searching stays an index lookup however many rows there are.  User input is
+split into words and every word is matched as a prefix (``ban`` finds
+``banner``); results are ranked with bm25.
+"""
+import re
+
+import db
+
+TRIGGERS_SQL = '''
+CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+    INSERT INTO customers_fts (rowid, name, mobile, email, address)
+    VALUES (NEW.id, NEW.name, NEW.mobile, NEW.email, NEW.address);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name, mobile, email, address)
+    VALUES ('delete', OLD.id, OLD.name, OLD.mobile, OLD.email, OLD.address);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE OF name, mobile, email, address ON customers BEGIN
+    INSERT INTO customers_fts (customers_fts, rowid, name, mobile, email, address)
+    VALUES ('delete', OLD.id, OLD.name, OLD.mobile, OLD.email, OLD.address);
+    INSERT INTO customers_fts (rowid, name, mobile, email, address)
+    VALUES (NEW.id, NEW.name, NEW.mobile, NEW.email, NEW.address);
+END;
+
+CREATE TRIGGER IF NOT EXISTS orders_fts_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO orders_fts (rowid, service) VALUES (NEW.id, NEW.service);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_fts_delete AFTER DELETE ON orders BEGIN
+    INSERT INTO orders_fts (orders_fts, rowid, service) VALUES ('delete', OLD.id, OLD.service);
+END;
+CREATE TRIGGER IF NOT EXISTS orders_fts_update AFTER UPDATE OF service ON orders BEGIN
+    INSERT INTO orders_fts (orders_fts, rowid, service) VALUES ('delete', OLD.id, OLD.service);
+    INSERT INTO orders_fts (rowid, service) VALUES (NEW.id, NEW.service);
+END;
+
+CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+END;
+CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+    INSERT INTO expenses_fts (expenses_fts, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+    INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+END;
+'''
+
+# Filters for the listing pages; each takes one match_query() parameter
+CUSTOMER_MATCH_SQL = 'id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?)'
+ORDER_CUSTOMER_MATCH_SQL = 'orders.customer_id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?)'
+ORDER_SERVICE_MATCH_SQL = 'orders.id IN (SELECT rowid FROM orders_fts WHERE orders_fts MATCH ?)'
+EXPENSE_MATCH_SQL = 'id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)'
+
+SEARCH_SQL = {
+    'customers': '''
+        SELECT c.id, c.name, c.mobile, c.email, c.address
+        FROM customers_fts f JOIN customers c ON c.id = f.rowid
+        WHERE customers_fts MATCH ? ORDER BY f.rank LIMIT ?''',
+    'orders': '''
+        SELECT o.id, o.customer_id, c.name, o.service, o.order_date, o.amount, o.status
+        FROM orders_fts f JOIN orders o ON o.id = f.rowid
+        LEFT JOIN customers c ON c.id = o.customer_id
+        WHERE orders_fts MATCH ? ORDER BY f.rank LIMIT ?''',
+    'expenses': '''
+        SELECT e.id, e.amount, e.description, e.date
+        FROM expenses_fts f JOIN expenses e ON e.id = f.rowid
+        WHERE expenses_fts MATCH ? ORDER BY f.rank LIMIT ?''',
+}
+SEARCH_FIELDS = {
+    'customers': ('id', 'name', 'mobile', 'email', 'address'),
+    'orders': ('id', 'customer_id', 'customer_name', 'service', 'order_date', 'amount', 'status'),
+    'expenses': ('id', 'amount', 'description', 'date'),
+}
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def install(conn):
+    db.replace_triggers(conn, TRIGGERS_SQL)
+
+
+def match_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix, or None."""
+    words = _WORD.findall(text or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(conn, text, kinds=tuple(SEARCH_SQL), limit=20):
+    query = match_query(text)
+    results = {}
+    for kind in kinds:
+        if query is None:
+            results[kind] = []
+            continue
+        rows = conn.execute(SEARCH_SQL[kind], (query, limit)).fetchall()
+        results[kind] = [dict(zip(SEARCH_FIELDS[kind], row)) for row in rows]
+    return results
@@ -0,0 +1,119 @@
+"""Production launcher: gunicorn (Linux/macOS) or waitress (anywhere).
+
+    python serve.py                          # PPM_* settings, see config.py
+    python serve.py --server waitress --threads 8
+    python serve.py --workers 4 --bind 127.0.0.1:8000
+    python serve.py --measure                # report cold start and memory, then exit
+
+With gunicorn the app is loaded once in the master (migrations run there)
+and forked into the workers, which share its memory until they write to it.
+Each worker logs its resident memory when it starts, and /metrics reports
+it per process.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import config
+
+log = logging.getLogger('printing_press')
+
+
+def load_app(threads):
+    started = time.perf_counter()
+    from app import configure_app
+    # Every server thread may hold a pooled connection
+    pool_size = max(config.from_env()['DB_POOL_SIZE'], threads)
+    return configure_app({'DB_POOL_SIZE': pool_size, 'SERVER_THREADS': threads}, started=started)
+
+
+def run_gunicorn(settings):
+    from gunicorn.app.base import BaseApplication
+
+    def post_fork(server, worker):
+        import instrumentation
+        rss = instrumentation.resident_memory()
+        log.info('Worker %d started, %s resident', worker.pid,
+                 f'{rss / 1048576:.1f} MB' if rss else 'unknown')
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                'bind': settings['BIND'],
+                'workers': settings['WORKERS'],
+                'threads': settings['THREADS'],
+                'worker_class': 'gthread',
+                'timeout': settings['TIMEOUT'],
+                'preload_app': True,
+                'post_fork': post_fork,
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(settings['THREADS'])
+
+    Server().run()
+
+
+def run_waitress(settings):
+    import waitress
+    if settings['WORKERS'] > 1:
+        log.warning('waitress runs a single process; using %d threads and ignoring WORKERS=%d',
+                    settings['THREADS'], settings['WORKERS'])
+    waitress.serve(load_app(settings['THREADS']), listen=settings['BIND'], threads=settings['THREADS'])
+
+
+SERVERS = {'gunicorn': run_gunicorn, 'waitress': run_waitress}
+
+
+def pick_server(name):
+    if name != 'auto':
+        return name
+    candidates = ('waitress',) if os.name == 'nt' else ('gunicorn', 'waitress')
+    for candidate in candidates:
+        try:
+            __import__(candidate)
+        except ImportError:
+            continue
+        return candidate
+    raise SystemExit('No production server found: pip install gunicorn (or waitress on Windows)')
+
+
+def measure(settings):
+    """Load the app the way a worker does and print the cold start cost."""
+    app = load_app(settings['THREADS'])
+    import instrumentation
+    rss = instrumentation.resident_memory()
+    print(f'cold start: {instrumentation.metrics.startup_seconds:.3f} s')
+    if rss:
+        print(f'resident memory: {rss / 1048576:.1f} MB')
+    print(f"database: {app.config['DATABASE']}")
+
+
+def main(argv=None):
+    settings = config.from_env(config.SERVER_DEFAULTS)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=('auto',) + tuple(SERVERS), default=settings['SERVER'])
+    parser.add_argument('--bind', default=settings['BIND'], help='host:port')
+    parser.add_argument('--workers', type=int, default=settings['WORKERS'])
+    parser.add_argument('--threads', type=int, default=settings['THREADS'])
+    parser.add_argument('--measure', action='store_true', help='Report cold start time and memory, then exit.')
+    args = parser.parse_args(argv)
+    settings.update(SERVER=args.server, BIND=args.bind, WORKERS=args.workers, THREADS=args.threads)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.measure:
+        measure(settings)
+        return
+    server = pick_server(settings['SERVER'])
+    try:
+        SERVERS[server](settings)
+    except ModuleNotFoundError as e:
+        if e.name != server:
+            raise
+        raise SystemExit(f'{server} is not installed: pip install {server}') from None
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as app_module  # noqa: E402
+import db  # noqa: E402
+import order_intake  # noqa: E402
+import pricing  # noqa: E402
+
+# The templates sit next to app.py
+app_module.app.template_folder = ROOT
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app on a fresh, fully migrated database under tmp_path."""
+    flask_app = app_module.app
+    saved = dict(flask_app.config)
+    flask_app.config['TESTING'] = True
+    # Rates are cached per process; each test has its own database
+    monkeypatch.setattr(app_module, 'price_book', pricing.Pricing())
+    app_module.configure_app({
+        'DATABASE': str(tmp_path / 'test.db'),
+        'ARCHIVE_DATABASE': str(tmp_path / 'archive.db'),
+        'JOBS_DIR': str(tmp_path / 'jobs'),
+        'BACKUP_DIR': str(tmp_path / 'backups'),
+        'COMPANY_SETTINGS': str(tmp_path / 'company_settings.txt'),
+    })
+    yield flask_app
+    runner = flask_app.extensions.pop('job_runner', None)
+    if runner is not None:
+        runner.shutdown()
+    for name in ('order_events', 'backup_scheduler'):
+        service = flask_app.extensions.pop(name, None)
+        if service is not None:
+            service.stop()
+    pool = flask_app.extensions.pop('db_pool', None)
+    if pool is not None:
+        pool.close()
+    flask_app.config.clear()
+    flask_app.config.update(saved)
+    app_module.dashboard_cache.invalidate()
+    app_module.page_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+
+@pytest.fixture
+def conn(app):
+    conn = db.connect(app.config['DATABASE'])
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def customer(conn):
+    customer_id = conn.execute("INSERT INTO customers (name, mobile) VALUES ('Ama Mensah', '0244000000')").lastrowid
+    conn.commit()
+    return customer_id
+
+
+@pytest.fixture
+def add_orders(conn, customer):
+    """add_orders(*(service, amount), order_date=...) creates one order per item; returns their ids."""
+    def add(*items, order_date='2024-03-01', customer_id=customer):
+        orders = [order_intake.normalize_order({'customer_id': customer_id, 'order_date': order_date,
+                                                'items': [{'service': service, 'amount': amount}]})
+                  for service, amount in items]
+        return [ids[0] for ids in order_intake.create_orders(conn, orders)]
+    return add
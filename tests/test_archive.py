@@ -0,0 +1,79 @@
+import pytest
+
+import archive
+import ledger
+
+BEFORE = '2025-01-01'
+
+
+def _pay(conn, *order_ids):
+    ledger.set_order_statuses(conn, [(order_id, 'Paid', None) for order_id in order_ids], today='2024-03-02')
+
+
+def _archived(conn, table):
+    return conn.execute(f'SELECT id, amount FROM archive.{table} ORDER BY id').fetchall()
+
+
+def test_archived_ids_are_not_reused(app, conn, customer, add_orders):
+    path = app.config['ARCHIVE_DATABASE']
+    old = add_orders(('banner', 10), ('sticker', 20))
+    _pay(conn, *old)
+    assert archive.archive_orders(conn, path, BEFORE) == 2
+    assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 0
+
+    # The live tables are empty now, but new ids still come after the archived ones
+    new, = add_orders(('dtf', 30))
+    assert new > max(old)
+    _pay(conn, new)
+    assert archive.archive_orders(conn, path, BEFORE) == 1
+
+    assert _archived(conn, 'orders') == [(old[0], 10), (old[1], 20), (new, 30)]
+    assert [amount for _, amount in _archived(conn, 'payments')] == [10, 20, 30]
+    # Counters keep counting archived orders
+    assert ledger.balance(conn, customer) == {'total': 60, 'paid': 60, 'outstanding': 0}
+
+
+def test_archive_from_before_id_sequence_raises_the_floor(app, conn, add_orders):
+    path = app.config['ARCHIVE_DATABASE']
+    archive.attach(conn, path, create=True)
+    conn.execute("INSERT INTO archive.orders (id, customer_id, service, order_date, amount, status) "
+                 "VALUES (50, 1, 'banner', '2023-01-01', 5, 'Paid')")
+    conn.commit()
+    archive.archive_orders(conn, path, BEFORE)
+    assert add_orders(('banner', 10)) == [51]
+
+
+def test_clash_stops_the_run_without_overwriting(app, conn, add_orders):
+    path = app.config['ARCHIVE_DATABASE']
+    order_id, = add_orders(('banner', 10))
+    _pay(conn, order_id)
+    archive.attach(conn, path, create=True)
+    conn.execute("INSERT INTO archive.orders (id, customer_id, service, order_date, amount, status) "
+                 "VALUES (?, 1, 'sticker', '2023-01-01', 99, 'Paid')", (order_id,))
+    conn.commit()
+    with pytest.raises(archive.ArchiveError):
+        archive.archive_orders(conn, path, BEFORE)
+    assert _archived(conn, 'orders') == [(order_id, 99)]
+    assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 1
+
+
+def test_rerun_after_an_interrupted_delete(app, conn, add_orders):
+    path = app.config['ARCHIVE_DATABASE']
+    order_id, = add_orders(('banner', 10))
+    _pay(conn, order_id)
+    archive.attach(conn, path, create=True)
+    # The copy committed but the process died before the delete
+    archive._transaction(conn, archive._copy_batch, [order_id])
+    assert archive.archive_orders(conn, path, BEFORE) == 1
+    assert _archived(conn, 'orders') == [(order_id, 10)]
+
+
+def test_statement_reads_through_the_archive(app, conn, customer, add_orders):
+    path = app.config['ARCHIVE_DATABASE']
+    old = add_orders(('banner', 10), ('sticker', 20), order_date='2024-01-05')
+    _pay(conn, *old)
+    archive.archive_orders(conn, path, BEFORE)
+    add_orders(('dtf', 30), order_date='2025-02-01')
+    opening, rows = ledger.statement(conn, customer, **archive.sources(conn, path))
+    assert opening == 0
+    assert [row['balance'] for row in rows] == [10, 30, 20, 0, 30]
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+import backup
+import db
+
+
+def _orders(path):
+    conn = db.connect(path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_snapshot_is_a_consistent_copy_while_writes_go_on(app, conn, add_orders, tmp_path):
+    add_orders(('banner', 10), ('dtf', 5))
+    dest = str(tmp_path / 'snap.db')
+    writes = []
+
+    def progress(copied, total):
+        # Another connection keeps taking orders during the copy
+        if not writes:
+            writes.extend(add_orders(('sticker', 1)))
+
+    stats = backup.snapshot(app.config['DATABASE'], dest, pages=2, sleep=0, progress=progress)
+    assert stats['steps'] > 1
+    assert stats['counts']['orders'] == 2
+    assert _orders(dest) == 2
+    assert _orders(app.config['DATABASE']) == 3
+    assert backup.verify(dest) == []
+    assert not os.path.exists(dest + '.tmp')
+
+
+def test_verify_reports_broken_snapshots(tmp_path):
+    junk = tmp_path / 'junk.db'
+    junk.write_bytes(b'not a database' * 100)
+    assert backup.verify(str(junk))[0].startswith('not a readable database')
+    assert backup.verify(str(tmp_path / 'missing.db')) == [f"{tmp_path / 'missing.db'} does not exist"]
+
+
+def test_verify_compares_counts_and_version(app):
+    problems = backup.verify(app.config['DATABASE'], {'orders': 5}, 1)
+    assert problems[0].startswith('schema version')
+    assert problems[1] == 'orders: 0 rows, expected 5'
+
+
+def test_prune_keeps_the_newest(tmp_path):
+    for stamp in ('20240101-000000', '20240102-000000', '20240103-000000'):
+        (tmp_path / f'database-{stamp}.db').write_bytes(b'')
+    (tmp_path / 'other.db').write_bytes(b'')
+    removed = backup.prune(str(tmp_path), 2)
+    assert removed == [str(tmp_path / 'database-20240101-000000.db')]
+    assert [os.path.basename(p) for p in backup.snapshots(str(tmp_path))] == [
+        'database-20240102-000000.db', 'database-20240103-000000.db']
+    assert backup.prune(str(tmp_path), 0) == []
+
+
+def test_run_logs_the_snapshot_and_restore_brings_it_back(app, conn, add_orders):
+    add_orders(('banner', 10))
+    stats = backup.run(conn, app.config['DATABASE'], app.config['BACKUP_DIR'], keep=3)
+    assert backup.last(conn)['last_pages'] == stats['pages']
+    add_orders(('dtf', 5))
+    backup.restore(stats['path'], app.config['DATABASE'])
+    assert _orders(app.config['DATABASE']) == 1
+
+
+def test_restore_refuses_a_bad_file(app, tmp_path):
+    junk = tmp_path / 'junk.db'
+    junk.write_bytes(b'not a database' * 100)
+    with pytest.raises(backup.BackupError):
+        backup.restore(str(junk), app.config['DATABASE'])
+
+
+def test_a_failed_snapshot_is_logged(app, conn, monkeypatch):
+    monkeypatch.setattr(backup, 'verify', lambda *args: ['orders: 1 rows, expected 2'])
+    with pytest.raises(backup.BackupError):
+        backup.run(conn, app.config['DATABASE'], app.config['BACKUP_DIR'], keep=3)
+    assert backup.last(conn) == {'failures': 1}
+    assert backup.snapshots(app.config['BACKUP_DIR']) == []
+
+
+def test_only_one_scheduled_backup_per_interval(conn):
+    assert backup.claim(conn, 60) is not None
+    assert backup.claim(conn, 60) is None
+
+
+def test_backup_commands(app, tmp_path):
+    runner = app.test_cli_runner()
+    r = runner.invoke(args=['backup', '--keep', '1'])
+    assert r.exit_code == 0, r.output
+    path, = backup.snapshots(app.config['BACKUP_DIR'])
+    assert runner.invoke(args=['verify-backup', path]).output == f'OK: {path}\n'
+    assert runner.invoke(args=['restore-backup', path, '--yes']).exit_code == 0
+    junk = tmp_path / 'junk.db'
+    junk.write_bytes(b'not a database' * 100)
+    assert runner.invoke(args=['verify-backup', str(junk)]).exit_code == 1
+    r = runner.invoke(args=['restore-backup', str(junk)], input='n\n')
+    assert r.exit_code == 1
+    assert 'Aborted' in r.output
@@ -0,0 +1,65 @@
+import pytest
+
+import counters
+import db
+from bench import __main__ as bench_cli, datagen, harness
+
+
+def _dump(path):
+    conn = db.connect(path)
+    try:
+        return [conn.execute(f'SELECT * FROM {table} ORDER BY id').fetchall()
+                for table in ('customers', 'orders', 'payments', 'expenses')]
+    finally:
+        conn.close()
+
+
+def test_the_same_seed_gives_the_same_data(tmp_path):
+    first, second, other = (str(tmp_path / name) for name in ('a.db', 'b.db', 'c.db'))
+    counts = datagen.create(first, orders=300, seed=7)
+    assert counts == {'customers': 15, 'orders': 300, 'payments': 300, 'expenses': 30, 'employees': 12}
+    datagen.create(second, orders=300, seed=7)
+    datagen.create(other, orders=300, seed=8)
+    assert _dump(first) == _dump(second)
+    assert _dump(first) != _dump(other)
+    conn = db.connect(first)
+    assert counters.check(conn) == []
+    conn.close()
+    with pytest.raises(ValueError, match='already has orders'):
+        datagen.create(first, orders=10)
+
+
+def test_run_times_each_route(app, conn):
+    datagen.generate(conn, orders=200)
+    result = harness.run(app, {'dashboard': '/dashboard', 'print_order': '/print_order/{order_id}'},
+                         requests=3, warmup=1)
+    assert result['meta']['sizes']['orders'] == 200
+    assert result['routes']['print_order']['url'] == '/print_order/200'
+    for route in result['routes'].values():
+        assert route['status'] == 200
+        assert route['requests'] == 3
+        assert route['p50_ms'] <= route['p95_ms'] <= route['max_ms']
+
+
+def _result(p95, sizes=None):
+    return {'meta': {'sizes': sizes or {'orders': 10}, 'page_cache': False},
+            'routes': {name: {'p95_ms': value} for name, value in p95.items()}}
+
+
+def test_compare_flags_regressions():
+    lines, regressed = harness.compare(_result({'a': 10.0, 'b': 10.0}),
+                                       _result({'a': 10.5, 'b': 12.0, 'c': 1.0}, {'orders': 20}))
+    assert regressed == ['b']
+    assert any(line.startswith('c ') and line.endswith('new') for line in lines)
+    assert lines[-1] == 'warning: the two runs used different data sizes'
+
+
+def test_compare_command_exits_1_on_a_regression(tmp_path, capsys):
+    base, new = str(tmp_path / 'base.json'), str(tmp_path / 'new.json')
+    harness.save(_result({'a': 10.0}), base)
+    harness.save(_result({'a': 20.0}), new)
+    with pytest.raises(SystemExit) as e:
+        bench_cli.main(['compare', base, new])
+    assert e.value.code == 1
+    assert '1 route(s) regressed by more than 10%' in capsys.readouterr().out
+    bench_cli.main(['compare', base, new, '--threshold', '1.5'])
@@ -0,0 +1,78 @@
+import json
+import sqlite3
+
+import pytest
+
+import check_orders_status
+import ledger
+import migrations
+
+
+@pytest.fixture
+def run(app, tmp_path, capsys):
+    def run(*argv, path=None):
+        code = check_orders_status.main(['--db', path or app.config['DATABASE'], *argv])
+        return code, capsys.readouterr().out
+    return run
+
+
+def test_orders_are_filtered_and_streamed(run, conn, customer, add_orders):
+    first, _ = add_orders(('banner', 10), ('dtf', 5), order_date='2024-03-01')
+    add_orders(('sticker', 2), order_date='2024-04-01')
+    ledger.set_order_statuses(conn, [(first, 'Credit', None)])
+    code, out = run('--format', 'json', 'orders', '--status', 'pending', '--since', '2024-03-15')
+    assert code == 0
+    assert [json.loads(line)['service'] for line in out.splitlines()] == ['sticker']
+    code, out = run('--format', 'csv')
+    assert out.splitlines()[0] == 'order_id,customer,service,amount,payment_mode,status,order_date'
+    assert len(out.splitlines()) == 4
+
+
+def test_status_and_credit(run, conn, add_orders):
+    first, second = add_orders(('banner', 10), ('dtf', 5), order_date='2024-03-01')
+    ledger.set_order_statuses(conn, [(first, 'Credit', None), (second, 'Credit', None)])
+    code, out = run('status')
+    lines = out.splitlines()
+    assert lines[0].split() == ['status', 'orders', 'amount']
+    assert lines[2].split() == ['Credit', '2', '15.00']
+    code, out = run('--format', 'json', 'credit', '--days', '30', '--summary')
+    row = json.loads(out)
+    assert (row['customer'], row['orders'], row['amount'], row['oldest']) == ('Ama Mensah', 2, 15, '2024-03-01')
+
+
+def test_integrity_fails_on_counter_drift(run, conn, add_orders, tmp_path):
+    add_orders(('banner', 10))
+    archive = str(tmp_path / 'archive.db')
+    code, out = run('integrity', '--archive', archive)
+    assert code == 0
+    conn.execute("UPDATE order_status_counts SET order_count = 5 WHERE status = 'pending'")
+    conn.commit()
+    code, out = run('--format', 'json', 'integrity', '--archive', archive)
+    assert code == 1
+    results = {row['check']: row for row in map(json.loads, out.splitlines())}
+    assert results['status counts and balances']['result'] == 'FAIL'
+    assert results['status counts and balances']['detail'].endswith('fix with flask rebuild-counters')
+    assert results['daily rollups']['result'] == 'ok'
+
+
+def test_an_unmigrated_database_is_refused(run, tmp_path, capsys):
+    path = str(tmp_path / 'old.db')
+    sqlite3.connect(path).close()
+    with pytest.raises(SystemExit) as e:
+        run('status', path=path)
+    assert e.value.code == 2
+    assert 'is at schema version 0' in capsys.readouterr().err
+    with pytest.raises(SystemExit):
+        run('status', path=str(tmp_path / 'missing.db'))
+
+
+def test_the_journal_mode_is_left_alone(run, tmp_path):
+    path = str(tmp_path / 'delete.db')
+    conn = sqlite3.connect(path)
+    migrations.migrate(conn)
+    conn.close()
+    run('status', path=path)
+    run('analyze', path=path)
+    conn = sqlite3.connect(path)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    conn.close()
@@ -0,0 +1,54 @@
+import os
+
+import company_settings
+
+
+def test_missing_or_short_files_fall_back_to_the_defaults(tmp_path):
+    settings = company_settings.CompanySettings(str(tmp_path / 'company.txt'))
+    assert settings.get() == company_settings.DEFAULTS
+    assert company_settings.parse('Only a name') == company_settings.DEFAULTS
+    assert company_settings.parse('Acme\nAccra\n020\n') == ('Acme', 'Accra', '020', None)
+
+
+def test_file_is_reread_only_when_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / 'company.txt'
+    path.write_text('Acme\nAccra\n020\nlogo.png', encoding='utf-8')
+    settings = company_settings.CompanySettings(str(path), check_interval=0)
+    assert settings.get().logo == 'logo.png'
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr('builtins.open', lambda *a, **kw: opened.append(a[0]) or real_open(*a, **kw))
+    settings.get()
+    assert opened == []
+
+    path.write_text('Acme Ltd\nKumasi\n020\n', encoding='utf-8')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert settings.get() == ('Acme Ltd', 'Kumasi', '020', None)
+    assert opened == [str(path)]
+
+
+def test_check_interval_skips_the_stat(tmp_path, monkeypatch):
+    settings = company_settings.CompanySettings(str(tmp_path / 'company.txt'), check_interval=60)
+    settings.get()
+    monkeypatch.setattr(company_settings, '_mtime', lambda path: 1 / 0)
+    assert settings.get() == company_settings.DEFAULTS
+
+
+def test_save_keeps_the_file_format(tmp_path):
+    path = tmp_path / 'company.txt'
+    settings = company_settings.CompanySettings(str(path))
+    settings.save(name='Acme', phone='020')
+    assert path.read_text(encoding='utf-8') == f'Acme\n{company_settings.DEFAULTS.address}\n020\n'
+    assert settings.get().name == 'Acme'
+    assert not (tmp_path / 'company.txt.tmp').exists()
+
+
+def test_settings_page_updates_the_receipt_header(client, app):
+    r = client.post('/settings', data={'company_name': 'Acme Print', 'company_address': 'Tema',
+                                       'company_phone': '030'})
+    assert b'Settings updated successfully.' in r.data
+    with open(app.config['COMPANY_SETTINGS'], encoding='utf-8') as f:
+        assert f.read().startswith('Acme Print\nTema\n030\n')
+    assert b'Acme Print' in client.get('/settings').data
@@ -0,0 +1,48 @@
+import counters
+import ledger
+
+
+def _balance(conn, customer_id):
+    return conn.execute('SELECT order_count, total_amount, credit_orders, credit_amount, paid_orders, paid_amount '
+                        'FROM customer_balance WHERE customer_id = ?', (customer_id,)).fetchone()
+
+
+def test_triggers_follow_inserts_updates_and_deletes(conn, customer, add_orders):
+    first, second, third = add_orders(('banner', 10), ('sticker', 20), ('dtf', 30))
+    assert counters.status_count(conn, 'pending') == 3
+    ledger.set_order_statuses(conn, [(first, 'Credit', None), (second, 'Paid', None)])
+    assert counters.status_count(conn, 'pending') == 1
+    assert counters.status_count(conn, 'Credit', 'Paid') == 2
+    assert _balance(conn, customer) == (3, 60, 1, 10, 1, 20)
+    assert counters.credit_customer_count(conn) == 1
+
+    conn.execute('DELETE FROM orders WHERE id = ?', (third,))
+    conn.execute('UPDATE orders SET amount = 15 WHERE id = ?', (first,))
+    conn.commit()
+    assert _balance(conn, customer) == (2, 35, 1, 15, 1, 20)
+    assert counters.check(conn) == []
+
+
+def test_rebuild_repairs_drift(conn, customer, add_orders):
+    add_orders(('banner', 10), ('sticker', 20))
+    conn.execute("UPDATE order_status_counts SET order_count = 7 WHERE status = 'pending'")
+    conn.execute('DELETE FROM customer_balance')
+    conn.commit()
+    drift = counters.check(conn)
+    assert len(drift) == 2
+    assert counters.rebuild(conn) == drift
+    assert counters.check(conn) == []
+    assert counters.status_count(conn, 'pending') == 2
+
+
+def test_rebuild_counters_command(app, conn, add_orders):
+    add_orders(('banner', 10))
+    conn.execute("UPDATE order_status_counts SET total_amount = 0 WHERE status = 'pending'")
+    conn.commit()
+    runner = app.test_cli_runner()
+    r = runner.invoke(args=['rebuild-counters', '--check'])
+    assert r.exit_code == 1
+    assert "status 'pending'" in r.output
+    r = runner.invoke(args=['rebuild-counters'])
+    assert r.exit_code == 0
+    assert runner.invoke(args=['rebuild-counters', '--check']).exit_code == 0
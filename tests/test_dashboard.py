@@ -0,0 +1,27 @@
+import dashboard_metrics
+import ledger
+
+
+def test_metrics_come_from_one_query(conn, customer, add_orders):
+    first, second, _ = add_orders(('banner', 10), ('sticker', 20), ('dtf', 30))
+    ledger.set_order_statuses(conn, [(first, 'Credit', None), (second, 'Paid', None)])
+    assert dashboard_metrics.DashboardMetrics().compute(conn) == {
+        'total_orders': 1, 'pending_orders': 1, 'completed_orders': 2, 'working_orders': 0,
+        'credit_customers_count': 1}
+
+
+def test_metrics_are_cached_until_invalidated(conn, add_orders):
+    metrics = dashboard_metrics.DashboardMetrics(ttl=60)
+    assert metrics.get(conn)['pending_orders'] == 0
+    add_orders(('banner', 10))
+    assert metrics.get(conn)['pending_orders'] == 0
+    metrics.invalidate()
+    assert metrics.get(conn)['pending_orders'] == 1
+
+
+def test_add_order_refreshes_the_dashboard(client, customer):
+    assert b'<h3>0</h3>' in client.get('/dashboard').data
+    r = client.post('/add_order', data={'customer_id': customer, 'service': ['banner', 'dtf'], 'amount': '12',
+                                        'order_date': '2024-03-01'})
+    assert r.status_code == 302
+    assert b'<h3>2</h3>' in client.get('/dashboard').data
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import db
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'pool.db'), size=2, timeout=0.05)
+    yield pool
+    pool.close()
+
+
+def test_connections_are_reused(pool):
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['hits'], stats['misses'], stats['open']) == (2, 1, 1, 1)
+
+
+def test_new_connections_get_the_pragmas(pool):
+    conn = pool.acquire()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+    pool.release(conn)
+
+
+def test_a_full_pool_times_out(pool):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(db.PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+    pool.release(held.pop())
+    assert pool.acquire() is not None
+
+
+def test_release_rolls_back_an_open_transaction(pool):
+    conn = pool.acquire()
+    conn.execute('CREATE TABLE t (x)')
+    conn.commit()
+    conn.execute('INSERT INTO t VALUES (1)')
+    pool.release(conn)
+    conn = pool.acquire()
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+    pool.release(conn)
+
+
+def test_a_request_uses_one_pooled_connection(app):
+    with app.test_request_context():
+        assert db.get_db() is db.get_db()
+    pool = db.get_pool(app)
+    assert pool.stats()['in_use'] == 0
+
+
+def test_a_forked_process_gets_its_own_pool(app, monkeypatch):
+    pool = db.get_pool(app)
+    monkeypatch.setattr(os, 'getpid', lambda: pool.pid + 1)
+    assert db.get_pool(app) is not pool
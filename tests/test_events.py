@@ -0,0 +1,78 @@
+import logging
+
+import pytest
+
+import events
+import ledger
+
+
+@pytest.fixture
+def broadcaster(app):
+    broadcaster = events.Broadcaster(app.config['DATABASE'], poll_interval=0.01, max_clients=2)
+    yield broadcaster
+    broadcaster.stop()
+
+
+def _kinds(conn):
+    return conn.execute('SELECT order_id, kind, status, old_status FROM order_events ORDER BY id').fetchall()
+
+
+def test_triggers_log_every_order_change(conn, add_orders):
+    order, = add_orders(('banner', 10))
+    ledger.set_order_statuses(conn, [(order, 'Paid', None)])
+    conn.execute("UPDATE orders SET amount = 12 WHERE id = ?", (order,))
+    conn.execute('DELETE FROM orders WHERE id = ?', (order,))
+    conn.commit()
+    assert _kinds(conn) == [(order, 'created', 'pending', None), (order, 'status', 'Paid', 'pending'),
+                            (order, 'deleted', None, 'Paid')]
+
+
+def test_subscribers_get_new_events(broadcaster, conn, customer, add_orders):
+    sub = broadcaster.subscribe()
+    order, = add_orders(('banner', 10))
+    event = sub.queue.get(timeout=5)
+    assert (event['order_id'], event['kind'], event['customer_name']) == (order, 'created', 'Ama Mensah')
+    assert events.format_event(event).startswith(f"id: {event['id']}\nevent: order\ndata: {{")
+
+
+def test_reconnecting_clients_get_what_they_missed(broadcaster, add_orders):
+    _, second = add_orders(('banner', 10), ('dtf', 5))
+    sub = broadcaster.subscribe(last_event_id=1)
+    assert sub.queue.get_nowait()['order_id'] == second
+    assert sub.queue.empty()
+
+
+def test_clients_behind_a_pruned_log_are_told_to_reload(broadcaster, conn, add_orders):
+    add_orders(('banner', 10), ('dtf', 5), ('sticker', 1))
+    conn.execute(events.PRUNE_SQL, (2,))
+    conn.commit()
+    sub = broadcaster.subscribe(last_event_id=0)
+    assert sub.queue.get_nowait() == {'kind': 'reset'}
+
+
+def test_streams_stop_at_the_client_limit(broadcaster):
+    subs = [broadcaster.subscribe(), broadcaster.subscribe()]
+    assert broadcaster.subscribe() is None
+    broadcaster.unsubscribe(subs.pop())
+    assert broadcaster.subscribe() is not None
+    assert broadcaster.stats()['clients'] == 2
+
+
+@pytest.mark.parametrize('threads, limit, expected', [(8, 0, 4), (8, 3, 3), (8, 8, 7), (4, 20, 3)])
+def test_client_limit_leaves_a_thread_for_requests(app, caplog, threads, limit, expected):
+    app.config.update(SERVER_THREADS=threads, EVENTS_MAX_CLIENTS=limit)
+    with caplog.at_level(logging.WARNING, logger='printing_press.events'):
+        assert events.client_limit(app) == expected
+    assert ('would let live screens hold all' in caplog.text) == (limit >= threads)
+
+
+def test_events_endpoint(app, client):
+    app.config.update(SERVER_THREADS=2, EVENTS_MAX_CLIENTS=1)
+    r = client.get('/events')
+    assert r.mimetype == 'text/event-stream'
+    stream = iter(r.response)
+    assert next(stream) == b'retry: 3000\n\n'
+    busy = client.get('/events')
+    assert (busy.status_code, busy.headers['Retry-After']) == (503, '30')
+    r.close()
+    assert events.get_broadcaster(app).stats()['clients'] == 0
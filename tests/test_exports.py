@@ -0,0 +1,44 @@
+import csv
+import io
+import zipfile
+
+import exports
+import ledger
+
+
+def test_csv_is_written_in_pieces():
+    rows = [(i, f'row {i}') for i in range(5)]
+    chunks = list(exports.csv_stream(('ID', 'Name'), iter(rows), flush_every=2))
+    assert len(chunks) == 3
+    assert list(csv.reader(io.StringIO(''.join(chunks)))) == [['ID', 'Name']] + [[str(i), f'row {i}'] for i in range(5)]
+
+
+def test_xlsx_is_a_readable_workbook():
+    data = b''.join(exports.xlsx_stream(('ID', 'Name'), iter([(1, 'A & B\x01'), (2, None)]), flush_every=1))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.testzip() is None
+        sheet = zf.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert '<c><v>1</v></c><c t="inlineStr"><is><t xml:space="preserve">A &amp; B</t></is></c>' in sheet
+    assert '<row><c><v>2</v></c><c/></row>' in sheet
+
+
+def test_build_query_applies_the_filters():
+    sql, params, header = exports.build_query('orders', start_date='2024-01-01', statuses=['Paid', 'Credit'])
+    assert sql.endswith("AND o.order_date >= ? AND o.status IN (?, ?) ORDER BY o.id")
+    assert params == ['2024-01-01', 'Paid', 'Credit']
+    # Datasets without the column ignore the filter
+    assert exports.build_query('customers', start_date='2024-01-01')[1] == []
+
+
+def test_export_endpoint(client, conn, add_orders):
+    first, _ = add_orders(('banner', 10), ('dtf', 5), order_date='2024-03-01')
+    add_orders(('sticker', 2), order_date='2024-04-01')
+    ledger.set_order_statuses(conn, [(first, 'Paid', None)])
+    r = client.get('/export/orders?end_date=2024-03-31&status=pending')
+    assert r.status_code == 200
+    assert r.mimetype == 'text/csv'
+    assert r.headers['Content-Disposition'] == 'attachment; filename=orders.csv'
+    lines = list(csv.reader(io.StringIO(r.get_data(as_text=True))))
+    assert [line[2] for line in lines] == ['Service', 'dtf']
+    assert client.get('/export/paid?format=xlsx').data.startswith(b'PK')
+    assert client.get('/export/orders?format=pdf').status_code == 404
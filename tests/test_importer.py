@@ -0,0 +1,62 @@
+import io
+
+import importer
+
+CUSTOMERS_CSV = b'''name,mobile,email,address
+Ama Mensah,0244000000,ama@example.com,Accra
+Kojo Asante,0200000000,kojo@example.com,Kumasi
+Kojo Asante,0200000000,kojo@example.com,Kumasi
+Kojo Asante,0555000000,kojo@example.com,Tema
+Yaw,,yaw@example.com,Ho
+'''
+INK = b'{"amount": 5, "description": "Printer ink", "date": "2024-03-01"}'
+
+
+def _import(conn, data, kind='customers', fmt='csv', **kwargs):
+    return importer.import_stream(conn, kind, io.BytesIO(data), fmt, **kwargs)
+
+
+def test_customers_already_on_file_or_repeated_are_skipped(conn):
+    conn.execute("INSERT INTO customers (name, mobile, email, address) "
+                 "VALUES ('Ama Mensah', '0244000000', 'ama@example.com', 'Accra')")
+    conn.commit()
+    report = _import(conn, CUSTOMERS_CSV, chunk_size=2)
+    assert (report.rows, report.inserted, report.error_count) == (5, 2, 1)
+    assert report.errors[0]['line'] == 6
+    assert sorted(conn.execute('SELECT name, mobile FROM customers')) == [
+        ('Ama Mensah', '0244000000'), ('Kojo Asante', '0200000000'), ('Kojo Asante', '0555000000')]
+    # Running the same file again adds nothing
+    assert _import(conn, CUSTOMERS_CSV).inserted == 0
+
+
+def test_orders_for_unknown_customers_are_errors(conn, customer):
+    data = (b'[{"customer_id": %d, "service": "banner", "order_date": "2024-05-01", "amount": 12},'
+            b' {"customer_id": 999, "service": "banner", "order_date": "2024-05-01", "amount": 12}]' % customer)
+    report = _import(conn, data, kind='orders', fmt='json')
+    assert (report.inserted, report.error_count) == (1, 1)
+    order_id, = conn.execute('SELECT id FROM orders').fetchone()
+    assert conn.execute('SELECT order_id, amount FROM payments').fetchall() == [(order_id, 12)]
+
+
+def test_a_malformed_json_element_stops_the_import(conn):
+    data = b'[%s, {"amount": 2, oops}, %s]' % (INK, INK)
+    report = _import(conn, data, kind='expenses', fmt='json')
+    assert (report.inserted, report.errors) == (1, [{'line': 2, 'error': 'invalid JSON, import stopped here'}])
+
+
+def test_an_unclosed_json_array_is_reported(conn):
+    report = _import(conn, b'[%s,' % INK, kind='expenses', fmt='json')
+    assert (report.inserted, report.errors) == (1, [{'line': 2, 'error': 'the JSON array is never closed'}])
+
+
+def test_json_lines_with_a_bad_line(conn):
+    report = _import(conn, b'%s\nnot json\n\n%s\n' % (INK, INK), kind='expenses', fmt='json')
+    assert (report.rows, report.inserted, report.errors) == (3, 2, [{'line': 2, 'error': 'invalid JSON'}])
+
+
+def test_upload_endpoint(client):
+    r = client.post('/import/customers', data={'file': (io.BytesIO(CUSTOMERS_CSV), 'customers.csv')})
+    assert r.status_code == 200
+    assert r.get_json()['inserted'] == 3
+    assert client.post('/import/nothing', data={'file': (io.BytesIO(b''), 'x.csv')}).status_code == 404
+    assert client.post('/import/customers', data={}).status_code == 400
@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+import db
+import instrumentation
+
+
+@pytest.fixture
+def metrics():
+    instrumentation.metrics.reset()
+    yield instrumentation.metrics
+    instrumentation.metrics.enabled = True
+    instrumentation.metrics.slow_query_ms = 100.0
+    instrumentation.metrics.reset()
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = instrumentation.Histogram((1, 5))
+    for value in (0.5, 1, 3, 9):
+        hist.observe(value)
+    assert list(hist.lines('q', 'e="x"')) == [
+        'q_bucket{e="x",le="1"} 2', 'q_bucket{e="x",le="5"} 3', 'q_bucket{e="x",le="+Inf"} 4',
+        'q_sum{e="x"} 13.500000', 'q_count{e="x"} 4']
+
+
+def test_statements_are_counted_against_the_request(metrics, tmp_path):
+    conn = db.connect(str(tmp_path / 'm.db'), instrumentation.InstrumentedConnection)
+    metrics.start_request()
+    conn.execute('CREATE TABLE t (x)')
+    conn.executemany('INSERT INTO t VALUES (?)', [(1,), (2,)])
+    conn.cursor().execute('SELECT * FROM t').fetchall()
+    metrics.end_request('view', 200)
+    conn.close()
+    assert metrics.request_queries['view'].sum == 3
+    assert metrics.responses == {('view', 200): 1}
+
+
+def test_slow_statements_are_logged(metrics, tmp_path, caplog):
+    conn = db.connect(str(tmp_path / 'm.db'), instrumentation.InstrumentedConnection)
+    metrics.slow_query_ms = 0
+    with caplog.at_level(logging.WARNING, logger='printing_press.sql'):
+        conn.execute('SELECT ?', (42,))
+    conn.close()
+    assert metrics.slow_queries == 1
+    assert 'SELECT ? params=(42,)' in caplog.text
+
+
+def test_disabled_metrics_record_nothing(metrics, tmp_path):
+    metrics.enabled = False
+    metrics.start_request()
+    conn = db.connect(str(tmp_path / 'm.db'), instrumentation.InstrumentedConnection)
+    conn.execute('SELECT 1')
+    conn.close()
+    metrics.end_request('view', 200)
+    assert metrics.responses == {}
+
+
+def test_metrics_endpoint_needs_a_login_or_the_token(app, client, metrics):
+    app.config['METRICS_TOKEN'] = 's3cret'
+    anonymous = app.test_client()
+    assert anonymous.get('/metrics').status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    r = anonymous.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert r.status_code == 200
+    client.get('/dashboard')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'http_responses_total{endpoint="dashboard",status="200"} 1' in body
+    assert 'db_pool{stat="checkouts"}' in body
+    assert 'instrumentation_enabled 1' in body
+
+
+def test_an_empty_token_never_matches(app, metrics):
+    assert app.config['METRICS_TOKEN'] == ''
+    assert app.test_client().get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 401
+
+
+def test_toggle(client, metrics):
+    assert client.post('/metrics/toggle', data={'enabled': '0'}).get_json() == {'enabled': False}
+    assert not metrics.enabled
+    assert client.post('/metrics/toggle', data={'enabled': '1', 'reset': '1'}).get_json() == {'enabled': True}
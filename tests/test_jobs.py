@@ -0,0 +1,99 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+def _wait(conn, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(conn, job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job {job_id} still {job["status"]}')
+
+
+@pytest.fixture
+def runner(app):
+    runner = jobs.JobRunner(app.config['DATABASE'], app.config['JOBS_DIR'], workers=1)
+    yield runner
+    runner.shutdown()
+
+
+def test_export_job_writes_its_file(runner, conn, add_orders):
+    add_orders(('banner', 10), ('dtf', 5))
+    job = _wait(conn, runner.submit(conn, 'export', {'dataset': 'orders'}))
+    assert (job['status'], job['progress'], job['result_name']) == ('done', 1, 'orders.csv')
+    with open(job['result_path'], encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 3
+
+
+def test_a_failing_job_records_the_error(runner, conn):
+    job = _wait(conn, runner.submit(conn, 'report', {'start_date': '2024-01-01', 'end_date': '2024-12-31',
+                                                     'group': 'year'}))
+    assert (job['status'], job['error']) == ('failed', 'ValueError: Unknown grouping')
+    with pytest.raises(ValueError):
+        runner.submit(conn, 'shell', {})
+
+
+def test_cancelling_a_queued_job_drops_it(runner, conn, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(jobs.KINDS, 'block', lambda conn, job: release.wait(10) and None)
+    busy = runner.submit(conn, 'block', {})
+    queued = runner.submit(conn, 'block', {})
+    assert runner.cancel(conn, queued)
+    release.set()
+    assert _wait(conn, queued)['status'] == 'cancelled'
+    assert _wait(conn, busy)['status'] == 'done'
+    assert not runner.cancel(conn, busy)
+
+
+def _unfinished(conn, boot_id, pid):
+    job_id = conn.execute("INSERT INTO background_jobs (kind, params, status, boot_id, worker_pid) "
+                          "VALUES ('export', '{}', 'running', ?, ?)", (boot_id, pid)).lastrowid
+    conn.commit()
+    return job_id
+
+
+def test_a_new_runner_fails_jobs_left_by_an_earlier_boot_or_a_dead_worker(app, conn, monkeypatch):
+    old_boot = _unfinished(conn, 'earlier-boot', os.getpid())
+    this_process = _unfinished(conn, jobs.BOOT_ID, os.getpid())
+    dead_worker = _unfinished(conn, jobs.BOOT_ID, 2 ** 22 + 1)
+    live_worker = _unfinished(conn, jobs.BOOT_ID, os.getppid())
+    jobs.JobRunner(app.config['DATABASE'], app.config['JOBS_DIR']).shutdown()
+    status = dict(conn.execute('SELECT id, status FROM background_jobs'))
+    assert status == {old_boot: 'failed', this_process: 'running', dead_worker: 'failed', live_worker: 'running'}
+
+
+def test_prune_removes_old_jobs_and_their_files(app, conn):
+    result_dir = app.config['JOBS_DIR']
+    os.makedirs(result_dir, exist_ok=True)
+    old = conn.execute("INSERT INTO background_jobs (kind, params, status, finished_at) "
+                       "VALUES ('export', '{}', 'done', datetime('now', '-10 days'))").lastrowid
+    new = conn.execute("INSERT INTO background_jobs (kind, params, status, finished_at) "
+                       "VALUES ('export', '{}', 'done', datetime('now'))").lastrowid
+    conn.commit()
+    for job_id in (old, new):
+        open(os.path.join(result_dir, f'job-{job_id}-orders.csv'), 'w').close()
+    assert jobs.prune(conn, result_dir, 7) == (1, 1)
+    assert [row[0] for row in conn.execute('SELECT id FROM background_jobs')] == [new]
+    assert os.listdir(result_dir) == [f'job-{new}-orders.csv']
+
+
+def test_jobs_endpoints(client, conn):
+    data = {'file': (io.BytesIO(b'name,mobile,email,address\nAma,1,a@example.com,Accra\n'), 'c.csv'),
+            'import_kind': 'customers'}
+    r = client.post('/jobs', data=data)
+    assert r.status_code == 202
+    job = _wait(conn, r.get_json()['id'])
+    assert job['status'] == 'done'
+    status = client.get(r.get_json()['status_url']).get_json()
+    assert 'result_path' not in status
+    assert client.get(status['result_url']).get_json()['inserted'] == 1
+    assert client.post('/jobs', json={'kind': 'import', 'params': {'path': '/etc/passwd'}}).status_code == 400
+    assert client.get('/jobs/999').status_code == 404
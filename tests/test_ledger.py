@@ -0,0 +1,47 @@
+import ledger
+
+
+def _pay(conn, order_id, day):
+    ledger.set_order_status(conn, order_id, 'Paid', today=day)
+
+
+def test_statement_balances(conn, customer, add_orders):
+    first, = add_orders(('banner', 100), order_date='2024-01-10')
+    second, = add_orders(('sticker', 40), order_date='2024-02-10')
+    add_orders(('dtf', 25), order_date='2024-03-10')
+    _pay(conn, first, '2024-02-15')
+    _pay(conn, second, '2024-03-20')
+
+    opening, rows = ledger.statement(conn, customer)
+    assert opening == 0
+    assert [(row['day'], row['debit'], row['credit'], row['balance']) for row in rows] == [
+        ('2024-01-10', 100, 0, 100), ('2024-02-10', 40, 0, 140), ('2024-02-15', 0, 100, 40),
+        ('2024-03-10', 25, 0, 65), ('2024-03-20', 0, 40, 25)]
+    assert rows[-1]['balance'] == ledger.balance(conn, customer)['outstanding']
+
+    # A range carries the balance from before it and stops at its end
+    opening, rows = ledger.statement(conn, customer, start='2024-02-11', end='2024-03-15')
+    assert opening == 140
+    assert [row['balance'] for row in rows] == [40, 65]
+
+    # The latest entries only, with the balance carried into them
+    opening, rows = ledger.statement(conn, customer, limit=2)
+    assert opening == 40
+    assert [row['day'] for row in rows] == ['2024-03-10', '2024-03-20']
+    assert ledger.statement(conn, customer, limit=0) == (0, [])
+
+
+def test_legacy_payments_are_linked_not_duplicated(conn, customer, add_orders):
+    # Rows from before payments.order_id, with the same amount and date as their orders
+    conn.execute("INSERT INTO payments (id, amount, paid, payment_date) VALUES (500, 75, 0, '2023-06-01')")
+    conn.execute("INSERT INTO payments (id, amount, paid, payment_date) VALUES (501, 75, 0, '2023-06-01')")
+    conn.execute("INSERT INTO payments (id, amount, paid, payment_date) VALUES (502, 10, 0, '2023-06-02')")
+    conn.commit()
+    orders = add_orders(('banner', 75), ('sticker', 75), order_date='2023-06-01')
+    # The payments add_orders wrote stand in for an earlier backfill's duplicates
+    conn.execute('UPDATE payments SET paid = 1 WHERE order_id = ?', (orders[1],))
+    assert ledger.link_legacy_payments(conn) == 2
+    assert conn.execute('SELECT id, order_id, paid FROM payments WHERE amount = 75 ORDER BY id').fetchall() == [
+        (500, orders[0], 0), (501, orders[1], 1)]
+    assert conn.execute('SELECT order_id FROM payments WHERE id = 502').fetchone() == (None,)
+    assert ledger.link_legacy_payments(conn) == 0
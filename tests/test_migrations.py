@@ -0,0 +1,50 @@
+import pytest
+
+import app as app_module
+import caching
+import counters
+import db
+import events
+import migrations
+import reports
+import search
+import work_queue
+
+
+def test_fresh_database_is_fully_migrated(conn):
+    assert migrations.current_version(conn) == migrations.latest_version()
+    assert app_module.init_db() == []
+
+
+def test_route_queries_use_indexes(conn):
+    assert migrations.check_query_plans(conn, app_module.QUERY_PLAN_CHECKS) == {}
+
+
+def test_full_scans_are_reported(conn):
+    assert migrations.full_scans(conn, 'SELECT * FROM orders WHERE service = ?', ('banner',))
+
+
+def _schema(conn):
+    return sorted(conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+
+
+@pytest.mark.parametrize('version', [1, 8, 12, 16])
+def test_upgrading_an_old_database_matches_a_fresh_one(tmp_path, conn, monkeypatch, version):
+    old = db.connect(str(tmp_path / 'old.db'))
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [m for m in migrations.MIGRATIONS if m[0] <= version])
+    migrations.migrate(old)
+    assert migrations.current_version(old) == version
+    monkeypatch.undo()
+    migrations.migrate(old)
+    assert _schema(old) == _schema(conn)
+    old.close()
+
+
+def test_install_only_refreshes_triggers(conn):
+    before = _schema(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    for module in (counters, search, reports, events, work_queue, caching):
+        module.install(conn)
+    counters.install_id_sequence(conn)
+    conn.execute('COMMIT')
+    assert _schema(conn) == before
@@ -0,0 +1,61 @@
+import pytest
+
+import order_intake
+
+
+def _order(customer_id, *items, order_date='2024-03-01'):
+    return order_intake.normalize_order({'customer_id': customer_id, 'order_date': order_date,
+                                         'items': [{'service': s, 'amount': a} for s, a in items]})
+
+
+@pytest.mark.parametrize('data, message', [
+    ([], 'Each order must be an object'),
+    ({'order_date': '2024-03-01', 'items': [{'service': 'x', 'amount': 1}]}, 'customer_id is required'),
+    ({'customer_id': 1, 'items': [{'service': 'x', 'amount': 1}]}, 'order_date is required'),
+    ({'customer_id': 1, 'order_date': '2024-03-01', 'items': []}, 'items must be a non-empty list'),
+    ({'customer_id': 1, 'order_date': '2024-03-01', 'items': [{'amount': 1}]}, 'Each item needs a service'),
+    ({'customer_id': 1, 'order_date': '2024-03-01', 'items': [{'service': 'x', 'amount': -1}]},
+     'Invalid amount for x'),
+])
+def test_normalize_rejects_bad_orders(data, message):
+    with pytest.raises(order_intake.IntakeError, match=message):
+        order_intake.normalize_order(data)
+
+
+def test_orders_and_payments_are_written_together(conn, customer):
+    ids = order_intake.create_orders(conn, [_order(customer, ('banner', 10), ('dtf', 5)),
+                                            _order(customer, ('sticker', 2.5))])
+    assert ids == [[1, 2], [3]]
+    rows = conn.execute('SELECT o.id, o.service, o.amount, o.status, o.payment_mode, p.amount, p.paid '
+                        'FROM orders o JOIN payments p ON p.order_id = o.id ORDER BY o.id').fetchall()
+    assert rows == [(1, 'banner', 10, 'pending', 'Unpaid', 10, 0),
+                    (2, 'dtf', 5, 'pending', 'Unpaid', 5, 0),
+                    (3, 'sticker', 2.5, 'pending', 'Unpaid', 2.5, 0)]
+    assert order_intake.create_orders(conn, [_order(customer, ('flyer', 1))]) == [[4]]
+
+
+def test_unknown_customer_writes_nothing(conn, customer):
+    with pytest.raises(order_intake.IntakeError, match=r'Unknown customer id\(s\): \[99\]'):
+        order_intake.create_orders(conn, [_order(customer, ('banner', 10)), _order(99, ('dtf', 5))])
+    assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 0
+    assert not conn.in_transaction
+
+
+def test_a_failed_insert_rolls_back_the_batch(conn, customer):
+    conn.execute('CREATE TEMP TRIGGER refuse BEFORE INSERT ON payments WHEN NEW.amount = 5 '
+                 "BEGIN SELECT RAISE(ABORT, 'refused'); END")
+    with pytest.raises(Exception, match='refused'):
+        order_intake.create_orders(conn, [_order(customer, ('banner', 10), ('dtf', 5))])
+    assert conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0] == 0
+
+
+def test_api_orders(client, customer):
+    r = client.post('/api/orders', json={'orders': [
+        {'customer_id': customer, 'order_date': '2024-03-01', 'items': [{'service': 'banner', 'amount': 10}]},
+        {'customer_id': customer, 'order_date': '2024-03-02', 'items': [{'service': 'dtf', 'amount': 5}]}]})
+    assert r.status_code == 201
+    assert r.get_json() == {'success': True, 'orders': [{'order_ids': [1]}, {'order_ids': [2]}]}
+    r = client.post('/api/orders', json={'customer_id': 42, 'order_date': '2024-03-01',
+                                         'items': [{'service': 'banner', 'amount': 10}]})
+    assert r.status_code == 400
+    assert client.post('/api/orders', json=[]).status_code == 400
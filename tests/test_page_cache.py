@@ -0,0 +1,69 @@
+import app as app_module
+
+
+def test_unchanged_pages_answer_304(client, customer):
+    before = app_module.page_cache.stats()['not_modified']
+    first = client.get('/view_customer')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Cookie' in first.headers['Vary']
+    r = client.get('/view_customer', headers={'If-None-Match': etag})
+    assert (r.status_code, r.data) == (304, b'')
+    assert app_module.page_cache.stats()['not_modified'] == before + 1
+
+
+def test_repeat_requests_are_served_from_the_cache(client, customer):
+    before = app_module.page_cache.stats()
+    first = client.get('/view_customer')
+    second = client.get('/view_customer')
+    assert second.data == first.data
+    assert second.mimetype == 'text/html'
+    after = app_module.page_cache.stats()
+    assert (after['hits'] - before['hits'], after['misses'] - before['misses'], after['entries']) == (1, 1, 1)
+
+
+def test_a_write_to_a_listed_table_changes_the_page(client, conn, customer):
+    etag = client.get('/view_customer').headers['ETag']
+    # Other tables do not matter to this page
+    conn.execute("INSERT INTO expenses (amount, description, date) VALUES (1, 'ink', '2024-03-01')")
+    conn.commit()
+    assert client.get('/view_customer', headers={'If-None-Match': etag}).status_code == 304
+    conn.execute("INSERT INTO customers (name, mobile) VALUES ('Kwame Asante', '0200000000')")
+    conn.commit()
+    r = client.get('/view_customer', headers={'If-None-Match': etag})
+    assert r.status_code == 200
+    assert b'Kwame Asante' in r.data
+
+
+def test_each_user_and_url_gets_its_own_entry(app, client, conn, customer):
+    conn.execute("INSERT INTO users (username, password) VALUES ('cashier', 'pw')")
+    conn.commit()
+    other = app.test_client()
+    other.post('/login', data={'username': 'cashier', 'password': 'pw'})
+    etag = client.get('/view_customer').headers['ETag']
+    assert other.get('/view_customer', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/view_customer?sort=name', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_company_details_are_part_of_the_key(client, add_orders):
+    order, = add_orders(('banner', 10))
+    etag = client.get(f'/print_order/{order}').headers['ETag']
+    client.post('/settings', data={'company_name': 'Acme Print', 'company_address': 'Tema', 'company_phone': '030'})
+    r = client.get(f'/print_order/{order}', headers={'If-None-Match': etag})
+    assert r.status_code == 200
+    assert b'Acme Print' in r.data
+
+
+def test_pages_are_not_cached_when_disabled(app, client, customer):
+    app_module.page_cache.enabled = False
+    r = client.get('/view_customer')
+    assert 'ETag' not in r.headers
+    assert app_module.page_cache.stats()['entries'] == 0
+
+
+def test_cached_pages_still_need_a_login(app, client):
+    client.get('/completed_orders')
+    r = app.test_client().get('/completed_orders')
+    assert r.status_code == 302
+    assert '/login' in r.headers['Location']
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+import app as app_module
+import pagination
+
+
+@pytest.fixture
+def names():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT, mobile TEXT, email TEXT, address TEXT)')
+    conn.executemany('INSERT INTO customers (name) VALUES (?)',
+                     [('Kofi',), (None,), ('Ama',), (None,), ('Esi',), ('Ama',), ('Yaw',)])
+    yield conn
+    conn.close()
+
+
+def _walk(conn, sort, descending, size=2):
+    keys, key = app_module.CUSTOMER_SORTS[sort]
+    pages, cursor = [], None
+    while True:
+        page = pagination.paginate(conn, app_module.CUSTOMERS_SQL, [], keys, key, descending=descending,
+                                   after=cursor, size=size)
+        pages.append([row[0] for row in page])
+        if not page.next_cursor:
+            return pages
+        cursor = pagination.decode_cursor(page.next_cursor)
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_pages_cover_every_row_including_null_keys(names, descending):
+    pages = _walk(names, 'name', descending)
+    ids = [i for page in pages for i in page]
+    expected = [2, 4, 3, 6, 5, 1, 7]
+    assert ids == (expected[::-1] if descending else expected)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+
+
+def test_previous_cursor_walks_back(names):
+    keys, key = app_module.CUSTOMER_SORTS['id']
+    first = pagination.paginate(names, app_module.CUSTOMERS_SQL, [], keys, key, descending=False, size=3)
+    assert first.prev_cursor is None
+    second = pagination.paginate(names, app_module.CUSTOMERS_SQL, [], keys, key, descending=False,
+                                 after=pagination.decode_cursor(first.next_cursor), size=3)
+    back = pagination.paginate(names, app_module.CUSTOMERS_SQL, [], keys, key, descending=False,
+                               before=pagination.decode_cursor(second.prev_cursor), size=3)
+    assert [row[0] for row in second] == [4, 5, 6]
+    assert [row[0] for row in back] == [1, 2, 3]
+    assert back.prev_cursor is None and back.next_cursor
+
+
+@pytest.mark.parametrize('token', ['%%%', 'WzE', 'eyJhIjoxfQ', 'W1sxXV0', 'W3RydWVd'])
+def test_malformed_cursors_are_rejected(token):
+    with pytest.raises(ValueError):
+        pagination.decode_cursor(token)
+
+
+def test_listing_answers_400_for_a_bad_cursor(client, customer):
+    assert client.get('/view_customer?after=W1sxXV0').status_code == 400
+    r = client.get('/view_customer?sort=name&size=1')
+    assert r.status_code == 200
+    assert b'Ama Mensah' in r.data
@@ -0,0 +1,71 @@
+import ledger
+
+
+def _version(conn, order_id):
+    return conn.execute('SELECT version FROM orders WHERE id = ?', (order_id,)).fetchone()[0]
+
+
+def test_status_change_bumps_version_and_marks_payment(client, conn, add_orders):
+    order_id, = add_orders(('banner', 50))
+    r = client.post('/update_payment_status', json={'order_id': order_id, 'status': 'Paid', 'expected_version': 0})
+    assert r.status_code == 200
+    assert r.get_json() == {'success': True, 'version': 1}
+    assert conn.execute('SELECT paid FROM payments WHERE order_id = ?', (order_id,)).fetchone()[0] == 1
+
+
+def test_stale_version_is_a_conflict(client, conn, add_orders):
+    order_id, = add_orders(('banner', 50))
+    client.post('/update_payment_status', json={'order_id': order_id, 'status': 'Credit', 'expected_version': 0})
+    r = client.post('/update_payment_status', json={'order_id': order_id, 'status': 'Paid', 'expected_version': 0})
+    assert r.status_code == 409
+    assert r.get_json()['version'] == 1
+    assert conn.execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()[0] == 'Credit'
+
+
+def test_completed_orders_page_sends_string_ids(client, add_orders):
+    order_id, = add_orders(('banner', 50))
+    r = client.post('/update_payment_status', json={'order_id': str(order_id), 'status': 'Paid'})
+    assert r.status_code == 200
+
+
+def test_invalid_single_updates(client, add_orders):
+    order_id, = add_orders(('banner', 50))
+    for body in ({'order_id': True, 'status': 'Paid'}, {'order_id': 1.5, 'status': 'Paid'},
+                 {'order_id': order_id, 'status': 'Lost'}, {'order_id': order_id, 'status': 'Paid',
+                                                            'expected_version': '0'}, ['not', 'an', 'object']):
+        assert client.post('/update_payment_status', json=body).status_code == 400
+    assert client.post('/update_payment_status', json={'order_id': 999, 'status': 'Paid'}).status_code == 404
+
+
+def test_batch_applies_valid_entries_and_reports_the_rest(client, conn, add_orders):
+    first, second, third = add_orders(('banner', 10), ('sticker', 20), ('dtf', 30))
+    client.post('/update_payment_status', json={'order_id': third, 'status': 'Credit'})
+    r = client.post('/update_payment_status/batch', json={'orders': [
+        {'order_id': first, 'status': 'Paid', 'expected_version': 0},
+        {'order_id': True, 'status': 'Paid'},
+        {'order_id': str(second), 'status': 'Paid'},
+        {'order_id': 2.0, 'status': 'Paid'},
+        {'order_id': '\u00b2', 'status': 'Paid'},
+        {'order_id': second, 'status': 'Refunded'},
+        'not an object',
+        {'order_id': third, 'status': 'Paid', 'expected_version': 0},
+        {'order_id': 999, 'status': 'Paid'},
+    ]})
+    assert r.status_code == 200
+    body = r.get_json()
+    assert body['success'] is False
+    assert [entry['result'] for entry in body['results']] == [
+        ledger.UPDATED, 'invalid', ledger.UPDATED, 'invalid', 'invalid', 'invalid', 'invalid', ledger.CONFLICT,
+        ledger.NOT_FOUND]
+    assert body['results'][0]['version'] == 1
+    assert body['results'][7]['version'] == 1
+    # The string id from the completed orders page counts, the rejected entries changed nothing
+    assert _version(conn, second) == 1
+    assert conn.execute('SELECT status FROM orders WHERE id = ?', (third,)).fetchone()[0] == 'Credit'
+
+
+def test_batch_needs_a_list(client):
+    for body in ({}, {'orders': []}, {'orders': {'order_id': 1}}):
+        assert client.post('/update_payment_status/batch', json=body).status_code == 400
+    too_many = [{'order_id': 1, 'status': 'Paid'}] * (ledger.MAX_BATCH_STATUS_CHANGES + 1)
+    assert client.post('/update_payment_status/batch', json={'orders': too_many}).status_code == 400
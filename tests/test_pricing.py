@@ -0,0 +1,65 @@
+import pytest
+
+import pricing
+
+RATES = {('banner', ''): 2.5, ('sticker', ''): 2.2, ('onewayvision', ''): 4.2, ('dtf', 'A4'): 7, ('dtf', 'A3'): 14}
+
+
+def test_area_and_sheet_prices():
+    table = pricing.RateTable(RATES)
+    assert table.price('banner', 2, 3, 4) == 60
+    assert table.price('Oneway', 1, 12, 12, unit='in') == pytest.approx(4.2)
+    assert table.price('dtf', 3, size='A3') == 42
+    # Unknown sheet sizes get the smallest sheet's rate
+    assert table.price('dtf', 1, size='A0') == 7
+    assert table.services == ('banner', 'dtf', 'onewayvision', 'sticker')
+
+
+def test_quote_reports_each_bad_line():
+    table = pricing.RateTable(RATES)
+    assert table.quote([{'service': 'banner', 'qty': 1, 'height': 2, 'width': 2},
+                        {'service': 'mug'},
+                        {'service': 'banner', 'qty': 'x'},
+                        {'service': 'banner', 'qty': -1},
+                        {'service': 'banner', 'unit': 'cm'},
+                        'banner']) == [
+        {'amount': 10.0},
+        {'error': 'Unknown service: mug'},
+        {'error': "could not convert string to float: 'x'"},
+        {'error': 'quantity and dimensions must be non-negative numbers'},
+        {'error': 'Unknown unit: cm'},
+        {'error': 'item must be an object'}]
+
+
+def test_repeated_lines_are_memoized():
+    table = pricing.RateTable(RATES)
+    for _ in range(3):
+        table.quote([{'service': 'banner', 'qty': 1, 'height': 2, 'width': 2}])
+    info = table.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
+
+
+def test_rate_changes_reload_the_table(conn):
+    book = pricing.Pricing()
+    table = book.get(conn)
+    assert book.get(conn) is table
+    assert table.price('banner', 1, 1, 1) == 2.5
+    conn.execute("UPDATE service_rates SET rate = 3 WHERE service = 'banner'")
+    conn.commit()
+    reloaded = book.get(conn)
+    assert reloaded is not table
+    assert reloaded.price('banner', 1, 1, 1) == 3
+
+
+def test_api_quote(client, conn):
+    r = client.post('/api/quote', json={'items': [{'service': 'banner', 'qty': 2, 'height': 1, 'width': 1},
+                                                  {'service': 'dtf', 'size': 'A3'}]})
+    assert r.get_json() == {'success': True, 'items': [{'amount': 5.0}, {'amount': 14.0}], 'total': 19.0}
+    conn.execute("UPDATE service_rates SET rate = 10 WHERE service = 'dtf' AND size = 'A3'")
+    conn.commit()
+    r = client.post('/api/quote', json=[{'service': 'dtf', 'size': 'A3'}, {'service': 'mug'}])
+    assert r.get_json() == {'success': False, 'items': [{'amount': 10.0}, {'error': 'Unknown service: mug'}],
+                            'total': 10.0}
+    assert client.post('/api/quote', json={'items': []}).status_code == 400
+    too_many = [{'service': 'banner'}] * (pricing.MAX_QUOTE_ITEMS + 1)
+    assert client.post('/api/quote', json=too_many).status_code == 400
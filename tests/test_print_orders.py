@@ -0,0 +1,34 @@
+import app as app_module
+
+
+def _receipts(response):
+    text = response.get_data(as_text=True)
+    return int(text.split('<div class="toolbar">', 1)[1].split('receipt', 1)[0])
+
+
+def test_receipts_by_id_customer_and_date(client, conn, customer, add_orders):
+    first, second = add_orders(('banner', 10), ('dtf', 5), order_date='2024-03-01')
+    add_orders(('sticker', 2), order_date='2024-03-05')
+    other = conn.execute("INSERT INTO customers (name, mobile) VALUES ('Kwame Asante', '0200000000')").lastrowid
+    conn.commit()
+    add_orders(('banner', 7), order_date='2024-03-05', customer_id=other)
+
+    r = client.get(f'/print_orders?ids={first},{second}&ids=x')
+    assert r.status_code == 200
+    assert _receipts(r) == 2
+    assert _receipts(client.get(f'/print_orders?customer_id={customer}')) == 3
+    assert _receipts(client.get('/print_orders?start_date=2024-03-05')) == 2
+    assert _receipts(client.get(f'/print_orders?customer_id={other}&start_date=2024-03-01&end_date=2024-03-31')) == 1
+
+
+def test_bad_selections_go_back_with_a_message(client, add_orders, monkeypatch):
+    add_orders(('banner', 10), ('dtf', 5))
+    for url, message in (('/print_orders', b'Choose orders, a customer or a date range to print'),
+                         ('/print_orders?start_date=03/01/2024', b'Invalid date range'),
+                         ('/print_orders?ids=999', b'No orders to print')):
+        r = client.get(url, follow_redirects=True)
+        assert r.request.path == '/completed_orders'
+        assert message in r.data
+    monkeypatch.setattr(app_module, 'MAX_BATCH_RECEIPTS', 1)
+    r = client.get('/print_orders?start_date=2024-03-01', follow_redirects=True)
+    assert b'More than 1 receipts; narrow the selection' in r.data
@@ -0,0 +1,57 @@
+import ledger
+import reports
+
+
+def _expense(conn, amount, date):
+    conn.execute("INSERT INTO expenses (amount, description, date) VALUES (?, 'ink', ?)", (amount, date))
+    conn.commit()
+
+
+def test_rollups_follow_orders_and_expenses(conn, add_orders):
+    first, second = add_orders(('banner', 10), ('dtf', 5), order_date='2024-03-01')
+    add_orders(('banner', 20), order_date='2024-03-04')
+    _expense(conn, 3, '2024-03-01')
+    ledger.set_order_statuses(conn, [(first, 'Paid', None), (second, 'Credit', None)])
+    rows, totals = reports.report(conn, '2024-03-01', '2024-03-31')
+    assert rows == [
+        {'period': '2024-03-01', 'order_count': 2, 'revenue': 15, 'paid_revenue': 10, 'credit_revenue': 5,
+         'expense_count': 1, 'expenses': 3, 'profit': 12},
+        {'period': '2024-03-04', 'order_count': 1, 'revenue': 20, 'paid_revenue': 0, 'credit_revenue': 0,
+         'expense_count': 0, 'expenses': 0, 'profit': 20}]
+    assert totals['revenue'] == 35 and totals['profit'] == 32
+    assert reports.service_report(conn, '2024-03-01', '2024-03-31') == [
+        {'service': 'banner', 'order_count': 2, 'revenue': 30}, {'service': 'dtf', 'order_count': 1, 'revenue': 5}]
+
+    conn.execute("UPDATE orders SET order_date = '2024-04-02', amount = 7 WHERE id = ?", (second,))
+    conn.execute('DELETE FROM expenses')
+    conn.commit()
+    assert reports.report(conn, '2024-03-01', '2024-03-01')[0][0]['revenue'] == 10
+    assert reports.check(conn) == []
+
+
+def test_weeks_start_on_monday_and_months_on_the_first(conn, add_orders):
+    for day in ('2024-03-01', '2024-03-04', '2024-03-10', '2024-04-02'):
+        add_orders(('banner', 1), order_date=day)
+    weeks = reports.report(conn, '2024-01-01', '2024-12-31', 'week')[0]
+    assert [(row['period'], row['order_count']) for row in weeks] == [
+        ('2024-02-26', 1), ('2024-03-04', 2), ('2024-04-01', 1)]
+    months = reports.report(conn, '2024-01-01', '2024-12-31', 'month')[0]
+    assert [(row['period'], row['order_count']) for row in months] == [('2024-03-01', 3), ('2024-04-01', 1)]
+
+
+def test_rebuild_repairs_drift(conn, add_orders):
+    add_orders(('banner', 10))
+    conn.execute('UPDATE daily_rollup SET revenue = 99')
+    conn.execute('DELETE FROM daily_service_rollup')
+    conn.commit()
+    assert len(reports.check(conn)) == 2
+    assert len(reports.rebuild(conn)) == 2
+    assert reports.check(conn) == []
+
+
+def test_system_report_page(client, add_orders):
+    add_orders(('banner', 12), order_date='2024-03-01')
+    r = client.get('/system_report?start_date=2024-03-01&end_date=2024-03-31&group=month')
+    assert r.status_code == 200
+    assert b'2024-03-01' in r.data
+    assert client.get('/system_report?start_date=bad&group=year').status_code == 200
@@ -0,0 +1,51 @@
+import search
+
+
+def _ids(conn, text, kind):
+    return [row['id'] for row in search.search(conn, text, (kind,))[kind]]
+
+
+def test_match_query_prefixes_every_word():
+    assert search.match_query('ban  "vinyl"') == '"ban"* "vinyl"*'
+    assert search.match_query(' -*" ') is None
+
+
+def test_triggers_keep_the_index_in_step(conn, customer, add_orders):
+    order, = add_orders(('Vinyl banner', 10))
+    assert _ids(conn, 'ban', 'orders') == [order]
+    assert _ids(conn, 'ama 0244', 'customers') == [customer]
+
+    conn.execute("UPDATE orders SET service = 'Sticker' WHERE id = ?", (order,))
+    conn.execute("UPDATE customers SET name = 'Esi Boateng' WHERE id = ?", (customer,))
+    conn.commit()
+    assert _ids(conn, 'banner', 'orders') == []
+    assert _ids(conn, 'stick', 'orders') == [order]
+    assert _ids(conn, 'ama', 'customers') == []
+    assert _ids(conn, 'boat', 'customers') == [customer]
+
+    conn.execute('DELETE FROM orders WHERE id = ?', (order,))
+    conn.commit()
+    assert _ids(conn, 'stick', 'orders') == []
+
+
+def test_expense_descriptions_are_indexed(conn):
+    expense = conn.execute("INSERT INTO expenses (amount, description, date) VALUES (5, 'Printer ink', '2024-03-01')"
+                           ).lastrowid
+    conn.commit()
+    assert _ids(conn, 'ink', 'expenses') == [expense]
+
+
+def test_search_endpoint(client, customer, add_orders):
+    add_orders(('Vinyl banner', 10))
+    body = client.get('/search?q=ban&type=orders').get_json()
+    assert list(body) == ['orders']
+    assert body['orders'][0]['customer_name'] == 'Ama Mensah'
+    assert client.get('/search?q=').get_json() == {'customers': [], 'orders': [], 'expenses': []}
+
+
+def test_listing_filters_by_search(client, customer, conn):
+    conn.execute("INSERT INTO customers (name, mobile) VALUES ('Kwame Asante', '0200000000')")
+    conn.commit()
+    page = client.get('/view_customer?q=kwa').data
+    assert b'Kwame Asante' in page
+    assert b'Ama Mensah' not in page
@@ -0,0 +1,46 @@
+import pytest
+
+import app as app_module
+import config
+import db
+import instrumentation
+import migrations
+
+
+def test_from_env_converts_to_the_default_types():
+    settings = config.from_env(environ={'PPM_DB_POOL_SIZE': '3', 'PPM_PAGE_CACHE': 'off',
+                                        'PPM_SLOW_QUERY_MS': '2.5', 'PPM_UNKNOWN': 'x'})
+    assert (settings['DB_POOL_SIZE'], settings['PAGE_CACHE'], settings['SLOW_QUERY_MS']) == (3, False, 2.5)
+    assert 'UNKNOWN' not in settings
+    with pytest.raises(ValueError, match='PPM_PAGE_CACHE must be a boolean'):
+        config.from_env(environ={'PPM_PAGE_CACHE': 'maybe'})
+    with pytest.raises(ValueError, match='PPM_WORKERS must be int'):
+        config.from_env(config.SERVER_DEFAULTS, environ={'PPM_WORKERS': 'two'})
+
+
+def test_configure_app_migrates_and_seeds_the_admin(app, conn):
+    assert migrations.current_version(conn) == migrations.latest_version()
+    assert conn.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'").fetchone()[0] == 1
+
+
+def test_an_up_to_date_database_is_left_alone(app, monkeypatch):
+    monkeypatch.setattr(migrations, 'migrate', lambda conn: pytest.fail('migrated twice'))
+    assert app_module.init_db() == []
+
+
+def test_configure_app_applies_the_overrides(app, tmp_path):
+    path = str(tmp_path / 'other.db')
+    assert app_module.configure_app({'DATABASE': path, 'DASHBOARD_CACHE_TTL': 1.5, 'PAGE_CACHE': False}) is app
+    assert app_module.dashboard_cache.ttl == 1.5
+    assert not app_module.page_cache.enabled
+    conn = db.connect(path)
+    assert migrations.current_version(conn) == migrations.latest_version()
+    conn.close()
+
+
+def test_startup_time_is_reported(app, caplog):
+    caplog.set_level('INFO')
+    app_module.configure_app(started=0.0)
+    assert instrumentation.metrics.startup_seconds > 0
+    assert 'migrations applied: none' in caplog.text
+    instrumentation.metrics.startup_seconds = None
@@ -0,0 +1,80 @@
+import pytest
+
+
+@pytest.fixture
+def employees(conn):
+    ids = [conn.execute('INSERT INTO employees (name, role) VALUES (?, ?)', (name, 'Printer')).lastrowid
+           for name in ('Kofi', 'Esi')]
+    conn.commit()
+    return ids
+
+
+def _claim(client, employee_id, **extra):
+    return client.post('/work_queue/claim', json={'employee_id': employee_id, **extra})
+
+
+def _item(conn, order_id):
+    return conn.execute('SELECT status, employee_id FROM work_items WHERE order_id = ?', (order_id,)).fetchone()
+
+
+def test_claim_gives_each_order_once(client, employees, add_orders):
+    add_orders(('banner', 40), ('sticker', 20))
+    claimed = [_claim(client, employee_id).get_json()['order_id'] for employee_id in employees]
+    assert None not in claimed and len(set(claimed)) == 2
+    assert _claim(client, employees[0]).get_json() == {'success': True, 'order_id': None}
+
+
+def test_only_the_holder_completes(client, conn, employees, add_orders):
+    add_orders(('banner', 40))
+    holder, other = employees
+    order_id = _claim(client, holder).get_json()['order_id']
+
+    r = client.post(f'/work_queue/{order_id}/complete', json={'employee_id': other})
+    assert r.status_code == 409
+    assert _item(conn, order_id) == ('claimed', holder)
+
+    r = client.post(f'/work_queue/{order_id}/complete', json={'employee_id': holder})
+    assert r.get_json() == {'success': True, 'order_id': order_id}
+    assert _item(conn, order_id)[0] == 'done'
+    assert conn.execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()[0] == 'Completed'
+
+
+def test_only_the_holder_releases(client, conn, employees, add_orders):
+    add_orders(('banner', 40))
+    holder, other = employees
+    order_id = _claim(client, holder).get_json()['order_id']
+    assert client.post(f'/work_queue/{order_id}/release', json={'employee_id': other}).status_code == 409
+    assert client.post(f'/work_queue/{order_id}/release', json={'employee_id': holder}).status_code == 200
+    assert _item(conn, order_id) == ('queued', None)
+
+
+@pytest.mark.parametrize('action', ['complete', 'release'])
+@pytest.mark.parametrize('employee_id', [9999, 'abc', True])
+def test_unknown_employee_is_rejected_not_ignored(client, conn, employees, add_orders, action, employee_id):
+    add_orders(('banner', 40))
+    order_id = _claim(client, employees[0]).get_json()['order_id']
+    r = client.post(f'/work_queue/{order_id}/{action}', json={'employee_id': employee_id})
+    assert r.status_code == 400
+    assert r.get_json()['error'] == 'Unknown employee'
+    assert _item(conn, order_id) == ('claimed', employees[0])
+
+
+def test_claim_validates_input(client, employees, add_orders):
+    add_orders(('banner', 40))
+    assert _claim(client, 9999).status_code == 400
+    for services in ([1], [''], ['banner', None], 'banner'):
+        r = _claim(client, employees[0], services=services)
+        assert r.status_code == 400, services
+    assert _claim(client, employees[0], services=['dtf']).get_json()['order_id'] is None
+    assert _claim(client, employees[0], services=['Banner']).get_json()['order_id'] is not None
+
+
+def test_the_queue_form_redirects_with_a_message(client, employees, add_orders):
+    order_id, = add_orders(('banner', 40))
+    r = client.post('/work_queue/claim', data={'employee_id': employees[0], 'service': ' '})
+    assert r.status_code == 302
+    assert r.headers['Location'].endswith('/work_queue')
+    assert b'Choose services by name' in client.get('/work_queue').data
+    r = client.post('/work_queue/claim', data={'employee_id': employees[0], 'service': 'banner'},
+                    follow_redirects=True)
+    assert f'Order {order_id} assigned'.encode() in r.data
@@ -0,0 +1,322 @@
+"""Print queue: pending orders assigned to employees in priority order.
+
+Every pending order has a row in ``work_items``.  Orders added through the
+form are queued with their dimensions and due date straight away; orders
+from imports or the API are picked up by ``enqueue_missing()`` on the next
+claim or queue view.  The print time is estimated from the dimensions (or, without them,
+from the amount and the service's rate in ``service_rates``) using
+PRINT_SPEEDS.
+
+Items are claimed least slack first: the due date, less the estimated print
+time and the service's PRIORITY_DAYS.  That key does not change as time
+passes, so it is stored as ``rank`` and the next item is the first entry of
+a partial index over queued items.  Claim, release and complete each run in
+one BEGIN IMMEDIATE transaction, so two terminals (or worker processes)
+never get the same order.  Triggers on ``orders`` close an item when its
+order is completed from anywhere else and re-queue it if it goes back to
+pending; deleting an employee puts their claimed orders back.
+"""
+import datetime
+
+import db
+import ledger
+import pricing
+from ledger import CONFLICT, NOT_FOUND, UPDATED
+
+QUEUED, CLAIMED, DONE = 'queued', 'claimed', 'done'
+
+# Roll media: (setup minutes, square feet printed per minute)
+PRINT_SPEEDS = {
+    'banner': (10, 4.0),
+    'sticker': (10, 3.0),
+    'transparent': (10, 3.0),
+    'onewayvision': (10, 2.5),
+}
+# Sheet media: (setup minutes, minutes per sheet)
+SHEET_SPEEDS = {
+    'dtf': (5, 1.5),
+}
+DEFAULT_SPEED = (15, 2.0)
+# Days from order to due date when none is given
+LEAD_DAYS = {'dtf': 1}
+DEFAULT_LEAD_DAYS = 2
+# Days a service is pulled forward in the queue (walk-in DTF jobs are collected the same day)
+PRIORITY_DAYS = {'dtf': 0.5}
+
+# Archiving deletes too: archived orders are long done, and nothing reads their items
+TRIGGERS_SQL = '''
+CREATE TRIGGER IF NOT EXISTS orders_work_done AFTER UPDATE OF status ON orders
+WHEN OLD.status = 'pending' AND NEW.status != 'pending'
+BEGIN
+    UPDATE work_items SET status = 'done', done_at = datetime('now') WHERE order_id = NEW.id AND status != 'done';
+END;
+CREATE TRIGGER IF NOT EXISTS orders_work_requeue AFTER UPDATE OF status ON orders
+WHEN OLD.status != 'pending' AND NEW.status = 'pending'
+BEGIN
+    UPDATE work_items SET status = 'queued', employee_id = NULL, claimed_at = NULL, done_at = NULL,
+                          queued_at = datetime('now')
+    WHERE order_id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS orders_work_delete AFTER DELETE ON orders
+BEGIN
+    DELETE FROM work_items WHERE order_id = OLD.id;
+END;
+CREATE TRIGGER IF NOT EXISTS employees_work_release AFTER DELETE ON employees
+BEGIN
+    UPDATE work_items SET status = 'queued', employee_id = NULL, claimed_at = NULL
+    WHERE employee_id = OLD.id AND status = 'claimed';
+END;
+'''
+
+MISSING_SQL = '''
+    SELECT o.id, o.service, o.amount, o.order_date FROM orders o
+    WHERE o.status = 'pending' AND NOT EXISTS (SELECT 1 FROM work_items w WHERE w.order_id = o.id)
+'''
+# Imports and the API only ever append, so claims just look past the newest item
+# (+status keeps SQLite on the rowid range rather than every pending order)
+NEW_SQL = '''
+    SELECT o.id, o.service, o.amount, o.order_date FROM orders o
+    WHERE o.id > (SELECT COALESCE(MAX(order_id), 0) FROM work_items) AND +o.status = 'pending'
+      AND NOT EXISTS (SELECT 1 FROM work_items w WHERE w.order_id = o.id)
+'''
+INSERT_SQL = '''
+    INSERT OR IGNORE INTO work_items (order_id, service, due_date, est_minutes, rank)
+    VALUES (?, ?, ?, ?, ?)
+'''
+# The form's dimensions and due date win over an estimate enqueue_missing() made in between
+UPSERT_SQL = '''
+    INSERT INTO work_items (order_id, service, due_date, est_minutes, rank) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (order_id) DO UPDATE SET due_date = excluded.due_date, est_minutes = excluded.est_minutes,
+                                         rank = excluded.rank
+    WHERE status = 'queued'
+'''
+NEXT_SQL = "SELECT order_id FROM work_items WHERE status = 'queued'{services} ORDER BY rank, order_id LIMIT 1"
+
+ITEM_FIELDS = ('order_id', 'customer', 'service', 'amount', 'order_date', 'due_date', 'est_minutes',
+               'status', 'employee_id', 'employee', 'queued_at', 'claimed_at')
+ITEMS_SQL = '''
+    SELECT w.order_id, c.name, o.service, o.amount, o.order_date, w.due_date, w.est_minutes,
+           w.status, w.employee_id, e.name, w.queued_at, w.claimed_at
+    FROM work_items w
+    JOIN orders o ON o.id = w.order_id
+    LEFT JOIN customers c ON c.id = o.customer_id
+    LEFT JOIN employees e ON e.id = w.employee_id
+'''
+QUEUED_SQL = ITEMS_SQL + " WHERE w.status = 'queued' ORDER BY w.rank, w.order_id LIMIT ?"
+CLAIMED_SQL = ITEMS_SQL + " WHERE w.status = 'claimed' ORDER BY e.name, w.claimed_at"
+
+QUEUE_SUMMARY_SQL = '''
+    SELECT COUNT(*), COALESCE(SUM(est_minutes), 0),
+           COALESCE(MAX((julianday('now') - julianday(queued_at)) * 1440), 0),
+           COALESCE(SUM(due_date < :today), 0)
+    FROM work_items WHERE status = 'queued'
+'''
+QUEUE_SUMMARY_FIELDS = ('queued', 'queued_minutes', 'oldest_wait_minutes', 'overdue')
+
+# Per employee over the window starting at :since; wait is queue to claim, work is claim to done
+EMPLOYEE_STATS_SQL = '''
+    SELECT e.id, e.name,
+           COALESCE(SUM(w.status = 'claimed'), 0),
+           COALESCE(SUM(w.status = 'done' AND w.done_at >= :since), 0),
+           COALESCE(SUM(CASE WHEN w.status = 'done' AND w.done_at >= :since THEN w.est_minutes END), 0),
+           AVG(CASE WHEN w.claimed_at >= :since THEN (julianday(w.claimed_at) - julianday(w.queued_at)) * 1440 END),
+           AVG(CASE WHEN w.status = 'done' AND w.done_at >= :since
+                    THEN (julianday(w.done_at) - julianday(w.claimed_at)) * 1440 END)
+    FROM employees e LEFT JOIN work_items w ON w.employee_id = e.id
+    GROUP BY e.id ORDER BY e.name
+'''
+EMPLOYEE_STATS_FIELDS = ('employee_id', 'employee', 'in_progress', 'completed', 'completed_est_minutes',
+                         'avg_wait_minutes', 'avg_work_minutes')
+
+CLAIMED_COUNT_SQL = "SELECT COUNT(*) FROM work_items WHERE status = 'claimed'"
+
+
+def install(conn):
+    db.replace_triggers(conn, TRIGGERS_SQL)
+
+
+# -------------------------
+# Estimates and priority
+# -------------------------
+def estimate_minutes(rates, service, amount=None, qty=None, height=None, width=None, unit='ft', size=None):
+    """Estimated print time for one order line.
+
+    With dimensions the area (or sheet count) comes from them; otherwise it
+    is worked back from the amount, since the amount is rate x area.
+    """
+    service = pricing.canonical_service(service)
+    if service in SHEET_SPEEDS:
+        setup, per_sheet = SHEET_SPEEDS[service]
+        sheets = qty
+        if not sheets and amount and service in rates.sheet:
+            sizes = rates.sheet[service]
+            sheets = amount / (sizes.get(size) or min(sizes.values()))
+        return setup + per_sheet * (sheets or 1)
+    setup, speed = PRINT_SPEEDS.get(service, DEFAULT_SPEED)
+    if qty and height and width:
+        area = qty * height * width * pricing.UNITS.get(unit, 1.0)
+    elif amount and rates.area.get(service):
+        area = amount / rates.area[service]
+    else:
+        area = 0
+    return setup + area / speed
+
+
+def due_date(service, order_date):
+    service = pricing.canonical_service(service)
+    try:
+        start = datetime.date.fromisoformat(order_date)
+    except (TypeError, ValueError):
+        start = datetime.date.today()
+    return (start + datetime.timedelta(days=LEAD_DAYS.get(service, DEFAULT_LEAD_DAYS))).isoformat()
+
+
+def rank(service, due, est_minutes):
+    """Least slack first: the due day, less the print time and the service's head start, in days."""
+    day = datetime.date.fromisoformat(due).toordinal()
+    return day - est_minutes / 1440 - PRIORITY_DAYS.get(pricing.canonical_service(service), 0)
+
+
+def _row(order_id, service, due, est):
+    return order_id, pricing.canonical_service(service), due, round(est, 1), rank(service, due, est)
+
+
+def enqueue_missing(conn, rates, newest_only=False):
+    """Queue pending orders that have no work item yet (imports, the API); returns how many.
+
+    ``newest_only`` checks just the orders added since the newest item.  Runs
+    inside the caller's transaction.
+    """
+    sql = NEW_SQL if newest_only else MISSING_SQL
+    rows = [_row(order_id, service, due_date(service, order_date), estimate_minutes(rates, service, amount))
+            for order_id, service, amount, order_date in conn.execute(sql).fetchall()]
+    conn.executemany(INSERT_SQL, rows)
+    return len(rows)
+
+
+# -------------------------
+# Atomic operations
+# -------------------------
+def _transaction(conn, fn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = fn()
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return result
+
+
+def enqueue(conn, rates, order_ids, items, order_date, due=None, dimensions=None):
+    """Queue newly added orders; ``items`` are their (service, amount) lines.
+
+    The print time comes from the form's ``dimensions`` when they were given.
+    """
+    rows = []
+    for order_id, (service, amount) in zip(order_ids, items):
+        est = estimate_minutes(rates, service, amount, **(dimensions or {}))
+        rows.append(_row(order_id, service, due or due_date(service, order_date), est))
+    _transaction(conn, lambda: conn.executemany(UPSERT_SQL, rows))
+
+
+def sync(conn, rates):
+    """Queue any pending orders that are missing; returns how many."""
+    # A read first, so viewing the queue only takes the write lock when there is work
+    if conn.execute(MISSING_SQL + ' LIMIT 1').fetchone() is None:
+        return 0
+    return _transaction(conn, lambda: enqueue_missing(conn, rates))
+
+
+def claim(conn, rates, employee_id, services=None):
+    """Give the highest-priority queued order to ``employee_id``; returns its order id or None.
+
+    ``services`` limits the claim to orders for those services (the
+    employee's machine).
+    """
+    def run():
+        enqueue_missing(conn, rates, newest_only=True)
+        filters, params = '', []
+        if services:
+            filters = f" AND service IN ({', '.join('?' * len(services))})"
+            params = [pricing.canonical_service(s) for s in services]
+        row = conn.execute(NEXT_SQL.format(services=filters), params).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE work_items SET status = 'claimed', employee_id = ?, claimed_at = datetime('now') "
+                     "WHERE order_id = ?", (employee_id, row[0]))
+        return row[0]
+    return _transaction(conn, run)
+
+
+def _claimed_by(conn, order_id, employee_id):
+    row = conn.execute('SELECT status, employee_id FROM work_items WHERE order_id = ?', (order_id,)).fetchone()
+    if row is None:
+        return NOT_FOUND
+    status, holder = row
+    if status != CLAIMED or (employee_id is not None and holder != employee_id):
+        return CONFLICT
+    return UPDATED
+
+
+def complete(conn, order_id, employee_id=None, today=None):
+    """Mark a claimed order Completed; CONFLICT if it is not claimed (by ``employee_id``, when given)."""
+    today = today or datetime.date.today().isoformat()
+
+    def run():
+        result = _claimed_by(conn, order_id, employee_id)
+        if result == UPDATED:
+            # The orders_work_done trigger closes the work item
+            result = ledger.change_status(conn, order_id, 'Completed', today)[0]
+        return result
+    return _transaction(conn, run)
+
+
+def release(conn, order_id, employee_id=None):
+    """Put a claimed order back in the queue at its original priority."""
+    def run():
+        result = _claimed_by(conn, order_id, employee_id)
+        if result == UPDATED:
+            conn.execute("UPDATE work_items SET status = 'queued', employee_id = NULL, claimed_at = NULL "
+                         "WHERE order_id = ?", (order_id,))
+        return result
+    return _transaction(conn, run)
+
+
+def set_due_date(conn, order_id, due):
+    def run():
+        row = conn.execute('SELECT service, est_minutes FROM work_items WHERE order_id = ? AND status != ?',
+                           (order_id, DONE)).fetchone()
+        if row is None:
+            return NOT_FOUND
+        conn.execute('UPDATE work_items SET due_date = ?, rank = ? WHERE order_id = ?',
+                     (due, rank(row[0], due, row[1]), order_id))
+        return UPDATED
+    return _transaction(conn, run)
+
+
+# -------------------------
+# Listings and statistics
+# -------------------------
+def queued(conn, limit=200):
+    return [dict(zip(ITEM_FIELDS, row)) for row in conn.execute(QUEUED_SQL, (limit,))]
+
+
+def claimed(conn):
+    return [dict(zip(ITEM_FIELDS, row)) for row in conn.execute(CLAIMED_SQL)]
+
+
+def stats(conn, days=30, today=None):
+    """Queue depth and wait, plus throughput and average wait/work minutes per employee."""
+    today = today or datetime.date.today()
+    since = (today - datetime.timedelta(days=days)).isoformat()
+    queue = dict(zip(QUEUE_SUMMARY_FIELDS, conn.execute(QUEUE_SUMMARY_SQL, {'today': today.isoformat()}).fetchone()))
+    employees = []
+    for row in conn.execute(EMPLOYEE_STATS_SQL, {'since': since}):
+        entry = dict(zip(EMPLOYEE_STATS_FIELDS, row))
+        entry['completed_per_day'] = round(entry['completed'] / days, 2)
+        for key in ('completed_est_minutes', 'avg_wait_minutes', 'avg_work_minutes'):
+            if entry[key] is not None:
+                entry[key] = round(entry[key], 1)
+        employees.append(entry)
+    return {'days': days, 'queue': queue, 'employees': employees}
@@ -0,0 +1,15 @@
+"""WSGI entry point for production servers.
+
+    gunicorn --workers 2 --threads 4 --preload wsgi:app
+    waitress-serve --threads 8 wsgi:app
+
+Settings come from PPM_* environment variables (see config.py); serve.py
+wraps both servers with those settings applied.
+"""
+import time
+
+_started = time.perf_counter()
+
+from app import configure_app  # noqa: E402
+
+app = configure_app(started=_started)